@@ -0,0 +1,197 @@
+"""Utiliites for a content-addressed cache of fetched source files shared by
+all builds of the Knowledge Network (KN).
+
+A cached file is addressed by the remote_url, remote_date, remote_size and
+remote_version recorded for its alias by the check step, so identical
+upstream releases are downloaded only once no matter how many builds fetch
+them. Files are placed into and out of the cache with hardlinks (or
+reflinks/copies across filesystems) and the least recently used files are
+evicted when the cache grows past its size budget.
+
+Contains module functions::
+
+    get_cache_key(version_dict)
+    link_file(src, dst)
+    get_cached(version_dict, filename, cache_dir)
+    add_cached(version_dict, filename, cache_dir, cache_size)
+    evict(cache_dir, cache_size)
+
+Attributes:
+    META_EXT (str): extension of the metadata file kept for each cached file,
+        whose modification time records the last use of the cached file
+    GIGABYTE (int): number of bytes in a gigabyte
+
+Examples:
+    To evict least recently used files until the cache is under 50 GB::
+
+        $ python3 code/cache_utilities.py -cd /shared/kn-cache -cs 50
+
+"""
+
+import os
+import json
+import hashlib
+import shutil
+import subprocess
+import time
+from argparse import ArgumentParser
+import config_utilities as cf
+
+META_EXT = '.json'
+GIGABYTE = 1024 ** 3
+
+def get_cache_key(version_dict):
+    """Returns the cache key of the remote file described by version_dict.
+
+    The key is the sha1 hash of the remote_url, remote_date, remote_size and
+    remote_version of the alias. If none of remote_date, remote_size and
+    remote_version are known, the release cannot be identified and None is
+    returned.
+
+    Args:
+        version_dict (dict): A dictionary describing the attributes of the
+            alias for a source.
+
+    Returns:
+        str: the cache key, or None if the file cannot be cached
+    """
+    fields = [version_dict['remote_url'], version_dict['remote_date'],
+              version_dict['remote_size'], version_dict['remote_version']]
+    if fields[1] == 0 and fields[2] == -1 and fields[3] == 'unknown':
+        return None
+    return hashlib.sha1(json.dumps(fields).encode()).hexdigest()
+
+def link_file(src, dst):
+    """Links the file at src to dst, replacing dst.
+
+    Tries a hardlink first, then a reflink (copy-on-write clone) and finally
+    falls back to a full copy when src and dst are on different filesystems.
+
+    Args:
+        src (str): the existing file
+        dst (str): the path to link it to
+    """
+    tmp_dst = '{0}.{1}.tmp'.format(dst, os.getpid())
+    try:
+        os.link(src, tmp_dst)
+    except OSError:
+        if subprocess.call(['cp', '--reflink=auto', src, tmp_dst],
+                           stderr=subprocess.DEVNULL) != 0:
+            shutil.copy2(src, tmp_dst)
+    os.replace(tmp_dst, dst)
+
+def get_cached(version_dict, filename, cache_dir):
+    """Links the cached copy of the remote file to filename if there is one.
+
+    Args:
+        version_dict (dict): A dictionary describing the attributes of the
+            alias for a source.
+        filename (str): the local path the remote file would be downloaded to
+        cache_dir (str): the directory of the cache
+
+    Returns:
+        bool: True if the file was found in the cache
+    """
+    key = get_cache_key(version_dict)
+    if not cache_dir or key is None:
+        return False
+    cached = os.path.join(cache_dir, key)
+    if not os.path.isfile(cached) or not os.path.isfile(cached + META_EXT):
+        return False
+    try:
+        link_file(cached, filename)
+        os.utime(cached + META_EXT)
+    except FileNotFoundError:
+        # evicted by another build while linking
+        return False
+    print('Using cached ' + cached + ' for ' + version_dict['remote_url'])
+    return True
+
+def add_cached(version_dict, filename, cache_dir, cache_size):
+    """Adds the downloaded file at filename to the cache.
+
+    This links the file into the cache under its cache key, writes the
+    metadata of the release next to it and then evicts the least recently
+    used files until the cache fits in cache_size (see evict).
+
+    Args:
+        version_dict (dict): A dictionary describing the attributes of the
+            alias for a source.
+        filename (str): the downloaded file
+        cache_dir (str): the directory of the cache
+        cache_size (float): size budget of the cache in gigabytes
+    """
+    key = get_cache_key(version_dict)
+    if not cache_dir or key is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, key)
+    link_file(filename, cached)
+    meta = {k: version_dict[k] for k in ['source', 'alias', 'remote_url',
+                                         'remote_date', 'remote_size',
+                                         'remote_version']}
+    meta['cached_date'] = time.time()
+    tmp_meta = '{0}{1}.{2}.tmp'.format(cached, META_EXT, os.getpid())
+    with open(tmp_meta, 'w') as outfile:
+        json.dump(meta, outfile, indent=4, sort_keys=True)
+    os.replace(tmp_meta, cached + META_EXT)
+    evict(cache_dir, cache_size)
+
+def evict(cache_dir, cache_size):
+    """Removes the least recently used files until the cache fits its budget.
+
+    The last use of a cached file is the modification time of its metadata
+    file, which is updated on every cache hit (see get_cached).
+
+    Args:
+        cache_dir (str): the directory of the cache
+        cache_size (float): size budget of the cache in gigabytes
+
+    Returns:
+        list: the keys of the evicted files
+    """
+    entries = list()
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(META_EXT):
+            continue
+        key = name[:-len(META_EXT)]
+        try:
+            used = os.path.getmtime(os.path.join(cache_dir, name))
+            size = os.path.getsize(os.path.join(cache_dir, key))
+        except FileNotFoundError:
+            continue
+        entries.append((used, key, size))
+        total += size
+    evicted = list()
+    for _, key, size in sorted(entries):
+        if total <= cache_size * GIGABYTE:
+            break
+        for path in (key + META_EXT, key):
+            try:
+                os.remove(os.path.join(cache_dir, path))
+            except FileNotFoundError:
+                pass
+        total -= size
+        evicted.append(key)
+    return evicted
+
+def main_parse_args():
+    """Processes command line arguments.
+
+    Expects a number of optional arguments. If arguments are missing, supplies
+    default values.
+
+    Returns:
+        Namespace: args as populated namespace
+    """
+    parser = ArgumentParser()
+    parser = cf.add_config_args(parser)
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+    args = main_parse_args()
+    if args.cache_dir:
+        for evicted_key in evict(args.cache_dir, args.cache_size):
+            print('Evicted ' + evicted_key)
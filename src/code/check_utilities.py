@@ -5,16 +5,61 @@ source in the KN.
 
 Contains module functions::
 
+    set_host_connections(connections)
+    host_slot(url)
+    get_connection(scheme, netloc)
+    send_request(url, method='HEAD', headers=None)
+    get_ftp(netloc)
+    clear_ftp_listings()
+    list_ftp_dir(url)
+    probe_ftp(url)
+    probe_url(url)
+    read_meta_cache(cache_dir, key)
+    write_meta_cache(cache_dir, key, meta, body=None)
+    get_page(url, cache_dir='', ttl=0)
+    cached_probe(url, cache_dir='', ttl=0)
     get_SrcClass(args)
+    get_src_fields(src_obj)
+    get_offline_SrcClass(version_json, args=None)
     compare_versions(SrcClass)
-    check(module, args=None)
+    check(module, args=None, clear_listings=True)
+    check_all(modules, args=None)
     main_parse_args()
 
+Attributes:
+    USER_AGENT (str): the user-agent sent with every probe request
+    PROBE_WORKERS (int): number of remote files probed at the same time
+    PROBE_TIMEOUT (int): seconds to wait on a stalled probe connection
+    MAX_REDIRECTS (int): maximum number of redirects followed by a probe
+    CONNECTIONS (threading.local): the open connections of each thread,
+        keyed by (scheme, netloc), reused across probes
+    FTP_LISTINGS (dict): the cached listings of remote ftp directories of
+        the current check run, keyed by (netloc, path), each a [lock,
+        entries] pair so that a directory is listed once (see list_ftp_dir)
+    FTP_LOCK (threading.Lock): lock guarding FTP_LISTINGS
+    CHECK_WORKERS (int): number of sources checked at the same time by
+        check_all
+    HOST_CONNECTIONS (int): maximum number of requests sent to one host at
+        the same time (see --check_connections)
+    HOST_SLOTS (dict): the semaphore of each host limiting its requests to
+        HOST_CONNECTIONS, keyed by netloc (see host_slot)
+    HOST_LOCK (threading.Lock): lock guarding HOST_SLOTS
+    META_EXT (str): extension of the metadata file of each cached page or
+        probe in the remote metadata cache
+    CHECK_FAILED (str): name of the file recording why check_all failed for
+        a source, in the data directory of the source
+    OFFLINE_SKIP (tuple): attributes of a source class object that are not
+        recorded by get_src_fields, as get_offline_SrcClass sets them itself
+
 Examples:
     To run check on a single source (e.g. dip)::
 
         $ python3 code/check_utilities.py dip
 
+    To run check on several sources at once in a single process::
+
+        $ python3 code/check_utilities.py dip,,kegg,,go
+
     To view all optional arguments that can be specified::
 
         $ python3 code/check_utilities.py -h
@@ -23,17 +68,415 @@ Examples:
 
 import urllib.request
 import urllib.error
+import urllib.parse
+import http.client
+import hashlib
+import calendar
+import functools
+import ftplib
+import threading
 import os
 import time
 import json
 import csv
+from collections.abc import KeysView, ValuesView
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from argparse import ArgumentParser
 import config_utilities as cf
 import table_utilities as tu
 import mysql_utilities as mu
 import import_utilities as iu
 
+USER_AGENT = "Mozilla/5.0"
+PROBE_WORKERS = 16
+PROBE_TIMEOUT = 60
+MAX_REDIRECTS = 5
+CONNECTIONS = threading.local()
+FTP_LISTINGS = dict()
+FTP_LOCK = threading.Lock()
+META_EXT = '.json'
+CHECK_WORKERS = 8
+HOST_CONNECTIONS = cf.DEFAULT_CHECK_CONNECTIONS
+HOST_SLOTS = dict()
+HOST_LOCK = threading.Lock()
+CHECK_FAILED = 'check_failed.txt'
+OFFLINE_SKIP = ('aliases', 'version', 'remote_headers', 'file_meta', 'args')
+
+def set_host_connections(connections):
+    """Sets the limit of the hosts requested from now on.
+
+    Args:
+        connections (int): the maximum concurrent requests to each host
+    """
+    global HOST_CONNECTIONS
+    HOST_CONNECTIONS = max(int(connections), 1)
+
+def host_slot(url):
+    """Returns the semaphore limiting the concurrent requests to a host.
+
+    Every probe, listing and page request holds a slot of its host while it
+    talks to the host, so that no more than HOST_CONNECTIONS requests are
+    sent to one host at a time however many sources are checked at once (see
+    check_all).
+
+    Args:
+        url (str): a url on the host
+
+    Returns:
+        threading.BoundedSemaphore: the slots of the host
+    """
+    netloc = urllib.parse.urlsplit(url).netloc
+    with HOST_LOCK:
+        if netloc not in HOST_SLOTS:
+            HOST_SLOTS[netloc] = threading.BoundedSemaphore(HOST_CONNECTIONS)
+        return HOST_SLOTS[netloc]
+
+def get_connection(scheme, netloc):
+    """Returns the open connection of this thread to the provided host.
+
+    Connections are kept open per thread (see CONNECTIONS) so that probing
+    many files on the same host reuses one connection per thread.
+
+    Args:
+        scheme (str): the url scheme (http, https or ftp)
+        netloc (str): the host (and port) of the url
+
+    Returns:
+        http.client.HTTPConnection or ftplib.FTP: the connection to the host
+    """
+    if not hasattr(CONNECTIONS, 'pool'):
+        CONNECTIONS.pool = dict()
+    key = (scheme, netloc)
+    if key not in CONNECTIONS.pool:
+        if scheme == 'ftp':
+            conn = ftplib.FTP(netloc, timeout=PROBE_TIMEOUT)
+            conn.login()
+        elif scheme == 'https':
+            conn = http.client.HTTPSConnection(netloc, timeout=PROBE_TIMEOUT)
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=PROBE_TIMEOUT)
+        CONNECTIONS.pool[key] = conn
+    return CONNECTIONS.pool[key]
+
+def send_request(url, method='HEAD', headers=None):
+    """Sends a request for url over the pooled connection to its host.
+
+    If the kept-alive connection was closed by the server, the request is
+    retried once over a new connection. The body of the response is only
+    read if it is empty or a single byte range, otherwise the connection is
+    closed without reading it.
+
+    Args:
+        url (str): the http(s) url to request
+        method (str): the request method
+        headers (dict): additional request headers
+
+    Returns:
+        http.client.HTTPResponse: the response to the request
+    """
+    parsed = urllib.parse.urlsplit(url)
+    conn = get_connection(parsed.scheme, parsed.netloc)
+    path = urllib.parse.urlunsplit(('', '', parsed.path or '/', parsed.query, ''))
+    req_headers = {'User-Agent': USER_AGENT}
+    req_headers.update(headers or dict())
+    for i in range(2):
+        try:
+            with host_slot(url):
+                conn.request(method, path, headers=req_headers)
+                response = conn.getresponse()
+                if method == 'HEAD' or response.status == 206:
+                    response.read()
+                else:
+                    conn.close()
+            if response.getheader('connection', '').lower() == 'close':
+                conn.close()
+            return response
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if i == 1:
+                raise
+
+def get_ftp(netloc):
+    """Returns the live ftp session of this thread to the provided host.
+
+    The session is pooled (see get_connection) and kept alive across probes
+    and listings. If the server closed it, it is replaced by a new session.
+
+    Args:
+        netloc (str): the host (and port) of the ftp server
+
+    Returns:
+        ftplib.FTP: the logged in session, in binary mode
+    """
+    for i in range(2):
+        conn = get_connection('ftp', netloc)
+        try:
+            conn.voidcmd('TYPE I')
+            return conn
+        except ftplib.all_errors:
+            conn.close()
+            del CONNECTIONS.pool[('ftp', netloc)]
+            if i == 1:
+                raise
+
+def clear_ftp_listings():
+    """Forgets the ftp directory listings cached by list_ftp_dir, so that a
+    new check run lists the directories again."""
+    with FTP_LOCK:
+        FTP_LISTINGS.clear()
+
+def list_ftp_dir(url):
+    """Returns the entries of the remote ftp directory at url.
+
+    The directory is listed with a single MLSD command, which returns the
+    type, size and date modified of every entry, over the pooled session to
+    its host (see get_ftp). Listings are kept in FTP_LISTINGS until the next
+    check run (see clear_ftp_listings), so one listing answers the probes of
+    all files in a directory, and probes of the same directory running at
+    the same time wait for the listing instead of repeating it. Servers
+    without MLSD are listed with NLST, which gives the names only.
+
+    Args:
+        url (str): the ftp url of the remote directory
+
+    Returns:
+        list: the (name, facts) of each entry in the order listed, where facts
+            is a dictionary of the lowercase MLSD facts ('type', 'size' and
+            'modify') the server reported
+    """
+    parsed = urllib.parse.urlsplit(url)
+    path = urllib.parse.unquote(parsed.path).rstrip('/') or '/'
+    with FTP_LOCK:
+        listing = FTP_LISTINGS.setdefault((parsed.netloc, path),
+                                          [threading.Lock(), None])
+    with listing[0]:
+        if listing[1] is None:
+            with host_slot(url):
+                conn = get_ftp(parsed.netloc)
+                try:
+                    entries = [(name, facts) for name, facts
+                               in conn.mlsd(path, ['type', 'size', 'modify'])
+                               if facts.get('type') not in ('cdir', 'pdir')]
+                except ftplib.error_perm:
+                    entries = [(name.rstrip('/').rpartition('/')[2], dict())
+                               for name in conn.nlst(path)]
+            listing[1] = entries
+        return listing[1]
+
+def probe_ftp(url):
+    """Returns the size and date modified of the remote ftp file at url.
+
+    These are read from the listing of the directory of the file (see
+    list_ftp_dir), falling back to the SIZE and MDTM commands if the server
+    did not report them. The date modified, which ftp servers report in UTC,
+    is returned as a timestamp rather than an http date, so that it does not
+    depend on the local time zone (see SrcClass.get_remote_file_modified).
+
+    Args:
+        url (str): the ftp url of the remote file
+
+    Returns:
+        dict: the 'content-length' formatted as an http header and the
+            'modified' timestamp (float seconds since the epoch) of the
+            remote file, for those the server reports
+    """
+    parsed = urllib.parse.urlsplit(url)
+    path = urllib.parse.unquote(parsed.path)
+    dir_url, _, name = url.rpartition('/')
+    try:
+        facts = dict(list_ftp_dir(dir_url + '/')).get(name, dict())
+    except ftplib.all_errors:
+        facts = dict()
+    headers = dict()
+    size = facts.get('size')
+    mdtm = facts.get('modify')
+    if size is None or mdtm is None:
+        with host_slot(url):
+            conn = get_ftp(parsed.netloc)
+            try:
+                size = conn.size(path)
+            except ftplib.error_perm:
+                pass
+            try:
+                mdtm = conn.sendcmd('MDTM ' + path)[4:].strip()
+            except ftplib.error_perm:
+                pass
+    if size is not None:
+        headers['content-length'] = str(size)
+    try:
+        headers['modified'] = float(calendar.timegm(
+            time.strptime(mdtm[:14], "%Y%m%d%H%M%S")))
+    except (TypeError, ValueError):
+        pass
+    return headers
+
+def probe_url(url):
+    """Returns the headers of the remote file at url without downloading it.
+
+    This sends a HEAD request over a pooled connection (see send_request),
+    following redirects. If the server does not allow HEAD, it requests the
+    first byte of the file instead and reads the file size from the
+    'content-range' header. Ftp urls are probed from the listing of their
+    directory (see probe_ftp). If the probe fails, no headers are returned.
+
+    Args:
+        url (str): the url of the remote file
+
+    Returns:
+        dict: the response headers, with lowercase names
+    """
+    try:
+        if url.startswith('ftp'):
+            return probe_ftp(url)
+        for _ in range(MAX_REDIRECTS):
+            response = send_request(url, 'HEAD')
+            if response.status in (405, 501):
+                response = send_request(url, 'GET', {'Range': 'bytes=0-0'})
+            if response.status in (301, 302, 303, 307, 308):
+                url = urllib.parse.urljoin(url, response.getheader('location'))
+                continue
+            if response.status >= 400:
+                return dict()
+            headers = {key.lower(): value for key, value in response.getheaders()}
+            if response.status == 206 and 'content-range' in headers:
+                headers['content-length'] = headers['content-range'].rpartition('/')[2]
+            return headers
+    except ftplib.all_errors + (http.client.HTTPException, ValueError):
+        return dict()
+    return dict()
+
+def read_meta_cache(cache_dir, key):
+    """Returns the metadata and body cached under key, if there are any.
+
+    Args:
+        cache_dir (str): the directory of the remote metadata cache
+        key (str): the cache key of the page or probe
+
+    Returns:
+        dict: the cached metadata, or None if nothing is cached
+        bytes: the cached body, or None if no body is cached
+    """
+    path = os.path.join(cache_dir, key)
+    try:
+        with open(path + META_EXT, 'r') as infile:
+            meta = json.load(infile)
+    except (OSError, ValueError):
+        return None, None
+    body = None
+    if os.path.isfile(path):
+        with open(path, 'rb') as infile:
+            body = infile.read()
+    return meta, body
+
+def write_meta_cache(cache_dir, key, meta, body=None):
+    """Caches the metadata and body of a page or probe under key.
+
+    Files are written to a temporary name and then moved into place, so
+    concurrent checks never read a partial entry.
+
+    Args:
+        cache_dir (str): the directory of the remote metadata cache
+        key (str): the cache key of the page or probe
+        meta (dict): the metadata to cache, including the 'checked' time
+        body (bytes): the body of the page, or None to keep the cached body
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, key)
+    tmp_path = '{0}.{1}.{2}.tmp'.format(path, os.getpid(), threading.get_ident())
+    if body is not None:
+        with open(tmp_path, 'wb') as outfile:
+            outfile.write(body)
+        os.replace(tmp_path, path)
+    with open(tmp_path, 'w') as outfile:
+        json.dump(meta, outfile, indent=4, sort_keys=True)
+    os.replace(tmp_path, path + META_EXT)
+
+def get_page(url, cache_dir='', ttl=0):
+    """Returns the body of the remote page at url, using the metadata cache.
+
+    If cache_dir is set, the page is cached there under the sha1 hash of the
+    url. A cached page checked less than ttl seconds ago is returned without
+    any network traffic. An older cached page is revalidated with the
+    If-None-Match and If-Modified-Since headers and only downloaded again if
+    it changed. If the server cannot be reached, a cached page is returned
+    however old it is.
+
+    Args:
+        url (str): the url of the page
+        cache_dir (str): the directory of the remote metadata cache, or ''
+            to always download the page
+        ttl (float): seconds a cached page is used without revalidation
+
+    Returns:
+        bytes: the body of the page
+    """
+    headers = {'User-Agent': USER_AGENT}
+    if not cache_dir:
+        with host_slot(url), urllib.request.urlopen(
+                urllib.request.Request(url, headers=headers),
+                timeout=PROBE_TIMEOUT) as response:
+            return response.read()
+    key = hashlib.sha1(url.encode()).hexdigest()
+    meta, body = read_meta_cache(cache_dir, key)
+    if body is None:
+        meta = None
+    elif time.time() - meta['checked'] < ttl:
+        return body
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    try:
+        with host_slot(url), urllib.request.urlopen(
+                urllib.request.Request(url, headers=headers),
+                timeout=PROBE_TIMEOUT) as response:
+            body = response.read()
+            meta = {'etag': response.headers.get('etag'),
+                    'last_modified': response.headers.get('last-modified')}
+            new_body = body
+    except urllib.error.HTTPError as err:
+        if err.code != 304 or meta is None:
+            raise
+        new_body = None
+    except (urllib.error.URLError, OSError):
+        if meta is None:
+            raise
+        return body
+    meta['checked'] = time.time()
+    write_meta_cache(cache_dir, key, meta, new_body)
+    return body
+
+def cached_probe(url, cache_dir='', ttl=0):
+    """Returns the headers of the remote file at url, using the metadata cache.
+
+    If cache_dir is set, headers probed less than ttl seconds ago are returned
+    without any network traffic, and the headers of a new probe are cached
+    (see probe_url). If a new probe fails, cached headers are returned however
+    old they are.
+
+    Args:
+        url (str): the url of the remote file
+        cache_dir (str): the directory of the remote metadata cache, or ''
+            to always probe the file
+        ttl (float): seconds cached headers are used without a new probe
+
+    Returns:
+        dict: the response headers, with lowercase names
+    """
+    if not cache_dir:
+        return probe_url(url)
+    key = hashlib.sha1(('HEAD ' + url).encode()).hexdigest()
+    meta = read_meta_cache(cache_dir, key)[0]
+    if meta is not None and time.time() - meta['checked'] < ttl:
+        return meta['headers']
+    headers = probe_url(url)
+    if not headers:
+        return meta['headers'] if meta is not None else headers
+    write_meta_cache(cache_dir, key, {'headers': headers, 'checked': time.time()})
+    return headers
+
 class SrcClass(object):
     """Base class to be extended by each supported source in KnowEnG.
 
@@ -52,6 +495,10 @@ class SrcClass(object):
         remote_file (str): The name of the file to extract if the remote source
             is a directory
         version (dict): The release version of each alias in the source.
+        remote_headers (dict): The headers of the remote file of each alias
+            probed so far (see get_remote_headers).
+        file_meta (dict): The metadata of each file of the source in the
+            database, loaded on first use (see get_local_version_info).
         source_url (str): The website for the source.
         reference (str): The citation for the source.
         pmid (str): The pubmed ID for the source.
@@ -83,6 +530,8 @@ class SrcClass(object):
         self.aliases = aliases
         self.remote_file = ''
         self.version = dict()
+        self.remote_headers = dict()
+        self.file_meta = None
         self.args = args
         self.chunk_size = 500000
 
@@ -166,9 +615,11 @@ class SrcClass(object):
 
         This returns the local information for a given source alias, as
         retrieved from the msyql database and formated as a dicitonary object.
-        (see mysql_utilities.get_file_meta). It adds the local_file_name and
-        local_file_exists to the fields retrieved from the database, which
-        are the name of the file locally and a boolean indicating if it already
+        (see mysql_utilities.get_file_meta). The metadata of all aliases of
+        the source is loaded with one query the first time this is called
+        (see mysql_utilities.get_source_file_meta). It adds the
+        local_file_name and local_file_exists to the fields retrieved from the
+        database, which are the name of the file locally and a boolean indicating if it already
         exists on disk, respectively.
 
         Args:
@@ -178,7 +629,10 @@ class SrcClass(object):
             dict: The local file information for a given source alias.
         """
         file_id = '.'.join([self.name, alias])
-        file_meta = mu.get_file_meta(file_id, args)
+        if self.file_meta is None:
+            self.file_meta = mu.get_source_file_meta(self.name, args)
+        file_meta = dict(self.file_meta.get(file_id, {'file_id': file_id,
+                                                      'file_exists': False}))
         f_dir = os.path.join(self.args.working_dir, self.args.data_path, self.name)
         f_dir = os.path.join(f_dir, alias)
         url = self.get_remote_url(alias)
@@ -202,19 +656,18 @@ class SrcClass(object):
         Returns:
             int: The remote file size in bytes.
         """
-        remote_url = self.get_remote_url(alias)
+        headers = self.get_remote_headers(alias)
         try:
-            response = urllib.request.urlopen(remote_url)
-            print(response.headers)
-            return int(response.headers['content-length'])
-        except (TypeError, ValueError, urllib.error.URLError):
+            return int(headers['content-length'])
+        except (KeyError, ValueError):
             return -1
 
     def get_remote_file_modified(self, alias):
         """Return the remote file date modified.
 
         This returns the remote file date modifed as specificied by the
-        'last-modified' page header.
+        'last-modified' page header, or the 'modified' timestamp of an ftp
+        file (see probe_ftp).
 
         Args:
             remote_url (str): The url of the remote file to get the date
@@ -224,15 +677,74 @@ class SrcClass(object):
             float: time of last modification time of remote file in seconds
                 since the epoch
         """
-        remote_url = self.get_remote_url(alias)
+        headers = self.get_remote_headers(alias)
+        if 'modified' in headers:
+            return float(headers['modified'])
         try:
-            response = urllib.request.urlopen(remote_url)
-            time_str = response.headers['last-modified']
+            time_str = headers['last-modified']
             time_format = "%a, %d %b %Y %H:%M:%S %Z"
             return time.mktime(time.strptime(time_str, time_format))
-        except (urllib.error.URLError, ValueError, TypeError, ConnectionResetError):
+        except (KeyError, ValueError):
             return float(0)
 
+    def get_remote_headers(self, alias):
+        """Return the headers of the remote file of the alias.
+
+        This probes the remote url of the alias (see get_remote_url and
+        cached_probe) the first time it is called for the alias, and returns
+        the stored headers afterwards, so the size and date modified of the
+        file are read from a single request.
+
+        Args:
+            alias (str): An alias defined in self.aliases.
+
+        Returns:
+            dict: The response headers, with lowercase names.
+        """
+        if alias not in self.remote_headers:
+            self.remote_headers[alias] = cached_probe(
+                self.get_remote_url(alias), self.args.meta_cache_dir,
+                self.args.meta_cache_ttl)
+        return self.remote_headers[alias]
+
+    def get_page(self, url):
+        """Return the body of a remote page, such as a release notes page.
+
+        This reads the page through the remote metadata cache shared by all
+        sources (see get_page and args.meta_cache_dir), so release pages and
+        listings are only downloaded again when they change.
+
+        Args:
+            url (str): The url of the page.
+
+        Returns:
+            bytes: The body of the page.
+        """
+        return get_page(url, self.args.meta_cache_dir, self.args.meta_cache_ttl)
+
+    def probe_remote(self):
+        """Probes the remote files of all aliases concurrently.
+
+        This fills self.remote_headers for every alias (see
+        get_remote_headers) with PROBE_WORKERS probes running at the same
+        time, each alias url probed once. It does nothing if the source
+        overrides both get_remote_file_size and get_remote_file_modified, as
+        the headers would not be used.
+        """
+        src_cls = type(self)
+        if src_cls.get_remote_file_size is not SrcClass.get_remote_file_size and \
+            src_cls.get_remote_file_modified is not SrcClass.get_remote_file_modified:
+            return
+        urls = {alias: self.get_remote_url(alias) for alias in self.aliases
+                if alias not in self.remote_headers}
+        unique_urls = sorted(set(urls.values()))
+        probe = functools.partial(cached_probe, cache_dir=self.args.meta_cache_dir,
+                                  ttl=self.args.meta_cache_ttl)
+        with ThreadPoolExecutor(PROBE_WORKERS) as pool:
+            probed = dict(zip(unique_urls, pool.map(probe, unique_urls)))
+        for alias, url in urls.items():
+            self.remote_headers[alias] = probed[url]
+
     def get_remote_url(self, alias):
         """Return the remote url needed to fetch the file corresponding to the
         alias.
@@ -378,12 +890,124 @@ def get_SrcClass(args, *posargs, **kwargs):
     """
     return SrcClass(args, *posargs, **kwargs)
 
+def get_src_fields(src_obj):
+    """Returns the attributes of a source class object that can be saved to
+    json, so that get_offline_SrcClass can restore them without running the
+    constructor of the source.
+
+    Sets, tuples and dictionary views are saved as lists. Attributes that
+    cannot be saved to json and those in OFFLINE_SKIP are left out.
+
+    Args:
+        src_obj (SrcClass): a source class object
+
+    Returns:
+        dict: the attributes of src_obj, keyed by name
+    """
+    fields = dict()
+    for key, value in vars(src_obj).items():
+        if key in OFFLINE_SKIP:
+            continue
+        if isinstance(value, (set, frozenset, tuple, KeysView, ValuesView)):
+            value = list(value)
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        fields[key] = value
+    return fields
+
+def get_offline_SrcClass(version_json, args=None):
+    """Returns an object of the source class rebuilt from version_json.
+
+    This builds the source class object of the source described by
+    version_json (a file_metadata.json written by compare_versions) without
+    running its constructor, so that the many fetch and table jobs of a
+    source start quickly and without any network or database access. The
+    attributes set by the constructor are restored from the src_fields
+    recorded by check (see get_src_fields), and the aliases, remote urls,
+    versions, sizes and dates the constructor would look up remotely are
+    taken from the file_metadata.json of every alias of the source, by
+    shadowing get_aliases, get_remote_url, get_source_version,
+    get_remote_file_size and get_remote_file_modified on the object. Aliases
+    without a file_metadata.json still use the methods of the class. Sources
+    with several source classes, or checked before src_fields were recorded,
+    are constructed as usual (see get_SrcClass).
+
+    Args:
+        version_json (str): path to a json file describing the source:alias
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        SrcClass: a source class object
+    """
+    if args is None:
+        args = cf.config_args()
+    with open(version_json, 'r') as infile:
+        version_dict = json.load(infile)
+    version_dicts = dict()
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(version_json)))
+    for alias in sorted(os.listdir(src_dir)):
+        meta_file = os.path.join(src_dir, alias, 'file_metadata.json')
+        if not os.path.isfile(meta_file):
+            continue
+        try:
+            with open(meta_file, 'r') as infile:
+                alias_dict = json.load(infile)
+        except ValueError:
+            # being rewritten by the fetch of that alias
+            continue
+        if alias_dict.get('source') == version_dict['source']:
+            version_dicts[alias_dict['alias']] = alias_dict
+    version_dicts[version_dict['alias']] = version_dict
+
+    src_code_dir = os.path.join(args.code_path, args.src_path)
+    if src_code_dir not in sys.path:
+        sys.path.append(src_code_dir)
+    src_module = __import__(version_dict['source'])
+    src_classes = [obj for obj in vars(src_module).values()
+                   if isinstance(obj, type) and issubclass(obj, SrcClass)
+                   and obj.__module__ == src_module.__name__]
+    if len(src_classes) != 1 or 'src_fields' not in version_dict:
+        return src_module.get_SrcClass(args)
+    src_class = src_classes[0]
+    src_obj = object.__new__(src_class)
+    src_obj.chunk_size = 500000
+    vars(src_obj).update(version_dict['src_fields'])
+    src_obj.aliases = {alias: alias_dict['alias_info']
+                       for alias, alias_dict in version_dicts.items()}
+    src_obj.version = {alias: alias_dict['remote_version']
+                       for alias, alias_dict in version_dicts.items()}
+    src_obj.remote_headers = dict()
+    src_obj.file_meta = None
+    src_obj.args = args
+
+    def recorded(key, method):
+        """Returns a lookup of key in version_dicts falling back to method."""
+        def lookup(alias):
+            if alias in version_dicts:
+                return version_dicts[alias][key]
+            return method(src_obj, alias)
+        return lookup
+
+    src_obj.get_aliases = lambda args=None: dict(src_obj.aliases)
+    src_obj.get_remote_url = recorded('remote_url', src_class.get_remote_url)
+    src_obj.get_source_version = recorded('remote_version',
+                                          src_class.get_source_version)
+    src_obj.get_remote_file_size = recorded('remote_size',
+                                            src_class.get_remote_file_size)
+    src_obj.get_remote_file_modified = recorded(
+        'remote_date', src_class.get_remote_file_modified)
+    return src_obj
+
 def compare_versions(src_obj, args=None):
     """Return a dictionary with the version information for each alias in the
     source and write a dictionary for each alias to file.
 
     This returns a nested dictionary describing the version information of each
-    alias in the source. The version information is also printed.
+    alias in the source. The remote files of all aliases are probed
+    concurrently first (see SrcClass.probe_remote). The version information
+    is also printed.
 
     Args:
         src_obj (SrcClass): A SrcClass object for which the comparison should
@@ -410,6 +1034,10 @@ def compare_versions(src_obj, args=None):
                 'remote_size' (int):            See get_remote_file_size,
                 'local_file_name' (str):        See get_local_version_info,
                 'file_exists' (bool):           See get_local_version_info,
+                'local_checksum' (str):         The md5 checksum of the file
+                                                from the previous fetch, or
+                                                None if unknown,
+                'src_fields' (dict):            See get_src_fields,
                 'fetch_needed' (bool):          True if file needs to be downloaded
                                                 from remote source. A fetch will
                                                 be needed if the local file does
@@ -420,6 +1048,7 @@ def compare_versions(src_obj, args=None):
     """
     version_dict = dict()
     file_meta = dict()
+    src_obj.probe_remote()
     for alias in src_obj.aliases:
         print('Comparing versions for {0}'.format(alias))
         file_meta[alias] = src_obj.get_local_version_info(alias, args)
@@ -441,6 +1070,8 @@ def compare_versions(src_obj, args=None):
             file_meta[alias]['local_file_name']
         version_dict[alias]['file_exists'] = \
             file_meta[alias]['file_exists']
+        version_dict[alias]['local_checksum'] = \
+            file_meta[alias].get('checksum')
         version_dict[alias]['source_url'] = src_obj.source_url
         version_dict[alias]['image'] = src_obj.image
         version_dict[alias]['reference'] = src_obj.reference
@@ -469,7 +1100,9 @@ def compare_versions(src_obj, args=None):
     f_dir = os.path.join(src_obj.args.working_dir, src_obj.args.data_path,
                          src_obj.name)
     os.makedirs(f_dir, exist_ok=True)
+    src_fields = get_src_fields(src_obj)
     for alias in src_obj.aliases:
+        version_dict[alias]['src_fields'] = src_fields
         a_dir = os.path.join(f_dir, alias)
         os.makedirs(a_dir, exist_ok=True)
         f_name = os.path.join(a_dir, 'file_metadata.json')
@@ -479,16 +1112,20 @@ def compare_versions(src_obj, args=None):
     print("printing file_metadata.json")
     return version_dict
 
-def check(module, args=None):
+def check(module, args=None, clear_listings=True):
     """Runs compare_versions(SrcClass) on a 'module' object
 
     This runs the compare_versions function on a 'module' object to find the
     version information of the source and determine if a fetch is needed. The
-    version information is also printed.
+    version information is also printed. The ftp listings cached by an
+    earlier check are forgotten first (see clear_ftp_listings).
 
     Args:
         module (str): string name of module defining source specific class
         args (Namespace): args as populated namespace or 'None' for defaults
+        clear_listings (bool): whether to forget the cached ftp listings,
+            False when the listings are shared with other sources checked
+            in the same run (see check_all)
 
     Returns:
         dict: A nested dictionary describing the version information for each
@@ -496,15 +1133,64 @@ def check(module, args=None):
     """
     if args is None:
         args = cf.config_args()
+    set_host_connections(args.check_connections)
+    if clear_listings:
+        clear_ftp_listings()
     src_code_dir = os.path.join(args.code_path, args.src_path)
     sys.path.append(src_code_dir)
     src_module = __import__(module)
     SrcClass = src_module.get_SrcClass(args)
     version_dict = compare_versions(SrcClass, args)
-    for alias in version_dict:
-        iu.import_filemeta(version_dict[alias], args)
+    iu.import_filemetas(list(version_dict.values()), args)
+    failed_file = os.path.join(args.working_dir, args.data_path, module,
+                               CHECK_FAILED)
+    if os.path.isfile(failed_file):
+        os.remove(failed_file)
     return version_dict
 
+def check_all(modules, args=None):
+    """Runs check on all the provided modules in a single process.
+
+    This checks up to CHECK_WORKERS sources at the same time (see check),
+    each probing its aliases concurrently, while the requests sent to any one
+    host are limited to HOST_CONNECTIONS (see host_slot). It writes the same
+    file_metadata.json files and raw_file rows as checking each source in
+    its own job. A source that fails does not stop the others: the error is
+    written to CHECK_FAILED in the data directory of the source, so that only
+    the fetch of that source is refused (see workflow_utilities.run_fetch).
+    An error is raised only if every source failed. The sources share the
+    ftp listings of this run, which start empty (see clear_ftp_listings).
+
+    Args:
+        modules (list): string names of modules defining source specific
+            classes
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        dict: The version information (see check) of each module.
+    """
+    if args is None:
+        args = cf.config_args()
+    results = dict()
+    failed = list()
+    clear_ftp_listings()
+    with ThreadPoolExecutor(CHECK_WORKERS) as pool:
+        futures = {module: pool.submit(check, module, args, False)
+                   for module in modules}
+        for module in modules:
+            try:
+                results[module] = futures[module].result()
+            except Exception as err:
+                print('Check failed for {0}: {1!r}'.format(module, err))
+                failed.append(module)
+                src_dir = os.path.join(args.working_dir, args.data_path, module)
+                os.makedirs(src_dir, exist_ok=True)
+                with open(os.path.join(src_dir, CHECK_FAILED), 'w') as outfile:
+                    outfile.write('{0!r}\n'.format(err))
+    if failed and len(failed) == len(modules):
+        raise IOError('Check failed for ' + ', '.join(failed))
+    return results
+
 def main_parse_args():
     """Processes command line arguments.
 
@@ -516,11 +1202,15 @@ def main_parse_args():
         Namespace: args as populated namespace
     """
     parser = ArgumentParser()
-    parser.add_argument('module', help='select SrcClass to check, e.g. dip')
+    parser.add_argument('module', help='select SrcClass to check, e.g. dip, '
+                        'or a ,, separated list of SrcClasses')
     parser = cf.add_config_args(parser)
     args = parser.parse_args()
     return args
 
 if __name__ == "__main__":
     args = main_parse_args()
-    check(args.module, args)
+    if ',,' in args.module:
+        check_all(args.module.split(',,'), args)
+    else:
+        check(args.module, args)
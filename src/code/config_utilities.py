@@ -9,6 +9,7 @@ Contains module functions::
     add_file_config_args(parser)
     add_mysql_config_args(parser)
     add_redis_config_args(parser)
+    add_fetch_config_args(parser)
     add_config_args(parser)
     config_args()
     pretty_name(orig_name, endlen=63)
@@ -36,6 +37,7 @@ DEFAULT_CHRONOS_URL = '127.0.0.1:8888'
 DEFAULT_MARATHON_URL = '127.0.0.1:8080'
 DEFAULT_BUILD_IMAGE = 'knoweng/kn_builder:latest'
 DEFAULT_ENS_SPECIES = 'homo_sapiens'
+DEFAULT_NUM_PROCS = 1
 
 def add_run_config_args(parser):
     """Add global configuation options to command line arguments.
@@ -54,6 +56,7 @@ def add_run_config_args(parser):
     --src_classes   |str    |-srcs  |',,' separated source keywords to run in parse pipeline
     --force_fetch   |bool   |-ff    |fetch even if file exists and is unchanged from last run
     --test_mode     |bool   |-tm    |run in test mode by only printing commands
+    --num_procs     |int    |-np    |number of worker processes for parallel steps
 
     Args:
         parser (argparse.ArgumentParser): a parser to add global config opts to
@@ -75,6 +78,8 @@ def add_run_config_args(parser):
                         help='fetch even if file exists and has not changed from last run')
     parser.add_argument('-tm', '--test_mode', action='store_true', default=False,
                         help='run in test mode by only printing commands')
+    parser.add_argument('-np', '--num_procs', type=int, default=DEFAULT_NUM_PROCS,
+                        help='number of worker processes for parallel steps')
     return parser
 
 
@@ -186,6 +191,7 @@ DEFAULT_REDIS_DIR = os.path.join(DEFAULT_WORKING_DIR, 'kn-redis')
 DEFAULT_REDIS_MEM = '0'
 DEFAULT_REDIS_CPU = '0.5'
 DEFAULT_REDIS_PASS = 'KnowEnG'
+DEFAULT_REDIS_BUCKETS = 0
 
 def add_redis_config_args(parser):
     """Add global configuation options to command line arguments.
@@ -203,6 +209,10 @@ def add_redis_config_args(parser):
     --redis_mem     |str    |-rm    |memory for deploying redis container
     --redis_cpu     |str    |-rc    |cpus for deploying redis container
     --redis_pass    |str    |-rps   |password for Redis db
+    --redis_lua     |bool   |-rl    |resolve gene mappings with one Lua script call per batch
+    --map_snapshot  |str    |-ms    |absolute path of gene mapping snapshot used by map jobs instead of Redis, empty for Redis
+    --redis_hash_meta |bool |-rhm   |store node metadata in one Redis hash per node
+    --redis_buckets |int    |-rb    |number of Redis hashes the gene mappings are stored in, 0 for a key per mapping
 
     Args:
         parser (argparse.ArgumentParser): a parser to add global config opts to
@@ -222,6 +232,121 @@ def add_redis_config_args(parser):
                         help='cpus for deploying redis container')
     parser.add_argument('-rps', '--redis_pass', default=DEFAULT_REDIS_PASS,
                         help='password for Redis db')
+    parser.add_argument('-rl', '--redis_lua', action='store_true', default=False,
+                        help='resolve gene mappings with one Lua script call per '
+                        'batch')
+    parser.add_argument('-ms', '--map_snapshot', default='',
+                        help='absolute path of gene mapping snapshot used by map '
+                        'jobs instead of Redis, empty for Redis')
+    parser.add_argument('-rhm', '--redis_hash_meta', action='store_true',
+                        default=False,
+                        help='store node metadata in one Redis hash per node')
+    parser.add_argument('-rb', '--redis_buckets', type=int,
+                        default=DEFAULT_REDIS_BUCKETS,
+                        help='number of Redis hashes the gene mappings are stored '
+                        'in, 0 for a key per mapping')
+    return parser
+
+
+DEFAULT_DOWNLOAD_SEGMENTS = 1
+DEFAULT_CACHE_SIZE = 100
+DEFAULT_TARGET_JOB_TIME = 0
+DEFAULT_META_CACHE_TTL = 6 * 3600
+DEFAULT_CHECK_CONNECTIONS = 4
+DEFAULT_HOST_RATE = 2
+DEFAULT_HOST_CONNECTIONS = 4
+DEFAULT_FETCH_BATCH_SIZE = 0
+DEFAULT_SORT_MEMORY = 200
+DEFAULT_SORT_COMPRESS = 1
+DEFAULT_MERGE_FAN_IN = 64
+
+def add_fetch_config_args(parser):
+    """Add global configuation options to command line arguments.
+
+    If global arguments are not specified, supplies their default values.
+
+.. csv-table::
+    :header: parameter,argument,flag,description
+    :widths: 4,2,2,12
+    :delim: |
+
+    --stream_fetch  |bool   |-sf    |stream downloads into chunks without full-size copies
+    --keep_files    |bool   |-kf    |keep full-size downloaded files when streaming
+    --download_segments |int |-ds   |number of parallel range segments per http download
+    --cache_dir     |str    |-cd    |absolute path of shared download cache, empty to disable
+    --cache_size    |float  |-cs    |size budget of the download cache in GB
+    --incremental_build |bool |-ib  |chunk only lines added since the previous fetch
+    --target_job_time |float |-tj   |target seconds per table and map job, 0 for fixed chunk sizes
+    --meta_cache_dir |str   |-mcd   |absolute path of remote metadata cache for check, empty to disable
+    --meta_cache_ttl |float |-mct   |seconds cached remote metadata is used without revalidation
+    --check_connections |int |-chc  |maximum concurrent check requests to each host
+    --host_rate     |float  |-hr    |maximum requests per second to each download host
+    --host_connections |int |-hc    |maximum concurrent downloads from each host
+    --fetch_batch_size |float |-fbs |MB of small aliases of a source packed into one fetch job, 0 to disable
+    --sort_memory   |float  |-sm    |MB of lines held in memory by each sort before spilling runs to disk
+    --sort_compress |int    |-sc    |gzip level of runs spilled by sorts, 0 for no compression
+    --merge_fan_in  |int    |-mfi   |maximum number of sorted files merged at once by each merge
+    --stream_import |bool   |-si    |import merged tables through named pipes without writing merged files
+
+    Args:
+        parser (argparse.ArgumentParser): a parser to add global config opts to
+
+    Returns:
+        argparse.ArgumentParser: parser with appended global options
+    """
+    parser.add_argument('-sf', '--stream_fetch', action='store_true', default=False,
+                        help='stream downloads into chunks without full-size copies')
+    parser.add_argument('-kf', '--keep_files', action='store_true', default=False,
+                        help='keep full-size downloaded files when streaming')
+    parser.add_argument('-ds', '--download_segments', type=int,
+                        default=DEFAULT_DOWNLOAD_SEGMENTS,
+                        help='number of parallel range segments per http download')
+    parser.add_argument('-cd', '--cache_dir', default='',
+                        help='absolute path of shared download cache, empty to disable')
+    parser.add_argument('-cs', '--cache_size', type=float, default=DEFAULT_CACHE_SIZE,
+                        help='size budget of the download cache in GB')
+    parser.add_argument('-ib', '--incremental_build', action='store_true',
+                        default=False,
+                        help='chunk only lines added since the previous fetch')
+    parser.add_argument('-tj', '--target_job_time', type=float,
+                        default=DEFAULT_TARGET_JOB_TIME,
+                        help='target seconds per table and map job, 0 for fixed '
+                        'chunk sizes')
+    parser.add_argument('-mcd', '--meta_cache_dir', default='',
+                        help='absolute path of remote metadata cache for check, '
+                        'empty to disable')
+    parser.add_argument('-mct', '--meta_cache_ttl', type=float,
+                        default=DEFAULT_META_CACHE_TTL,
+                        help='seconds cached remote metadata is used without '
+                        'revalidation')
+    parser.add_argument('-chc', '--check_connections', type=int,
+                        default=DEFAULT_CHECK_CONNECTIONS,
+                        help='maximum concurrent check requests to each host')
+    parser.add_argument('-hr', '--host_rate', type=float, default=DEFAULT_HOST_RATE,
+                        help='maximum requests per second to each download host')
+    parser.add_argument('-hc', '--host_connections', type=int,
+                        default=DEFAULT_HOST_CONNECTIONS,
+                        help='maximum concurrent downloads from each host')
+    parser.add_argument('-fbs', '--fetch_batch_size', type=float,
+                        default=DEFAULT_FETCH_BATCH_SIZE,
+                        help='MB of small aliases of a source packed into one '
+                        'fetch job, 0 to disable')
+    parser.add_argument('-sm', '--sort_memory', type=float,
+                        default=DEFAULT_SORT_MEMORY,
+                        help='MB of lines held in memory by each sort before '
+                        'spilling runs to disk')
+    parser.add_argument('-sc', '--sort_compress', type=int,
+                        default=DEFAULT_SORT_COMPRESS,
+                        help='gzip level of runs spilled by sorts, 0 for no '
+                        'compression')
+    parser.add_argument('-mfi', '--merge_fan_in', type=int,
+                        default=DEFAULT_MERGE_FAN_IN,
+                        help='maximum number of sorted files merged at once by '
+                        'each merge')
+    parser.add_argument('-si', '--stream_import', action='store_true',
+                        default=False,
+                        help='import merged tables through named pipes without '
+                        'writing merged files')
     return parser
 
 
@@ -244,6 +369,8 @@ def add_config_args(parser):
     group3 = add_mysql_config_args(group3)
     group4 = parser.add_argument_group('redis arguments')
     group4 = add_redis_config_args(group4)
+    group5 = parser.add_argument_group('fetch arguments')
+    group5 = add_fetch_config_args(group5)
     return parser
 
 
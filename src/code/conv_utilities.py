@@ -29,12 +29,16 @@ import sys
 import hashlib
 import os
 import json
+import time
 from argparse import ArgumentParser
 from collections import defaultdict
 import config_utilities as cf
 import redis_utilities as ru
 import table_utilities as tu
 import import_utilities as iu
+import plan_utilities as pu
+import sort_utilities as st
+import snapshot_utilities as sn
 
 csv.field_size_limit(sys.maxsize)
 
@@ -45,12 +49,15 @@ def main(tablefile, args=None):
     """Maps the nodes for the source:alias tablefile.
 
     This takes the path to an tablefile (see table_utilities.main) and maps
-    the nodes in it using the Redis DB. It then outputs a status files in
+    the nodes in it using the Redis DB, or the mapping snapshot of
+    args.map_snapshot (see snapshot_utilities.get_mapper). It then outputs a status files in
     the format (table_hash, n1, n2, edge_type, weight, edge_hash, line_hash,
     status, status_desc), where status is production if both nodes mapped and
     unmapped otherwise. It also outpus an edge file which all rows where status
     is production, in the format (edge_hash, n1, n2, edge_type, weight), and
-    and edge2line file in the formate (edge_hash, line_hash).
+    and edge2line file in the formate (edge_hash, line_hash). The rows mapped
+    and the time taken are recorded for planning the chunks of the next build
+    (see plan_utilities.write_chunk_stats).
 
     Args:
         tablefile (str): path to an tablefile to be mapped
@@ -63,7 +70,10 @@ def main(tablefile, args=None):
             iu.import_pnode(tablefile.replace('conv', 'node'), args)
         iu.import_edge(tablefile, args)
         return
-    rdb = ru.get_database(args)
+    start = time.time()
+    st.set_sort_limits(args.sort_memory, args.num_procs, args.sort_compress,
+                       args.merge_fan_in)
+    rdb = sn.get_mapper(args)
     edge_file = tablefile.replace('table', 'edge')
     status_file = tablefile.replace('table', 'status')
     ue_file = tablefile.replace('table', 'unique.edge')
@@ -130,12 +140,16 @@ def main(tablefile, args=None):
     tu.csu(edge_file, ue_file)
     tu.csu(status_file, us_file)
     tu.csu(us_file, ue2l_file, [6, 7])
+    stats_file = tablefile.replace('.table.', '.map_stats.')
+    pu.write_chunk_stats(os.path.splitext(stats_file)[0] + '.json', {
+        'map_rows': pu.count_lines(tablefile),
+        'map_seconds': time.time() - start})
 
 def map_list(namefile, args=None):
     """Maps the nodes for the provided namefile.
 
     This takes the path to an namefile and maps the nodes in it using the Redis
-    DB. It then outputs an mapped file in the format (mapped, original).
+    DB or the mapping snapshot of args.map_snapshot. It then outputs an mapped file in the format (mapped, original).
 
     Args:
         namefile (str): path to an namefile to be mapped
@@ -143,7 +157,7 @@ def map_list(namefile, args=None):
     """
     if args is None:
         args = main_parse_args()
-    rdb = ru.get_database(args)
+    rdb = sn.get_mapper(args)
     with open(namefile, 'r') as infile, \
         open(os.path.splitext(namefile)[0] + '.node_map.txt', 'w') as n_map:
         reader = csv.reader(infile, delimiter='\t')
@@ -0,0 +1,512 @@
+"""Utiliites for downloading remote files for the Knowledge Network (KN) with
+resumable and range-segmented transfers.
+
+Contains the class HostLimiter which schedules the requests sent to one host
+so that all downloads from the host share its rate and connection limits.
+
+Contains module functions::
+
+    set_host_limits(rate, connections)
+    get_limiter(url)
+    get_retry_after(headers)
+    get_validator(headers)
+    read_validator(partfile)
+    write_validator(partfile, validator)
+    remove_part(partfile)
+    get_remote_info(url)
+    download_range(url, partfile, start, end, tries=3, sleeptime=0)
+    download_http(url, filename, segments=1, tries=3, sleeptime=0)
+    download_ftp(url, filename, tries=3, sleeptime=0)
+    download_url(url, filename, segments=1, expected_size=-1, tries=3,
+                 sleeptime=0)
+
+Attributes:
+    USER_AGENT (str): the user-agent sent with every http request
+    BLOCKSIZE (int): number of bytes copied at a time
+    PART_EXT (str): extension of partially downloaded files
+    VALIDATOR_EXT (str): extension of the file next to a part file keeping
+        the validator (ETag or Last-Modified) of the remote file it holds
+    TIMEOUT (int): seconds to wait on a stalled connection
+    HOST_RATE (float): maximum requests per second to each host
+    HOST_CONNECTIONS (int): maximum concurrent requests to each host
+    BACKOFF_STATUS (tuple): the http statuses that slow a host down
+    CONNECTION_ERRORS (tuple): the errors counted as a failed connection to
+        a host
+    MIN_RATE (float): the lowest rate a host is slowed down to
+    MAX_BACKOFF (int): maximum seconds a host is paused after an error
+    LIMITERS (dict): the HostLimiter of each host, keyed by netloc
+
+Examples:
+    To download a file in four parallel segments::
+
+        $ python3 code/download_utilities.py http://host/file.gz file.gz -ds 4
+
+"""
+
+import urllib.request
+import urllib.error
+import urllib.parse
+import ftplib
+import os
+import socket
+import shutil
+import threading
+import email.utils
+from time import sleep, time, monotonic
+from concurrent.futures import ThreadPoolExecutor
+from argparse import ArgumentParser
+import config_utilities as cf
+
+USER_AGENT = "Mozilla/5.0"
+BLOCKSIZE = 1024 * 1024
+PART_EXT = '.part'
+VALIDATOR_EXT = '.validator'
+TIMEOUT = 300
+HOST_RATE = cf.DEFAULT_HOST_RATE
+HOST_CONNECTIONS = cf.DEFAULT_HOST_CONNECTIONS
+BACKOFF_STATUS = (429, 503)
+CONNECTION_ERRORS = (urllib.error.URLError, socket.timeout, ConnectionError,
+                     ftplib.error_temp)
+MIN_RATE = 0.01
+MAX_BACKOFF = 600
+LIMITERS = dict()
+LIMITERS_LOCK = threading.Lock()
+
+class HostLimiter(object):
+    """Schedules the requests sent to one remote host.
+
+    A request waits for one of the connections of the host and for a token
+    of its token bucket, which refills at the current rate of the host. A
+    429 or 503 response, or a failed connection, halves the rate and pauses
+    the host for the Retry-After sent by the server or one request interval.
+    Every successful request raises the rate again by a tenth of the maximum
+    rate, so the host is probed back up to its limit.
+
+    A HostLimiter is used as a context manager around each request. An
+    urllib.error.HTTPError raised in the block is counted with its status,
+    and an error of CONNECTION_ERRORS as a failed connection. Any other
+    error frees the connection without changing the rate.
+
+    Attributes:
+        max_rate (float): the maximum requests per second to the host
+        rate (float): the current requests per second to the host
+        tokens (float): the requests that may be sent without waiting
+        updated (float): the monotonic time tokens was last refilled
+        paused_until (float): the monotonic time the host is paused until
+        slots (threading.BoundedSemaphore): the connections to the host
+        lock (threading.Lock): lock guarding the rate and tokens
+    """
+    def __init__(self, rate=HOST_RATE, connections=HOST_CONNECTIONS):
+        """Init a HostLimiter with the provided limits.
+
+        Args:
+            rate (float): the maximum requests per second to the host
+            connections (int): the maximum concurrent requests to the host
+        """
+        self.max_rate = max(float(rate), MIN_RATE)
+        self.rate = self.max_rate
+        self.tokens = 1.0
+        self.updated = monotonic()
+        self.paused_until = 0
+        self.slots = threading.BoundedSemaphore(max(int(connections), 1))
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Waits for a connection and a token of the host."""
+        self.slots.acquire()
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(max(self.rate, 1.0), self.tokens +
+                                  (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.paused_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+    def release(self, status=200, retry_after=None):
+        """Frees the connection and adapts the rate to the response status.
+
+        Args:
+            status (int): the http status of the response, 503 if the
+                connection failed, or None to keep the rate
+            retry_after (float): the seconds the server asked to wait, or
+                None
+        """
+        with self.lock:
+            if status in BACKOFF_STATUS:
+                self.rate = max(self.rate / 2, MIN_RATE)
+                if retry_after is None:
+                    retry_after = 1 / self.rate
+                self.tokens = 0
+                self.paused_until = max(self.paused_until, monotonic() +
+                                        min(retry_after, MAX_BACKOFF))
+            elif status is not None and status < 400:
+                self.rate = min(self.rate + self.max_rate / 10, self.max_rate)
+        self.slots.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if isinstance(exc, urllib.error.HTTPError):
+            self.release(exc.code, get_retry_after(exc.headers))
+        elif isinstance(exc, CONNECTION_ERRORS):
+            self.release(503)
+        elif exc is not None:
+            self.release(None)
+        else:
+            self.release()
+        return False
+
+def set_host_limits(rate, connections):
+    """Sets the limits of the hosts requested from now on.
+
+    Args:
+        rate (float): the maximum requests per second to each host
+        connections (int): the maximum concurrent requests to each host
+    """
+    global HOST_RATE, HOST_CONNECTIONS
+    HOST_RATE = rate
+    HOST_CONNECTIONS = connections
+
+def get_limiter(url):
+    """Returns the HostLimiter shared by all requests to the host of url.
+
+    Args:
+        url (str): a url on the host
+
+    Returns:
+        HostLimiter: the limiter of the host
+    """
+    netloc = urllib.parse.urlsplit(url).netloc
+    with LIMITERS_LOCK:
+        if netloc not in LIMITERS:
+            LIMITERS[netloc] = HostLimiter(HOST_RATE, HOST_CONNECTIONS)
+        return LIMITERS[netloc]
+
+def get_retry_after(headers):
+    """Returns the seconds to wait asked for by the Retry-After header.
+
+    Args:
+        headers (http.client.HTTPMessage): the headers of a response
+
+    Returns:
+        float: the seconds to wait, or None if the header is missing or
+            invalid
+    """
+    value = headers.get('retry-after') if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+def get_validator(headers):
+    """Returns the validator of a response to send back with If-Range.
+
+    This is the ETag of the response if it is a strong one, or otherwise its
+    Last-Modified date, as weak ETags cannot be used with If-Range.
+
+    Args:
+        headers (email.message.Message): the headers of the response
+
+    Returns:
+        str: the validator, or None if the response has none
+    """
+    etag = headers.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('last-modified')
+
+def read_validator(partfile):
+    """Returns the validator of the remote file partfile was downloaded from.
+
+    Args:
+        partfile (str): the part file
+
+    Returns:
+        str: the validator, or None if it was not recorded
+    """
+    try:
+        with open(partfile + VALIDATOR_EXT, 'r') as infile:
+            return infile.read() or None
+    except OSError:
+        return None
+
+def write_validator(partfile, validator):
+    """Records the validator of the remote file partfile is downloaded from.
+
+    Args:
+        partfile (str): the part file
+        validator (str): the validator (see get_validator), or None
+    """
+    with open(partfile + VALIDATOR_EXT, 'w') as outfile:
+        outfile.write(validator or '')
+
+def remove_part(partfile):
+    """Removes a part file and its validator if they exist.
+
+    Args:
+        partfile (str): the part file
+    """
+    for path in (partfile, partfile + VALIDATOR_EXT):
+        if os.path.isfile(path):
+            os.remove(path)
+
+def get_remote_info(url):
+    """Returns the size of the remote file and if it can be fetched in ranges.
+
+    This sends a HEAD request for the url and reads the 'content-length' and
+    'accept-ranges' headers. If the HEAD request fails, the size is unknown
+    and ranges are assumed to be unsupported.
+
+    Args:
+        url (str): the http(s) url of the remote file
+
+    Returns:
+        int: the remote file size in bytes, or -1 if unknown
+        bool: whether the server accepts byte range requests
+    """
+    request = urllib.request.Request(url, method='HEAD',
+                                     headers={'User-Agent': USER_AGENT})
+    try:
+        with get_limiter(url), \
+                urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            headers = response.headers
+    except (urllib.error.URLError, OSError):
+        return -1, False
+    try:
+        size = int(headers['content-length'])
+    except (TypeError, ValueError):
+        size = -1
+    ranges = str(headers.get('accept-ranges', '')).lower() == 'bytes'
+    return size, ranges
+
+def download_range(url, partfile, start, end, tries=3, sleeptime=0):
+    """Downloads bytes start to end of the remote file into partfile.
+
+    This appends to partfile if it already holds part of the range, so an
+    interrupted range is resumed from where it stopped. The validator of the
+    remote file is recorded next to partfile (see write_validator) and sent
+    as If-Range on resume, so that a remote file that changed since is
+    fetched again from the start of the range rather than appended to old
+    bytes. A part file without a validator is not resumed. If end is None,
+    the range runs to the end of the remote file. If the server ignores the
+    Range header, the part file is restarted from the first byte.
+
+    Args:
+        url (str): the http(s) url of the remote file
+        partfile (str): the file holding the downloaded part of the range
+        start (int): the first byte of the range
+        end (int): the last byte of the range (inclusive), or None
+        tries (int): number of attempts before giving up
+        sleeptime (int): seconds to sleep between attempts
+
+    Returns:
+        str: the path to partfile
+    """
+    for i in range(tries):
+        have = os.path.getsize(partfile) if os.path.isfile(partfile) else 0
+        validator = read_validator(partfile) if have else None
+        if have and validator is None:
+            have = 0
+        if end is not None and have >= end - start + 1:
+            return partfile
+        headers = {'User-Agent': USER_AGENT}
+        if start + have > 0 or end is not None:
+            headers['Range'] = 'bytes={0}-{1}'.format(
+                start + have, '' if end is None else end)
+        if have:
+            headers['If-Range'] = validator
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with get_limiter(url), \
+                    urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                if 'Range' in headers and response.status != 206:
+                    if start > 0:
+                        remove_part(partfile)
+                        raise IOError('Server ignored range request for ' + url)
+                    have = 0
+                elif have and get_validator(response.headers) != validator:
+                    remove_part(partfile)
+                    raise IOError('Remote file changed while resuming ' + url)
+                length = response.headers['content-length']
+                write_validator(partfile, get_validator(response.headers))
+                with open(partfile, 'ab' if have else 'wb') as outfile:
+                    shutil.copyfileobj(response, outfile, BLOCKSIZE)
+            if length is not None and \
+                    os.path.getsize(partfile) < have + int(length):
+                raise IOError('Connection closed early while downloading ' + url)
+            return partfile
+        except urllib.error.HTTPError as err:
+            if err.code == 416 and end is None and have > 0:
+                return partfile
+            if i == tries - 1:
+                raise
+        except OSError:
+            if i == tries - 1:
+                raise
+        sleep(sleeptime)
+    return partfile
+
+def download_http(url, filename, segments=1, tries=3, sleeptime=0):
+    """Downloads the remote http(s) file into filename.
+
+    If segments is greater than one and the server reports a size and accepts
+    byte ranges, the file is split into that many ranges which are fetched in
+    parallel (see download_range) and then joined. Otherwise the file is
+    fetched in a single range. Parts are kept on disk until the download
+    completes so that a later call resumes them, unless the parts turn out
+    to come from different versions of the remote file.
+
+    Args:
+        url (str): the http(s) url of the remote file
+        filename (str): the local path to save the file to
+        segments (int): maximum number of parallel ranges
+        tries (int): number of attempts per range before giving up
+        sleeptime (int): seconds to sleep between attempts
+
+    Returns:
+        int: the size reported by the server, or -1 if unknown
+    """
+    size, ranges = get_remote_info(url)
+    partfile = filename + PART_EXT
+    if segments > 1 and ranges and size > BLOCKSIZE * segments:
+        step = -(-size // segments)
+        bounds = [(start, min(start + step, size) - 1)
+                  for start in range(0, size, step)]
+        parts = ['{0}.{1}-{2}'.format(partfile, start, end) for start, end in bounds]
+        with ThreadPoolExecutor(len(bounds)) as pool:
+            futures = [pool.submit(download_range, url, part, start, end, tries,
+                                   sleeptime)
+                       for part, (start, end) in zip(parts, bounds)]
+            for future in futures:
+                future.result()
+        if len(set(read_validator(part) for part in parts)) > 1:
+            for part in parts:
+                remove_part(part)
+            raise IOError('Remote file changed while downloading ' + url)
+        with open(partfile, 'wb') as outfile:
+            for part in parts:
+                with open(part, 'rb') as infile:
+                    shutil.copyfileobj(infile, outfile, BLOCKSIZE)
+        for part in parts:
+            remove_part(part)
+    else:
+        if not ranges:
+            remove_part(partfile)
+        download_range(url, partfile, 0, None, tries, sleeptime)
+    os.replace(partfile, filename)
+    remove_part(partfile)
+    return size
+
+def download_ftp(url, filename, tries=3, sleeptime=0):
+    """Downloads the remote ftp file into filename.
+
+    The file is written to a part file and an interrupted transfer is resumed
+    with the REST command on the next attempt.
+
+    Args:
+        url (str): the ftp url of the remote file
+        filename (str): the local path to save the file to
+        tries (int): number of attempts before giving up
+        sleeptime (int): seconds to sleep between attempts
+
+    Returns:
+        int: the size reported by the server, or -1 if unknown
+    """
+    parsed = urllib.parse.urlparse(url)
+    path = urllib.parse.unquote(parsed.path)
+    partfile = filename + PART_EXT
+    size = -1
+    for i in range(tries):
+        have = os.path.getsize(partfile) if os.path.isfile(partfile) else 0
+        ftp = None
+        try:
+            with get_limiter(url):
+                ftp = ftplib.FTP(parsed.hostname, timeout=TIMEOUT)
+                ftp.login(parsed.username or 'anonymous', parsed.password or '')
+                ftp.voidcmd('TYPE I')
+                try:
+                    size = ftp.size(path)
+                except ftplib.error_perm:
+                    size = -1
+                if have != size:
+                    with open(partfile, 'ab') as outfile:
+                        ftp.retrbinary('RETR ' + path, outfile.write, BLOCKSIZE,
+                                       rest=have or None)
+                ftp.quit()
+            break
+        except ftplib.all_errors as err:
+            if ftp is not None:
+                ftp.close()
+            if i == tries - 1:
+                raise IOError('Failed to download ' + url + ': ' + str(err))
+            sleep(sleeptime)
+    os.replace(partfile, filename)
+    return size
+
+def download_url(url, filename, segments=1, expected_size=-1, tries=3,
+                 sleeptime=0):
+    """Downloads the remote file at url into filename and checks its size.
+
+    This downloads http(s) urls with download_http and ftp urls with
+    download_ftp, resuming any part file left by an interrupted attempt. The
+    size of the finished file is checked against the size reported by the
+    server and against expected_size (usually the remote_size recorded by the
+    check step) when they are known.
+
+    Args:
+        url (str): the url of the remote file
+        filename (str): the local path to save the file to
+        segments (int): maximum number of parallel http ranges
+        expected_size (int): the expected size in bytes, or -1 if unknown
+        tries (int): number of attempts per transfer before giving up
+        sleeptime (int): seconds to sleep between attempts
+
+    Returns:
+        str: the path to the downloaded file
+    """
+    if url.startswith('ftp'):
+        size = download_ftp(url, filename, tries, sleeptime)
+    else:
+        size = download_http(url, filename, segments, tries, sleeptime)
+    local_size = os.path.getsize(filename)
+    for remote_size in (size, expected_size):
+        if remote_size is not None and int(remote_size) > 0 and \
+                local_size != int(remote_size):
+            os.remove(filename)
+            raise IOError('Downloaded {0} bytes from {1} but expected {2}'.format(
+                local_size, url, remote_size))
+    return filename
+
+def main_parse_args():
+    """Processes command line arguments.
+
+    Expects two positional arguments (url, filename) and number of optional
+    arguments. If arguments are missing, supplies default values.
+
+    Returns:
+        Namespace: args as populated namespace
+    """
+    parser = ArgumentParser()
+    parser.add_argument('url', help='url of the remote file')
+    parser.add_argument('filename', help='local path to save the file to')
+    parser = cf.add_config_args(parser)
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+    args = main_parse_args()
+    download_url(args.url, args.filename, args.download_segments)
@@ -13,15 +13,13 @@ Functions:
 Variables:
     TABLE_LIST: list of tables of interest from Ensembl
 """
-import ftplib
 import json
 import urllib.request
 import re
-import time
 import os
 import shutil
 import mysql.connector
-from check_utilities import SrcClass, compare_versions
+from check_utilities import SrcClass, compare_versions, list_ftp_dir, probe_ftp
 import config_utilities as cf
 from fetch_utilities import download
 import mysql_utilities as db
@@ -56,12 +54,14 @@ def fetch(version_dict, args=cf.config_args()):
 
     Returns:
     """
-    shutil.move(download(version_dict), 'schema.sql')
+    # remote_size is the size of the whole directory, not of each table
+    version_dict = dict(version_dict, remote_size=-1)
+    shutil.move(download(version_dict, args), 'schema.sql')
     base_url = version_dict['remote_url']
     base_url = base_url[:base_url.rfind('/') + 1]
     for table in TABLE_LIST:
         version_dict['remote_url'] = base_url + table + '.txt.gz'
-        shutil.move(download(version_dict), table + '.txt')
+        shutil.move(download(version_dict, args), table + '.txt')
     try:
         db_import(version_dict, args)
     except mysql.connector.DatabaseError as err:
@@ -277,18 +277,18 @@ class Ensembl(SrcClass):
             version = version[1:-1]
         return version
 
-    def get_remote_file_size(self, alias):
-        """Return the remote file size.
+    def get_core_url(self, alias):
+        """Return the url of the remote directory of the core db of the alias.
 
-        This builds a url for the given alias (see get_remote_url) and then
-        calculates the file size of the directory by summing the size of all
-        the files it contains.
+        This finds the directory in the listing of the mysql directory of the
+        ensembl division of the alias (see check_utilities.list_ftp_dir),
+        which is listed once for all aliases in the division.
 
         Args:
             alias (str): An alias defined in self.aliases.
 
         Returns:
-            int: The remote file size in bytes.
+            str: The url of the core db directory, or '' if there is none.
         """
         (taxid, url, division) = self.aliases[alias].split('::')
         division = division.replace('Ensembl', '').lower()
@@ -296,26 +296,41 @@ class Ensembl(SrcClass):
             chdir = '/pub/current/{0}/mysql/'.format(division)
         else:
             chdir = '/pub/current_mysql/'
-        ftp = ftplib.FTP(url)
-        ftp.login()
-        ftp.cwd(chdir)
-        file_size = 0
-        file_dir = ''
-        for directory in ftp.nlst():
+        for directory, _ in list_ftp_dir('ftp://' + url + chdir):
             match = re.match(alias + r'_core_[\S]*', directory)
             if match is not None:
-                file_dir = directory
-                break
-        for file in ftp.nlst(file_dir):
-            ftp.voidcmd('TYPE I')
-            file_size += ftp.size(file)
-        ftp.quit()
+                return 'ftp://' + url + chdir + directory
+        return ''
+
+    def get_remote_file_size(self, alias):
+        """Return the remote file size.
+
+        This builds a url for the given alias (see get_core_url) and then
+        calculates the file size of the directory by summing the size of all
+        the files it contains, as reported by a single listing of the
+        directory (see check_utilities.probe_ftp).
+
+        Args:
+            alias (str): An alias defined in self.aliases.
+
+        Returns:
+            int: The remote file size in bytes.
+        """
+        core_url = self.get_core_url(alias)
+        if not core_url:
+            return 0
+        file_size = 0
+        for file, facts in list_ftp_dir(core_url):
+            if facts.get('type', 'file') != 'file':
+                continue
+            headers = probe_ftp(core_url + '/' + file)
+            file_size += int(headers.get('content-length', 0))
         return file_size
 
     def get_remote_file_modified(self, alias):
         """Return the remote file date modified.
 
-        This builds a url for the given alias (see get_remote_url) and then
+        This builds a url for the given alias (see get_core_url) and then
         gets the file modified date of the remote CHECKSUMS file (assumed to
         be roughly the same date for all files corresponding to the alias.
 
@@ -326,25 +341,11 @@ class Ensembl(SrcClass):
             float: time of last modification time of remote file in seconds
                 since the epoch
         """
-        (taxid, url, division) = self.aliases[alias].split('::')
-        division = division.replace('Ensembl', '').lower()
-        if division:
-            chdir = '/pub/current/{0}/mysql/'.format(division)
-        else:
-            chdir = '/pub/current_mysql/'
-        chk_file = '/CHECKSUMS'
-        ftp = ftplib.FTP(url)
-        ftp.login()
-        ftp.cwd(chdir)
-        for directory in ftp.nlst():
-            match = re.match(alias + r'_core_[\S]*', directory)
-            if match is not None:
-                time_str = ftp.sendcmd('MDTM ' + match.group(0) + chk_file)
-                time_str = time_str[4:]
-                time_format = "%Y%m%d%H%M%S"
-                ftp.quit()
-                return time.mktime(time.strptime(time_str, time_format))
-        return float(0)
+        core_url = self.get_core_url(alias)
+        if not core_url:
+            return float(0)
+        headers = probe_ftp(core_url + '/CHECKSUMS')
+        return float(headers.get('modified', 0))
 
     def get_remote_url(self, alias):
         """Return the remote url needed to fetch the file corresponding to the
@@ -360,24 +361,12 @@ class Ensembl(SrcClass):
         Returns:
             str: The url needed to fetch the file corresponding to the alias.
         """
-        (taxid, url, division) = self.aliases[alias].split('::')
-        division = division.replace('Ensembl', '').lower()
-        if division:
-            chdir = '/pub/current/{0}/mysql/'.format(division)
-        else:
-            chdir = '/pub/current_mysql/'
-        ftp = ftplib.FTP(url)
-        ftp.login()
-        ftp.cwd(chdir)
-        file_dir = ''
-        for directory in ftp.nlst():
-            match = re.match(alias + r'_core_[\S]*', directory)
-            if match is not None:
-                file_dir = directory
-                break
-        for file in ftp.nlst(file_dir):
+        core_url = self.get_core_url(alias)
+        if not core_url:
+            return ''
+        for file, _ in list_ftp_dir(core_url):
             if 'sql.gz' in file:
-                return 'ftp://' + url + chdir + file
+                return core_url + '/' + file
         return ''
 
     def is_map(self, alias):
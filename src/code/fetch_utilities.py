@@ -3,19 +3,33 @@ that has been updated.
 
 Contains module functions::
 
-    download(version_dict)
-    chunk(filename, total_lines)
+    download(version_dict, args=None)
+    peek(stream, seekable, size=512)
+    select_member(names, remote_file, archive)
+    open_member(stream, name, remote_file='', stack=None)
+    stream_chunk(version_dict, chunksize=500000, args=None)
+    chunk(filename, total_lines, chunksize=500000, processes=1)
+    delta_chunk(filename, chunksize=500000)
+    find_line_offsets(filename, line_nums)
     format_raw_line(filename)
     get_md5_hash(filename)
     get_line_count(filename)
+    is_unchanged(version_dict, md5hash, args=None)
     main_parse_args()
     main(version_json, args=None)
+    main_batch(version_jsons, args=None)
 
 Attributes:
     ARCHIVES (list): list of supported archive formats.
     DIR (str): the relative path to data/source/alias/ from location of
         script execution
-    MAX_CHUNKS (int): maximum number of chunks to split file into
+    BLOCKSIZE (int): number of bytes read at a time when scanning for line
+        boundaries
+    STRIP_BYTES (bytes): bytes removed from a line when writing its raw_line
+    INDEX_EXT (str): extension of the content index of the previous release
+        of a file, used by delta_chunk
+    DELETE_EXT (str): extension of the delete set written by delta_chunk in
+        the chunks directory
 
 Examples:
     To run fetch on a single source (e.g. dip) after check complete::
@@ -23,6 +37,12 @@ Examples:
         $ cd data/dip/PPI
         $ python3 ../../../code/fetch_utilities.py file_metadata.json
 
+    To run fetch on several aliases of a source in one process::
+
+        $ cd data
+        $ python3 ../code/fetch_utilities.py \
+            kegg/hsa/file_metadata.json,,kegg/mmu/file_metadata.json
+
     To view all optional arguments that can be specified::
 
         $ python3 code/fetch_utilities.py -h
@@ -30,7 +50,10 @@ Examples:
 """
 
 import urllib.request
+import urllib.error
+import io
 import json
+import tempfile
 import shutil
 import tarfile
 import zipfile
@@ -39,12 +62,19 @@ import os
 import sys
 import math
 import hashlib
-from random import randint
+import itertools
+from multiprocessing import Pool
 from time import sleep
+from contextlib import ExitStack
 from argparse import ArgumentParser
 import config_utilities as cf
+import cache_utilities as cu
+import download_utilities as du
 import import_utilities as iu
 import table_utilities as tu
+import sort_utilities as st
+import plan_utilities as pu
+import check_utilities as ch
 
 class AppURLopener(urllib.request.FancyURLopener):
     """URLopener to open with a custom user-agent."""
@@ -52,86 +82,289 @@ class AppURLopener(urllib.request.FancyURLopener):
 
 opener = AppURLopener()
 
-def openurl(url, filename, openfunc, tries=1, sleeptime=0):
-    for i in range(tries):
-        try:
-            with openfunc(url) as response:
-                with open(filename, 'wb') as outfile:
-                    shutil.copyfileobj(response, outfile)
-            return
-        except OSError:
-            sleep(sleeptime)
-    raise
-
 ARCHIVES = ['.zip', '.tar', '.gz']
-MAX_CHUNKS = 500
 DIR = "."
+BLOCKSIZE = 16 * 1024 * 1024
+STRIP_BYTES = bytes(range(128, 256)) + b'\n'
+INDEX_EXT = '.line_index.txt'
+DELETE_EXT = '.unique.line_delete.txt'
+
+def get_url_opener(version_dict):
+    """Returns how the remote file of the source alias should be opened.
+
+    Args:
+        version_dict (dict): A dictionary describing the attributes of the
+            alias for a source.
+
+    Returns:
+        str: the url of the remote file
+        function: the function used to open the url
+        int: the number of tries before giving up
+        int: the number of seconds to sleep between tries
+    """
+    url = version_dict['remote_url']
+    if url[-1] == '/':
+        url = url[:-1]
+    if "http" in url:
+        return url, opener.open, 3, 10
+    return url, urllib.request.urlopen, 3, 10
 
-def download(version_dict):
+def download(version_dict, args=None):
     """Returns the standardized path to the local file after downloading it
     from the source and unarchiving if needed.
 
     This returns the standardized path (path/source.alias.txt) for the
     source alias described in version_dict. If a download is needed
-    (as determined by the check step), the remote file will be downloaded.
+    (as determined by the check step), the remote file will be linked from
+    the download cache (see cache_utilities.get_cached) or downloaded (see
+    download_utilities.download_url) and added to the cache.
 
     Args:
         version_dict (dict): A dictionary describing the attributes of the
             alias for a source.
+        args (Namespace): args as populated namespace or 'None' for defaults
 
     Returns:
         str: The relative path to the newly downloaded file.
     """
 
+    if args is None:
+        args = cf.config_args()
     ret_file = version_dict['source'] + '.' + version_dict['alias'] + '.txt'
     #download remote file
-    url = version_dict['remote_url']
-    if url[-1] == '/':
-        url = url[:-1]
+    url, openfunc, tries, sleeptime = get_url_opener(version_dict)
     filename = version_dict['local_file_name']
-    if "http" in url:
-        if 'enrichr' in version_dict['source']:
-            openurl(url, filename, opener.open, tries=3, sleeptime=randint(10, 90))
-        else:
-            openurl(url, filename, opener.open)
-    else:
-        openurl(url, filename, urllib.request.urlopen)
+    if not cu.get_cached(version_dict, filename, args.cache_dir):
+        du.download_url(url, filename, args.download_segments,
+                        version_dict['remote_size'], tries, sleeptime)
+        cu.add_cached(version_dict, filename, args.cache_dir, args.cache_size)
     os.utime(filename, (0, version_dict['remote_date']))
 
-    #unzip remote file
-    while os.path.splitext(filename)[1] in ARCHIVES:
-        if tarfile.is_tarfile(filename):
-            with tarfile.open(filename) as tar:
-                tar.extractall(path=DIR)
-                file_list = tar.getnames()
-        elif zipfile.is_zipfile(filename):
-            with zipfile.ZipFile(filename) as zfile:
-                zfile.extractall(path=DIR)
-                file_list = zfile.namelist()
-        elif os.path.splitext(filename)[1] == '.gz':
-            with gzip.open(filename) as gzfile:
-                with open(filename[:-3], 'wb') as outfile:
-                    shutil.copyfileobj(gzfile, outfile)
-                file_list = [filename[:-3]]
+    #extract the needed member of the remote file
+    if os.path.splitext(filename)[1] not in ARCHIVES:
+        cu.link_file(filename, ret_file)
+        return os.path.relpath(ret_file)
+    #ret_file may still be a link to a cached file, so it is replaced
+    tmp_file = '{0}.{1}.tmp'.format(ret_file, os.getpid())
+    with ExitStack() as stack:
+        infile = stack.enter_context(open(filename, 'rb'))
+        member = open_member(infile, filename,
+                             version_dict.get('remote_file', ''), stack)
+        with open(tmp_file, 'wb') as outfile:
+            shutil.copyfileobj(member, outfile, du.BLOCKSIZE)
+    os.replace(tmp_file, ret_file)
+    return os.path.relpath(ret_file)
+
+def peek(stream, seekable, size=512):
+    """Returns the first size bytes of a stream without consuming them.
+
+    Args:
+        stream (io.BufferedReader): a seekable or peekable stream
+        seekable (bool): whether to seek back instead of peeking
+
+    Returns:
+        bytes: up to the first size bytes of the stream
+    """
+    if seekable:
+        pos = stream.tell()
+        head = stream.read(size)
+        stream.seek(pos)
+        return head
+    return stream.peek(size)[:size]
+
+def select_member(names, remote_file, archive):
+    """Returns the name of the archive member to extract.
+
+    This is the only member of the archive if there is just one, and
+    otherwise the member named remote_file.
+
+    Args:
+        names (list): the names of the members of the archive
+        remote_file (str): the name of the file to extract
+        archive (str): the name of the archive, for error messages
+
+    Returns:
+        str: the member to extract
+    """
+    if len(names) == 1:
+        return names[0]
+    if remote_file in names:
+        return remote_file
+    print("Remote file is a directory but version_dict"
+          "['remote_file'] was not found in " + archive)
+    exit()
+
+def open_member(stream, name, remote_file='', stack=None):
+    """Returns a stream of the file to keep from a possibly nested archive.
+
+    This peels the archive layers of stream (tar, zip and gzip, detected by
+    their magic bytes or by the extension of name) one at a time, opening
+    only the member needed (see select_member) of each layer. Nothing is
+    written to disk except when a zip file has to be read from a stream that
+    cannot seek (a download or a decompressed layer), in which case that
+    layer is spooled to a temporary file. Tar archives read from a stream
+    that cannot seek are scanned until the regular member named remote_file
+    is found, with the first regular member spooled to a temporary file in
+    case it turns out to be the only one.
+
+    Args:
+        stream (file): a binary stream of the archive
+        name (str): the file name of the archive
+        remote_file (str): the name of the file to extract if the archive
+            has more than one member
+        stack (ExitStack): stack the opened layers are registered with
+
+    Returns:
+        io.BufferedReader: a stream of the uncompressed file
+    """
+    if stack is None:
+        stack = ExitStack()
+    seekable = stream.seekable()
+    if not isinstance(stream, io.BufferedReader):
+        stream = io.BufferedReader(stream, du.BLOCKSIZE)
+    while os.path.splitext(name)[1] in ARCHIVES:
+        head = peek(stream, seekable)
+        ext = os.path.splitext(name)[1]
+        if head[257:262] == b'ustar' or ext == '.tar':
+            if seekable:
+                tar = stack.enter_context(tarfile.open(fileobj=stream))
+                names = [m.name for m in tar.getmembers() if m.isfile()]
+                name = select_member(names, remote_file, name)
+                member = tar.extractfile(name)
+            else:
+                tar = stack.enter_context(tarfile.open(fileobj=stream,
+                                                       mode='r|'))
+                names = []
+                member = None
+                for tarinfo in tar:
+                    if not tarinfo.isfile():
+                        continue
+                    names.append(tarinfo.name)
+                    if tarinfo.name == remote_file:
+                        member = tar.extractfile(tarinfo)
+                        break
+                    if len(names) == 1:
+                        #kept in case it is the only member
+                        spool = stack.enter_context(tempfile.TemporaryFile(dir=DIR))
+                        shutil.copyfileobj(tar.extractfile(tarinfo), spool,
+                                           du.BLOCKSIZE)
+                        spool.seek(0)
+                    elif len(names) == 2:
+                        spool.close()
+                name = select_member(names, remote_file, name)
+                if member is None:
+                    member = spool
+        elif head[:4] == b'PK\x03\x04' or ext == '.zip':
+            if not seekable:
+                spool = stack.enter_context(tempfile.TemporaryFile(dir=DIR))
+                shutil.copyfileobj(stream, spool, du.BLOCKSIZE)
+                spool.seek(0)
+                stream = spool
+            zfile = stack.enter_context(zipfile.ZipFile(stream))
+            name = select_member(zfile.namelist(), remote_file, name)
+            member = zfile.open(name)
+        elif head[:2] == b'\x1f\x8b':
+            member = gzip.GzipFile(fileobj=stream)
+            if name.endswith('.gz'):
+                name = name[:-3]
         else:
-            print('Error extracting file: ' + filename)
+            print('Error extracting file: ' + name)
             exit()
-        if len(file_list) == 1:
-            filename = file_list[0]
-        else:
-            if('remote_file' in version_dict and
-               version_dict['remote_file'] in file_list):
-                idx = file_list.index(version_dict['remote_file'])
-                filename = file_list[idx]
-            else:
-                print("Remote file is a directory but version_dict"
-                      "['remote_file'] was not found")
-                exit()
-    #move the downloaded file to source.alias.txt
-    shutil.copy2(filename, ret_file)
-    return os.path.relpath(ret_file)
+        stream = io.BufferedReader(stack.enter_context(member), du.BLOCKSIZE)
+        seekable = False
+        if peek(stream, seekable)[257:262] == b'ustar' and \
+                os.path.splitext(name)[1] not in ARCHIVES:
+            name += '.tar'
+    return stream
+
+def format_chunk_line(hasher, source_alias, line_num, line):
+    """Returns the raw_line formatted version of a single line of a file.
+
+    This takes an md5 object already updated with the source_alias and
+    produces the line in the raw_line chunk format:
+    (line_hash, line_num, file_id, "raw_line")
+
+    Args:
+        hasher (hashlib.md5): md5 object seeded with the encoded source_alias
+        source_alias (str): the file_id of the file (source.alias)
+        line_num (int): the 1-based line number of the line in the file
+        line (bytes): the line as read from the file
+
+    Returns:
+        bytes: the formatted line
+    """
+    hasher = hasher.copy()
+    num = str(line_num).encode()
+    hasher.update(num)
+    hasher.update(line)
+    return b''.join((hasher.hexdigest().encode(), b'\t', num, b'\t',
+                     source_alias.encode(), b'\t"',
+                     line.translate(None, STRIP_BYTES), b'"\n'))
+
+def find_line_offsets(filename, line_nums):
+    """Returns the byte offsets at which the provided lines start.
+
+    This takes the path to a file and a list of 0-based line indices and scans
+    the file in large blocks, counting newlines, to find the byte offset of the
+    start of each line. Only the block containing a requested line is searched
+    line by line.
+
+    Args:
+        filename (str): the file to scan
+        line_nums (list): the 0-based indices of the lines to locate
+
+    Returns:
+        dict: the byte offset of each requested line index
+    """
+    pending = sorted(set(line_nums))
+    offsets = dict()
+    idx = 0
+    seen = 0
+    pos = 0
+    with open(filename, 'rb') as infile:
+        while idx < len(pending):
+            block = infile.read(BLOCKSIZE)
+            if not block:
+                break
+            start = 0
+            while idx < len(pending) and \
+                    seen + block.count(b'\n', start) >= pending[idx]:
+                for _ in range(pending[idx] - seen):
+                    start = block.index(b'\n', start) + 1
+                    seen += 1
+                offsets[pending[idx]] = pos + start
+                idx += 1
+            seen += block.count(b'\n', start)
+            pos += len(block)
+    return offsets
+
+def chunk_part(task):
+    """Writes a single raw_line chunk and its sorted unique version.
+
+    This is the unit of work for a parallel chunk (see chunk). It seeks to the
+    start of the chunk in the file, formats num_lines lines (or all remaining
+    lines if num_lines is None) and runs csu on the result.
+
+    Args:
+        task (tuple): (filename, chunk_path, source_alias, offset,
+            first_line, num_lines) describing the chunk
 
-def chunk(filename, total_lines, chunksize=500000):
+    Returns:
+        str: the path to the chunk that was written
+    """
+    (filename, curr_chunk, source_alias, offset, first_line, num_lines) = task
+    base = hashlib.md5(source_alias.encode())
+    with open(filename, 'rb') as infile, open(curr_chunk, 'wb') as out:
+        infile.seek(offset)
+        for line_count, line in enumerate(itertools.islice(infile, num_lines),
+                                          first_line):
+            out.write(format_chunk_line(base, source_alias, line_count, line))
+    u_chunk_file = curr_chunk.replace('raw_line', 'unique.raw_line')
+    tu.csu(curr_chunk, u_chunk_file)
+    return curr_chunk
+
+def chunk(filename, total_lines, chunksize=500000, processes=1,
+          num_chunks=None):
     """Splits the provided file into equal chunks with
     ceiling(num_lines/chunksize) lines each.
 
@@ -140,19 +373,24 @@ def chunk(filename, total_lines, chunksize=500000):
     then returns the number of chunks and sets up the raw_lines table in the
     format: (file, line num, line_chksum, raw_line)
 
+    If processes is greater than one, the byte offset of the first line of
+    each chunk is found and the chunks are hashed, formatted and sorted
+    across a pool of processes (see chunk_part). The chunks produced are
+    identical to those of the serial split.
+
     Args:
         filename (str): the file to split into chunks
         total_lines (int): the number of lines in the file at filename
-        args (Namespace): args as populated namespace or 'None' for defaults
         chunksize (int): max size of a single chunk.  Defaults to 500000.
+        processes (int): number of processes to chunk with.  Defaults to 1.
+        num_chunks (int): number of chunks to split into instead of
+            ceiling(num_lines/chunksize), or None
 
     Returns:
         int: the number of chunks filename was split into
     """
     #determine number of chunks
-    if 'lincs.level4' in filename:
-        num_chunks = MAX_CHUNKS
-    else:
+    if num_chunks is None:
         num_chunks = math.ceil(total_lines/int(chunksize))
     num_lines = int(total_lines/num_chunks)
 
@@ -163,8 +401,25 @@ def chunk(filename, total_lines, chunksize=500000):
     source_alias, ext = os.path.splitext(file)
     chunk_file = os.path.join(chunk_dir, source_alias + '.raw_line.')
 
+    if processes > 1 and num_chunks > 1:
+        #a chunk of zero lines takes everything, as in the serial split
+        if num_lines:
+            starts = [(i - 1) * num_lines for i in range(1, num_chunks + 1)]
+            counts = [num_lines] * (num_chunks - 1) + [None]
+        else:
+            starts = [0] + [total_lines] * (num_chunks - 1)
+            counts = [None] + [0] * (num_chunks - 1)
+        offsets = find_line_offsets(filename, starts)
+        tasks = [(filename, chunk_file + str(i) + ext, source_alias,
+                  offsets.get(start, os.path.getsize(filename)), start + 1, count)
+                 for i, (start, count) in enumerate(zip(starts, counts), 1)]
+        with Pool(processes) as pool:
+            pool.map(chunk_part, tasks, chunksize=1)
+        return num_chunks
+
     #divide file into chunks
     line_count = 0
+    base = hashlib.md5(source_alias.encode())
     with open(filename, 'rb') as infile:
         for i in range(1, num_chunks + 1):
             curr_chunk = chunk_file + str(i) + ext
@@ -172,17 +427,7 @@ def chunk(filename, total_lines, chunksize=500000):
                 j = 0
                 for line in infile:
                     line_count += 1
-                    hasher = hashlib.md5()
-                    hasher.update(source_alias.encode())
-                    hasher.update(str(line_count).encode())
-                    hasher.update(line)
-                    md5 = hasher.hexdigest()
-                    outline = '\t'.join((md5, str(line_count), source_alias, ''))
-                    out.write(outline.encode())
-                    cleanline = line.decode("ascii", errors="ignore")
-                    cleanline = cleanline.replace('\n', '')
-                    cleanline = '"' + cleanline + '"\n'
-                    out.write(cleanline.encode())
+                    out.write(format_chunk_line(base, source_alias, line_count, line))
                     j += 1
                     if j == num_lines and i < num_chunks:
                         break
@@ -190,6 +435,301 @@ def chunk(filename, total_lines, chunksize=500000):
             tu.csu(curr_chunk, u_chunk_file)
     return num_chunks
 
+def delta_chunk(filename, chunksize=500000):
+    """Chunks only the lines of the provided file that were not in the
+    previous release of the file.
+
+    This indexes every line of the file by the md5 hash of its content and
+    merges the sorted index with the index kept from the previous release
+    (source.alias.line_index.txt). Lines whose content is new are written to
+    chunks of chunksize lines in the raw_line format, keeping their line
+    numbers in the file (see ChunkWriter). The line_hash of every line of the
+    previous release whose content is gone is written to the sorted delete
+    set chunks/source.alias.unique.line_delete.txt, which the import step
+    uses to remove their status, edge2line, edge_meta and raw_line rows and
+    any edges left without lines (see import_utilities.delete_lines). Lines
+    whose content did not change keep the line_hash of the previous release.
+    If there is no previous index, every line is new.
+
+    Args:
+        filename (str): the standardized path (source.alias.txt) of the file
+        chunksize (int): max size of a single chunk.  Defaults to 500000.
+
+    Returns:
+        int: the number of chunks written
+    """
+    path, file = os.path.split(filename)
+    source_alias = os.path.splitext(file)[0]
+    index_file = os.path.join(path, source_alias + INDEX_EXT)
+    chunk_dir = os.path.join(path, 'chunks')
+    if os.path.isdir(chunk_dir):
+        shutil.rmtree(chunk_dir)
+    writer = ChunkWriter(filename, chunksize)
+    delete_file = os.path.join(chunk_dir, source_alias + DELETE_EXT)
+    tmp_index = index_file + '.tmp'
+    tmp_lines = os.path.join(chunk_dir, source_alias + '.line_index.txt')
+    tmp_delete = os.path.join(chunk_dir, source_alias + '.line_delete.txt')
+
+    #index the lines of the new release by content
+    base = hashlib.md5(source_alias.encode())
+    line_count = 0
+    with open(filename, 'rb') as infile, open(tmp_index, 'w') as out:
+        for line_count, line in enumerate(infile, 1):
+            num = str(line_count).encode()
+            line_hash = base.copy()
+            line_hash.update(num)
+            line_hash.update(line)
+            out.write('\t'.join([hashlib.md5(line.rstrip(b'\r\n')).hexdigest(),
+                                 str(line_count), line_hash.hexdigest()]) + '\n')
+    st.sort_file(tmp_index, tmp_lines, unique=False, tmp_dir=chunk_dir)
+
+    #merge with the index of the previous release
+    added = bytearray((line_count >> 3) + 1)
+    num_added = num_removed = 0
+    old_path = index_file if os.path.isfile(index_file) else os.devnull
+    with open(old_path, 'r') as old_index, open(tmp_lines, 'r') as new_index, \
+            open(tmp_index, 'w') as out, open(tmp_delete, 'w') as delete:
+        old_groups = itertools.groupby((l.rstrip('\n').split('\t') for l in old_index),
+                                       key=lambda fields: fields[0])
+        new_groups = itertools.groupby((l.rstrip('\n').split('\t') for l in new_index),
+                                       key=lambda fields: fields[0])
+        old_key, old_rows = next(old_groups, (None, None))
+        new_key, new_rows = next(new_groups, (None, None))
+        while old_key is not None or new_key is not None:
+            if new_key is None or (old_key is not None and old_key < new_key):
+                for fields in old_rows:
+                    delete.write(fields[1] + '\n')
+                    num_removed += 1
+                old_key, old_rows = next(old_groups, (None, None))
+            elif old_key is None or new_key < old_key:
+                for fields in new_rows:
+                    line_num = int(fields[1])
+                    added[line_num >> 3] |= 1 << (line_num & 7)
+                    out.write(new_key + '\t' + fields[2] + '\n')
+                    num_added += 1
+                new_key, new_rows = next(new_groups, (None, None))
+            else:
+                for fields in old_rows:
+                    out.write('\t'.join(fields) + '\n')
+                old_key, old_rows = next(old_groups, (None, None))
+                new_key, new_rows = next(new_groups, (None, None))
+    print('{0}: {1} lines added, {2} lines removed'.format(source_alias,
+                                                         num_added, num_removed))
+
+    #chunk the added lines
+    with open(filename, 'rb') as infile:
+        for line_num, line in enumerate(infile, 1):
+            if added[line_num >> 3] & (1 << (line_num & 7)):
+                writer.write(line, line_num)
+    num_chunks = writer.close()
+    tu.csu(tmp_delete, delete_file)
+    os.replace(tmp_index, index_file)
+    os.remove(tmp_lines)
+    os.remove(tmp_delete)
+    return num_chunks
+
+class TeeReader(io.RawIOBase):
+    """Raw stream which copies every byte read from a stream into a file.
+
+    Attributes:
+        stream (file): the stream being read
+        copy (file): the file the bytes are copied to, or None
+    """
+    def __init__(self, stream, copy=None):
+        """Init a TeeReader reading from stream and copying to copy.
+
+        Args:
+            stream (file): the stream to read
+            copy (file): an open binary file to copy to, or None
+        """
+        super(TeeReader, self).__init__()
+        self.stream = stream
+        self.copy = copy
+
+    def readable(self):
+        """Returns True, a TeeReader can always be read."""
+        return True
+
+    def readinto(self, buf):
+        """Reads into buf from the stream and copies what was read.
+
+        Args:
+            buf (bytearray): the buffer to read into
+
+        Returns:
+            int: the number of bytes read
+        """
+        data = self.stream.read(len(buf))
+        buf[:len(data)] = data
+        if self.copy is not None:
+            self.copy.write(data)
+        return len(data)
+
+class ChunkWriter(object):
+    """Writes raw_line chunks of a fixed number of lines from a stream of lines.
+
+    Each chunk is written in the raw_line format (see format_chunk_line) and
+    its sorted unique version is written from memory when the chunk is closed,
+    so the chunk is never read back from disk.
+
+    Attributes:
+        source_alias (str): the file_id of the file (source.alias)
+        chunk_file (str): the path prefix of the chunk files
+        ext (str): the extension of the chunk files
+        chunksize (int): the number of lines in each chunk
+        num_chunks (int): the number of chunks opened so far
+        line_count (int): the number of lines written so far
+    """
+    def __init__(self, filename, chunksize=500000):
+        """Init a ChunkWriter for the chunks of the file at filename.
+
+        Args:
+            filename (str): the standardized path (source.alias.txt) of the file
+            chunksize (int): the number of lines in each chunk
+        """
+        path, file = os.path.split(filename)
+        chunk_dir = os.path.join(path, 'chunks')
+        os.makedirs(chunk_dir, exist_ok=True)
+        self.source_alias, self.ext = os.path.splitext(file)
+        self.chunk_file = os.path.join(chunk_dir, self.source_alias + '.raw_line.')
+        self.chunksize = int(chunksize)
+        self.num_chunks = 0
+        self.line_count = 0
+        self.hasher = hashlib.md5(self.source_alias.encode())
+        self.out = None
+        self.lines = list()
+
+    def write(self, line, line_num=None):
+        """Formats and writes a single line to the current chunk.
+
+        Args:
+            line (bytes): the line as read from the file
+            line_num (int): the line number of the line in the file, or None
+                if every line of the file is written in order
+        """
+        if self.out is None:
+            self.num_chunks += 1
+            self.out = open(self.chunk_file + str(self.num_chunks) + self.ext, 'wb')
+        self.line_count += 1
+        if line_num is None:
+            line_num = self.line_count
+        outline = format_chunk_line(self.hasher, self.source_alias,
+                                    line_num, line)
+        self.out.write(outline)
+        self.lines.append(outline)
+        if len(self.lines) == self.chunksize:
+            self.close_chunk()
+
+    def close_chunk(self):
+        """Closes the current chunk and writes its sorted unique version."""
+        if self.out is None:
+            return
+        curr_chunk = self.out.name
+        self.out.close()
+        self.out = None
+        u_chunk_file = curr_chunk.replace('raw_line', 'unique.raw_line')
+        with open(u_chunk_file, 'wb') as out:
+            out.writelines(sorted(set(self.lines)))
+        self.lines = list()
+
+    def close(self):
+        """Closes the last chunk.
+
+        Returns:
+            int: the number of chunks written
+        """
+        self.close_chunk()
+        return self.num_chunks
+
+def stream_chunk(version_dict, chunksize=500000, args=None):
+    """Downloads, decompresses, checksums and chunks the remote file of the
+    source alias in a single pass.
+
+    This reads the remote file as it arrives from the network, extracting
+    the needed member of any archive layers (see open_member), and computes
+    the md5 checksum and line count of the uncompressed file while writing
+    the raw_line chunks (see ChunkWriter).
+    Each chunk holds chunksize lines. Full-size copies of the downloaded and
+    uncompressed files are only kept if args.keep_files is True. If the file
+    is in the download cache it is read from there instead, and a downloaded
+    file is added to the cache if args.cache_dir is set. The download shares
+    the rate and connection limits of its host with all other downloads
+    from the host (see download_utilities.HostLimiter). If the download
+    fails, the chunks are rewritten from the start on the next try.
+
+    Args:
+        version_dict (dict): A dictionary describing the attributes of the
+            alias for a source.
+        chunksize (int): number of lines in each chunk.  Defaults to 500000.
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        str: the md5 hash of the uncompressed file
+        int: the number of lines in the uncompressed file
+        int: the number of chunks written
+    """
+    if args is None:
+        args = cf.config_args()
+    ret_file = version_dict['source'] + '.' + version_dict['alias'] + '.txt'
+    url, openfunc, tries, sleeptime = get_url_opener(version_dict)
+    filename = version_dict['local_file_name']
+    cached = cu.get_cached(version_dict, filename, args.cache_dir)
+    if cached:
+        url, openfunc, tries = filename, lambda path: open(path, 'rb'), 1
+    copy_raw = not cached and (args.keep_files or
+                               (args.cache_dir and cu.get_cache_key(version_dict)))
+    #the copies are written to temporary files that replace filename and
+    #ret_file, which may still be links to cached files from a previous fetch
+    raw_tmp = '{0}.{1}.tmp'.format(filename, os.getpid())
+    txt_tmp = '{0}.{1}.tmp'.format(ret_file, os.getpid())
+    for i in range(tries):
+        raw_copy = open(raw_tmp, 'wb') if copy_raw else None
+        txt_copy = open(txt_tmp, 'wb') if args.keep_files else None
+        writer = ChunkWriter(ret_file, chunksize)
+        try:
+            with ExitStack() as stack:
+                if not cached:
+                    stack.enter_context(du.get_limiter(url))
+                response = stack.enter_context(openfunc(url))
+                status = response.getcode() if hasattr(response, 'getcode') else None
+                if status is not None and status >= 400:
+                    raise urllib.error.HTTPError(url, status, 'HTTP Error',
+                                                 response.info(), None)
+                stream = io.BufferedReader(TeeReader(response, raw_copy),
+                                           du.BLOCKSIZE)
+                stream = open_member(stream, filename,
+                                     version_dict.get('remote_file', ''), stack)
+                md5 = hashlib.md5()
+                for line in stream:
+                    md5.update(line)
+                    if txt_copy is not None:
+                        txt_copy.write(line)
+                    writer.write(line)
+            break
+        except (OSError, EOFError):
+            if i == tries - 1:
+                for copy in (raw_copy, txt_copy):
+                    if copy is not None:
+                        os.remove(copy.name)
+                raise
+            sleep(sleeptime)
+        finally:
+            num_chunks = writer.close()
+            for copy in (raw_copy, txt_copy):
+                if copy is not None:
+                    copy.close()
+    if copy_raw:
+        os.replace(raw_tmp, filename)
+    if args.keep_files:
+        os.replace(txt_tmp, ret_file)
+    if copy_raw:
+        cu.add_cached(version_dict, filename, args.cache_dir, args.cache_size)
+    if args.keep_files:
+        os.utime(filename, (0, version_dict['remote_date']))
+    elif os.path.isfile(filename):
+        os.remove(filename)
+    return md5.hexdigest(), writer.line_count, num_chunks
+
 def format_raw_line(filename):
     """Creates the raw_line table from the provided file and returns the
        path to the output file.
@@ -267,6 +807,29 @@ def get_line_count(filename):
             line_count += 1
     return line_count
 
+def is_unchanged(version_dict, md5hash, args=None):
+    """Returns True if the fetched data file has the same content as the
+    file from the previous fetch.
+
+    This compares md5hash with the local_checksum recorded by the check step
+    (see check_utilities.compare_versions). Mapping files and forced fetches
+    are never considered unchanged.
+
+    Args:
+        version_dict (dict): A dictionary describing the attributes of the
+            alias for a source.
+        md5hash (str): the md5 checksum of the fetched file
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        bool: True if the content of the file has not changed
+    """
+    if args is None:
+        args = cf.config_args()
+    if args.force_fetch or version_dict['is_map']:
+        return False
+    return md5hash == version_dict.get('local_checksum')
+
 def main(version_json, args=None):
     """Fetches and chunks the source:alias described by version_json.
 
@@ -275,9 +838,21 @@ def main(version_json, args=None):
     (see ensembl.fetch). If the alias is a data file, it then runs raw_line
     (see raw_line) and then runs chunk (see chunk) on the output. If the alias
     is a mapping file, it runs create_mapping_dict (see create_mapping_dict in
-    SRC.py). It also updates version_json to include the total lines in and
-    md5 checksum of the fetched file. It then saves the updated version_json to
-    file.
+    SRC.py). If args.stream_fetch is set, a data file is instead downloaded
+    and chunked in a single pass (see stream_chunk). It also updates
+    version_json to include the total lines in and md5 checksum of the fetched
+    file. If the checksum matches the checksum of the previous fetch, the
+    data file is not chunked and version_json is marked content_unchanged so
+    that the TABLE and MAP steps are skipped for it. If
+    args.incremental_build is set, only the lines of a data file that were
+    not in the previous release are chunked (see delta_chunk). The delete set
+    of an earlier incremental fetch is removed first, so that it is only
+    imported again if delta_chunk writes a new one. The number of lines in
+    each chunk is planned from the costs of the previous builds of the alias
+    (see plan_utilities.plan_chunk_size). The source class is
+    rebuilt offline from the metadata written by check (see
+    check_utilities.get_offline_SrcClass). It then saves the updated
+    version_json to file.
 
     Args:
         version_json (str): path to a json file describing the source:alias
@@ -285,6 +860,9 @@ def main(version_json, args=None):
     """
     if args is None:
         args = cf.config_args()
+    du.set_host_limits(args.host_rate, args.host_connections)
+    st.set_sort_limits(args.sort_memory, args.num_procs, args.sort_compress,
+                       args.merge_fan_in)
     with open(version_json, 'r') as infile:
         version_dict = json.load(infile)
     if not version_dict['fetch_needed'] and not args.force_fetch:
@@ -296,32 +874,69 @@ def main(version_json, args=None):
     if version_dict['source'] == 'ensembl':
         src_module.fetch(version_dict, args)
         return
-    if version_dict['source'] == 'lincs' and \
-            version_dict['alias'] in ['level4', 'exp_meta']:
-        newfile = src_module.download(version_dict, args)
+    mySrc = ch.get_offline_SrcClass(version_json, args)
+    source_alias = version_dict['source'] + '.' + version_dict['alias']
+    stats = pu.update_stats(DIR, source_alias)
+    index_file = source_alias + INDEX_EXT
+    if not args.incremental_build and os.path.isfile(index_file):
+        #the index no longer matches the lines imported by a full build
+        os.remove(index_file)
+    delete_file = os.path.join('chunks', source_alias + DELETE_EXT)
+    if os.path.isfile(delete_file):
+        #only the delete set of a new delta_chunk may be imported
+        os.remove(delete_file)
+    if args.stream_fetch and not args.incremental_build and \
+            not version_dict['is_map'] and version_dict['source'] != 'lincs':
+        chunk_size = pu.plan_chunk_size(source_alias, stats, mySrc.chunk_size,
+                                        args.target_job_time)
+        md5hash, line_count, num_chunks = stream_chunk(version_dict,
+                                                       chunk_size, args)
     else:
-        newfile = download(version_dict)
-    md5hash, line_count = get_md5_hash(newfile)
-    mySrc = src_module.get_SrcClass(args)
-    if version_dict['is_map'] and version_dict['source'] == 'lincs':
-        num_chunks = 0
-    elif version_dict['is_map']:
-        num_chunks = 0
-        raw_line = format_raw_line(newfile)
-        map_dict = mySrc.create_mapping_dict(raw_line)
-        nodefile = raw_line.replace('raw_line', 'unique.node')
-        if os.path.isfile(nodefile):
-            iu.import_pnode(nodefile, args)
-        nmfile = raw_line.replace('raw_line', 'unique.node_meta')
-        if os.path.isfile(nmfile):
-            iu.import_nodemeta(nmfile, args)
-        map_file = os.path.splitext(newfile)[0] + '.json'
-        with open(map_file, 'w') as outfile:
-            json.dump(map_dict, outfile, indent=4, sort_keys=True)
-    else:
-        #raw_line = format_raw_line(newfile)
-        num_chunks = chunk(newfile, line_count, mySrc.chunk_size)
+        if version_dict['source'] == 'lincs' and \
+                version_dict['alias'] in ['level4', 'exp_meta']:
+            newfile = src_module.download(version_dict, args)
+        else:
+            newfile = download(version_dict, args)
+        md5hash, line_count = get_md5_hash(newfile)
+        if is_unchanged(version_dict, md5hash, args):
+            num_chunks = 0
+        elif version_dict['is_map'] and version_dict['source'] == 'lincs':
+            num_chunks = 0
+        elif version_dict['is_map']:
+            num_chunks = 0
+            raw_line = format_raw_line(newfile)
+            map_dict = mySrc.create_mapping_dict(raw_line)
+            nodefile = raw_line.replace('raw_line', 'unique.node')
+            if os.path.isfile(nodefile):
+                iu.import_pnode(nodefile, args)
+            nmfile = raw_line.replace('raw_line', 'unique.node_meta')
+            if os.path.isfile(nmfile):
+                iu.import_nodemeta(nmfile, args)
+            map_file = os.path.splitext(newfile)[0] + '.json'
+            with open(map_file, 'w') as outfile:
+                json.dump(map_dict, outfile, indent=4, sort_keys=True)
+        else:
+            #raw_line = format_raw_line(newfile)
+            bytes_per_line = pu.chunk_line_bytes(source_alias,
+                                                 os.path.getsize(newfile),
+                                                 line_count)
+            chunk_size = pu.plan_chunk_size(source_alias, stats,
+                                            mySrc.chunk_size,
+                                            args.target_job_time,
+                                            bytes_per_line, line_count)
+            if args.incremental_build:
+                num_chunks = delta_chunk(newfile, chunk_size)
+            else:
+                num_chunks = chunk(newfile, line_count, chunk_size,
+                                   args.num_procs,
+                                   pu.plan_num_chunks(source_alias, stats,
+                                                      args.target_job_time))
     #update version_dict
+    version_dict.pop('fetch_failed', None)
+    version_dict['content_unchanged'] = is_unchanged(version_dict, md5hash,
+                                                     args)
+    if version_dict['content_unchanged']:
+        print('Source content has not changed, table and map not needed')
     version_dict['checksum'] = md5hash
     version_dict['line_count'] = line_count
     version_dict['num_chunks'] = num_chunks
@@ -329,6 +944,46 @@ def main(version_json, args=None):
     with open(version_json, 'w') as outfile:
         json.dump(version_dict, outfile, indent=4, sort_keys=True)
 
+def main_batch(version_jsons, args=None):
+    """Fetches and chunks each of the source:aliases described by version_jsons.
+
+    This runs main in the directory of each version_json in turn, so a
+    batch of small aliases is fetched by a single job with the same outputs
+    as one job per alias (see workflow_utilities.run_fetch). An alias that
+    fails does not stop the others and is marked fetch_failed in its
+    version_json, so that only its own TABLE step is refused (see
+    workflow_utilities.run_table). An error is raised only if every alias
+    failed.
+
+    Args:
+        version_jsons (list): paths to json files describing the
+            source:aliases
+        args (Namespace): args as populated namespace or 'None' for defaults
+    """
+    if args is None:
+        args = cf.config_args()
+    cwd = os.getcwd()
+    failed = list()
+    for version_json in version_jsons:
+        print('Fetching ' + version_json)
+        try:
+            os.chdir(os.path.join(cwd, os.path.dirname(version_json)))
+            main(os.path.basename(version_json), args)
+        except Exception as err:
+            print('Fetch failed for {0}: {1!r}'.format(version_json, err))
+            failed.append(version_json)
+            os.chdir(cwd)
+            if os.path.isfile(version_json):
+                with open(version_json, 'r') as infile:
+                    version_dict = json.load(infile)
+                version_dict['fetch_failed'] = repr(err)
+                with open(version_json, 'w') as outfile:
+                    json.dump(version_dict, outfile, indent=4, sort_keys=True)
+        finally:
+            os.chdir(cwd)
+    if failed and len(failed) == len(version_jsons):
+        raise IOError('Fetch failed for ' + ', '.join(failed))
+
 def main_parse_args():
     """Processes command line arguments.
 
@@ -340,11 +995,14 @@ def main_parse_args():
     """
     parser = ArgumentParser()
     parser.add_argument('metadata_json', help='json file produced from check, \
-                        e.g. file_metadata.json')
+                        e.g. file_metadata.json, or a ,, separated list of them')
     parser = cf.add_config_args(parser)
     args = parser.parse_args()
     return args
 
 if __name__ == "__main__":
     args = main_parse_args()
-    main(args.metadata_json, args)
+    if ',,' in args.metadata_json:
+        main_batch(args.metadata_json.split(',,'), args)
+    else:
+        main(args.metadata_json, args)
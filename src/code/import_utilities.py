@@ -5,20 +5,26 @@ Contains module functions::
 
     import_file(file_name, table, ld_cmd='', dup_cmd='', args=None)
     import_filemeta(version_dict, args=None)
+    import_filemetas(version_dicts, args=None)
+    filemeta_values(version_dict)
     update_filemeta(version_dict, args=None)
     import_edge(edgefile, args=None)
     import_nodemeta(nmfile, args=None)
     import_pnode(filename, args=None)
+    delete_lines(deletefile, args=None)
 
 """
 
 import os
-import csv
+import glob
+import fnmatch
 import subprocess
+import threading
 from argparse import ArgumentParser
 import config_utilities as cf
 import mysql_utilities as mu
 import redis_utilities as ru
+import sort_utilities as st
 
 def import_file(file_name, table, ld_cmd='', dup_cmd='', args=None):
     """Imports the provided  file into the KnowEnG MySQL database.
@@ -91,7 +97,9 @@ def enable_keys(args=None):
 def import_filemeta(version_dict, args=None):
     """Imports the provided version_dict into the KnowEnG MySQL database.
 
-    Loads the data from an version dictionary into the raw_file table.
+    Loads the data from an version dictionary into the raw_file table. The
+    checksum of the previous fetch is kept if no fetch is needed, so that the
+    next fetch can tell if the content of the file changed.
 
     Args:
         version_dict (dict): version dictionary describing a downloaded file
@@ -100,16 +108,55 @@ def import_filemeta(version_dict, args=None):
     if args is None:
         args = cf.config_args()
     db = mu.get_database('KnowNet', args)
-    values = [version_dict["source"] + '.' + version_dict["alias"],
-              version_dict["remote_url"], version_dict["remote_date"],
-              version_dict["remote_version"], version_dict["remote_size"],
-              version_dict["source_url"], version_dict["image"], version_dict["reference"],
-              version_dict["pmid"], version_dict["license"],
-              'CURRENT_TIMESTAMP', version_dict["local_file_name"], 'NULL']
+    values = filemeta_values(version_dict)
     cmd = 'VALUES( ' + ','.join('%s' for i in values) + ')'
     db.replace_safe('raw_file', cmd, values)
     db.close()
 
+def import_filemetas(version_dicts, args=None):
+    """Imports the provided version_dicts into the KnowEnG MySQL database.
+
+    Loads all the version dictionaries of a source into the raw_file table
+    with a single multi-row REPLACE over one connection (see
+    import_filemeta).
+
+    Args:
+        version_dicts (list): version dictionaries describing downloaded files
+        args (Namespace): args as populated namespace or 'None' for defaults
+    """
+    if args is None:
+        args = cf.config_args()
+    if not version_dicts:
+        return
+    rows = [filemeta_values(version_dict) for version_dict in version_dicts]
+    row_cmd = '(' + ','.join('%s' for i in rows[0]) + ')'
+    cmd = 'VALUES ' + ','.join(row_cmd for row in rows)
+    db = mu.get_database('KnowNet', args)
+    db.replace_safe('raw_file', cmd, [value for row in rows for value in row])
+    db.close()
+
+def filemeta_values(version_dict):
+    """Returns the raw_file row of the provided version_dict.
+
+    The checksum of the previous fetch is kept if no fetch is needed, and is
+    'NULL' otherwise.
+
+    Args:
+        version_dict (dict): version dictionary describing a downloaded file
+
+    Returns:
+        list: the values of the raw_file columns
+    """
+    checksum = 'NULL'
+    if not version_dict['fetch_needed'] and version_dict.get('local_checksum'):
+        checksum = version_dict['local_checksum']
+    return [version_dict["source"] + '.' + version_dict["alias"],
+            version_dict["remote_url"], version_dict["remote_date"],
+            version_dict["remote_version"], version_dict["remote_size"],
+            version_dict["source_url"], version_dict["image"], version_dict["reference"],
+            version_dict["pmid"], version_dict["license"],
+            'CURRENT_TIMESTAMP', version_dict["local_file_name"], checksum]
+
 def update_filemeta(version_dict, args=None):
     """Updates the provided filemeta into the KnowEnG MySQL database.
 
@@ -254,13 +301,60 @@ def import_pnode(filename, args=None):
     table = 'node'
     import_file(filename, table, ld_cmd, dup_cmd, args)
 
+def delete_lines(deletefile, args=None):
+    """Deletes the rows of the raw lines listed in deletefile from the
+    KnowEnG MySQL database.
+
+    This takes a file of line_hashes removed from their source since the
+    previous build (see fetch_utilities.delta_chunk) and deletes their rows
+    from the status, edge2line, edge_meta and raw_line tables. Edges of the
+    deleted lines that are left without any line are deleted from the edge
+    table, and the remaining edges are updated to the maximum weight of
+    their production status rows.
+
+    Args:
+        deletefile (str): path to the file of line_hashes to delete
+        args (Namespace): args as populated namespace or 'None' for defaults
+    """
+    if args is None:
+        args = cf.config_args()
+    db = mu.get_database('KnowNet', args)
+    print('Deleting lines in ' + deletefile)
+    db.create_temp_table('line_delete', '(line_hash varchar(40) NOT NULL, '
+                         'PRIMARY KEY (line_hash))')
+    db.load_data(deletefile, 'line_delete')
+    db.create_temp_table('edge_delete', '(PRIMARY KEY (edge_hash)) '
+                         'SELECT DISTINCT edge2line.edge_hash FROM edge2line '
+                         'JOIN line_delete '
+                         'ON edge2line.line_hash = line_delete.line_hash')
+    for table in ['status', 'edge2line', 'edge_meta', 'raw_line']:
+        db.run('DELETE {0} FROM {0} JOIN line_delete '
+               'ON {0}.line_hash = line_delete.line_hash'.format(table))
+    db.run('DELETE edge FROM edge '
+           'JOIN edge_delete ON edge.edge_hash = edge_delete.edge_hash '
+           'LEFT JOIN edge2line ON edge.edge_hash = edge2line.edge_hash '
+           'WHERE edge2line.edge_hash IS NULL')
+    db.run('UPDATE edge JOIN (SELECT status.edge_hash, '
+           'MAX(status.weight) AS weight FROM status '
+           'JOIN edge_delete ON status.edge_hash = edge_delete.edge_hash '
+           'WHERE status.status = "production" GROUP BY status.edge_hash) '
+           'AS production ON edge.edge_hash = production.edge_hash '
+           'SET edge.weight = production.weight')
+    db.drop_temp_table('edge_delete')
+    db.drop_temp_table('line_delete')
+    db.close()
+
 def merge(merge_key, args):
-    """Uses sort to merge and unique the already sorted files of the table type
-    and stores the results into outfile.
+    """Merges and uniques the already sorted files of the table type and
+    stores the results into outfile.
 
     This takes a table type (one of: node, node_meta, edge2line, status, or
-    edge_meta) and merges them using the unix sort command while removing any
-    duplicate elements.
+    edge_meta) and merges them in byte order while removing any duplicate
+    elements. The files are merged in parallel groups of at most
+    args.merge_fan_in files, and the results merged again, until a single
+    sorted and unique output is left (see sort_utilities.merge_files). For
+    edge, the highest weight edge of each edge_hash is kept as the files are
+    merged (see max_weight_edges).
 
     Args:
         merge_key (str): table type (one of: node, node_meta, edge2line, status,
@@ -269,66 +363,142 @@ def merge(merge_key, args):
     """
     if args is None:
         args = cf.config_args()
+    infiles, outpath, temppath = merge_setup(merge_key, args)
+    outfile = os.path.join(outpath, 'unique.' + merge_key + '.txt')
+    print('merging {0} files into {1}'.format(len(infiles), outfile))
+    reducer = max_weight_edges if merge_key == 'edge' else None
+    st.merge_files(infiles, outfile, tmp_dir=temppath, reducer=reducer)
+    return outfile
+
+def stream_import(merge_key, args):
+    """Merges the already sorted files of the table type into a named pipe
+    that is imported into the KnowEnG MySQL database as it is written.
+
+    The files are first merged down to at most args.merge_fan_in runs (see
+    sort_utilities.reduce_runs), so that the final merge streams rows as
+    soon as the import starts reading. The final merge is written to the
+    pipe from a thread while it is loaded into the table, so no merged file
+    is stored on disk. The load is only committed once the merge has
+    finished; if the merge fails, the loaded rows are rolled back and the
+    table is left unchanged.
+
+    Args:
+        merge_key (str): table type (see merge)
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        str: the path the merged file would have been stored at, which is not
+            created
+    """
+    if args is None:
+        args = cf.config_args()
+    infiles, outpath, temppath = merge_setup(merge_key, args)
+    fifo = os.path.join(outpath, 'unique.' + merge_key + '.fifo')
+    print('streaming {0} files into {1}'.format(len(infiles), fifo))
+    runs = st.reduce_runs(infiles, tmp_dir=temppath, keep=set(infiles))
+    reducer = max_weight_edges if merge_key == 'edge' else None
+    errors = []
+    def write_fifo():
+        try:
+            with open(fifo, 'wb', st.BLOCKSIZE) as out:
+                st.write_merged(runs, out, reducer=reducer)
+        except (IOError, OSError, ValueError) as err:
+            errors.append(err)
+    if os.path.exists(fifo):
+        os.remove(fifo)
+    os.mkfifo(fifo)
+    writer = threading.Thread(target=write_fifo, daemon=True)
+    writer.start()
+    db = mu.get_database('KnowNet', args)
+    try:
+        print('Inserting data from ' + fifo + ' into ' + merge_key)
+        # a failed merge closes the pipe like a finished one, so the load
+        # is committed only after the writer reports no errors
+        db.load_data(fifo, merge_key, commit=False)
+        writer.join()
+        if errors:
+            raise IOError('ERROR: merge into ' + fifo + ' failed: ' + str(errors[0]))
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        os.remove(fifo)
+        for run in runs:
+            if run not in infiles:
+                os.remove(run)
+    return os.path.join(outpath, 'unique.' + merge_key + '.txt')
+
+def merge_setup(merge_key, args):
+    """Finds the files to merge for the table type and prepares the
+    directories and sort limits of the merge.
+
+    Args:
+        merge_key (str): table type (see merge)
+        args (Namespace): args as populated namespace
+
+    Returns:
+        tuple: (list of files to merge, directory of the merged output,
+            directory for intermediate runs)
+    """
     if args.storage_dir:
         searchpath = os.path.join(args.storage_dir, args.data_path)
     else:
         searchpath = os.path.join(args.working_dir, args.data_path)
     outpath = os.path.join(args.working_dir, args.data_path)
-    if merge_key == 'edge':
-        outfile = os.path.join(outpath, 'unique-sort.' + merge_key + '.txt')
-    else:
-        outfile = os.path.join(outpath, 'unique.' + merge_key + '.txt')
-    searchpath = os.path.join(searchpath, '*', '*', '*')
-    with open(outfile, 'w') as out:
-        cmd1 = ['find', searchpath, '-type', 'f',
-                '-name', '*.unique.'+merge_key+'.*', '-print0']
-        temppath = os.path.join(outpath, 'tmp')
-        if not os.path.isdir(temppath):
-            os.makedirs(temppath)
-        cmd2 = ['xargs', '-0', 'sort', '-mu', '-T', temppath]
-        print(' '.join(cmd1))
-        print(' '.join(cmd2))
-        p1 = subprocess.Popen(' '.join(cmd1), stdout=subprocess.PIPE, shell=True)
-        subprocess.Popen(cmd2, stdin=p1.stdout, stdout=out).communicate()
+    temppath = os.path.join(outpath, 'tmp')
+    if not os.path.isdir(temppath):
+        os.makedirs(temppath)
+    st.set_sort_limits(args.sort_memory, args.num_procs, args.sort_compress,
+                       args.merge_fan_in)
+    return find_merge_files(searchpath, merge_key), outpath, temppath
 
-    if merge_key != 'edge':
-        return outfile
-
-    us_file = outfile
-    ud_file = os.path.join(outpath, 'unique-dup.edge.txt')
-    ue_file = os.path.join(outpath, 'unique.edge.txt')
-    with open(us_file, 'r') as infile, \
-        open(ud_file, 'w') as edge:
-        reader = csv.reader(infile, delimiter='\t')
-        writer = csv.writer(edge, delimiter='\t', lineterminator='\n')
-        prev = False
-        for line in reader:
-            line = line[1:] + [line[0]]
-            e_chksum = line[4]
-            weight = line[3]
-            if not prev:
-                prev = line
-            if e_chksum != prev[4]:
-                writer.writerow(prev)
-                prev = line
-            elif float(weight) > float(prev[3]):
-                prev = line
-        if prev:
-            writer.writerow(prev)
-    os.remove(us_file)
-    with open(ue_file, 'w') as out:
-        cmd1 = ['cat', ud_file]
-        temppath = os.path.join(outpath, 'tmp')
-        if not os.path.isdir(temppath):
-            os.makedirs(temppath)
-        cmd2 = ['sort', '-u', '-T', temppath]
-        print(' '.join(cmd1))
-        print(' '.join(cmd2))
-        p1 = subprocess.Popen(cmd1, stdout=subprocess.PIPE)
-        subprocess.Popen(cmd2, stdin=p1.stdout, stdout=out).communicate()
-    os.remove(ud_file)
-    return ue_file
+def max_weight_edges(lines):
+    """Yields the edge of highest weight for each edge_hash in the edge table
+    format.
+
+    Args:
+        lines (iterable): merged lines of unique.edge files in the format
+            (edge_hash, n1, n2, edge_type, weight), sorted by edge_hash
 
+    Yields:
+        bytes: the line of the edge in the format (n1, n2, edge_type, weight,
+            edge_hash)
+    """
+    prev = None
+    for line in lines:
+        fields = line[:-1].split(b'\t')
+        if prev is None or fields[0] != prev[0]:
+            if prev is not None:
+                yield b'\t'.join(prev[1:] + prev[:1]) + b'\n'
+            prev = fields
+        elif float(fields[4]) > float(prev[4]):
+            prev = fields
+    if prev is not None:
+        yield b'\t'.join(prev[1:] + prev[:1]) + b'\n'
+
+def find_merge_files(searchpath, merge_key):
+    """Returns the sorted files of the table type in the alias directories
+    under searchpath, like find searchpath/*/*/* -name '*.unique.KEY.*'.
+
+    Args:
+        searchpath (str): the data directory containing the source directories
+        merge_key (str): table type (see merge)
+
+    Returns:
+        list: the paths to the files of the table type
+    """
+    pattern = '*.unique.' + merge_key + '.*'
+    found = []
+    for top in glob.glob(os.path.join(searchpath, '*', '*', '*')):
+        if os.path.isfile(top):
+            if fnmatch.fnmatch(os.path.basename(top), pattern):
+                found.append(top)
+            continue
+        for dirpath, _, filenames in os.walk(top):
+            found.extend(os.path.join(dirpath, name)
+                         for name in fnmatch.filter(filenames, pattern))
+    return found
 
 def merge_logs(args):
     """Merge all log files into a single file that contains all the information about the run.
@@ -373,11 +543,16 @@ def main():
     """
     args = main_parse_args()
     merge_keys = ['node', 'node_meta', 'edge2line', 'status', 'edge', \
-                  'edge_meta', 'raw_line', 'table', 'log']
+                  'edge_meta', 'raw_line', 'table', 'log', 'line_delete']
+    streamed = False
     if args.importfile == 'log':
         args.importfile = merge_logs(args)
     elif args.importfile in merge_keys:
-        args.importfile = merge(args.importfile, args)
+        streamed = args.stream_import and args.importfile != 'line_delete'
+        if streamed:
+            args.importfile = stream_import(args.importfile, args)
+        else:
+            args.importfile = merge(args.importfile, args)
     table = ''
     ld_cmd = ''
     dup_cmd = ''
@@ -388,7 +563,11 @@ def main():
     if not table:
         raise ValueError("ERROR: 'importfile' must contain one of "+\
                          ','.join(merge_keys))
-    import_file(args.importfile, table, ld_cmd, dup_cmd, args)
+    if table == 'line_delete':
+        delete_lines(args.importfile, args)
+        return
+    if not streamed:
+        import_file(args.importfile, table, ld_cmd, dup_cmd, args)
     if table == 'node_meta':
         filename = args.importfile.replace("node_meta", "node_meta_table")
         mu.get_database("KnowNet", args).dump_table(table, filename)
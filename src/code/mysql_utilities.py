@@ -15,6 +15,12 @@ Contains module functions::
     get_database(db=None, args=None)
     get_insert_cmd(step)
     import_ensembl(alias, args=None)
+    get_file_meta(file_id, args=None)
+    get_source_file_meta(source, args=None)
+    format_file_meta(file_id, row)
+
+Attributes:
+    FILE_META_FIELDS (str): the raw_file columns describing a fetched file
 """
 import os
 import json
@@ -24,6 +30,8 @@ from argparse import ArgumentParser
 import config_utilities as cf
 import mysql.connector as sql
 
+FILE_META_FIELDS = 'remote_date, remote_size, remote_version, checksum'
+
 def deploy_container(args=None):
     """Deplays a container with marathon running MySQL using the specified
     args.
@@ -439,6 +447,8 @@ def get_file_meta(file_id, args=None):
     'date' (float):         time of last modification time of file in \
                             seconds since the epoch
     'version' (str):        the remote version of the source
+    'checksum' (str):       the md5 checksum of the fetched file, or None \
+                            if it was not fetched
 
     Args:
         file_id (str):  The file_id for the raw_file in the format of \
@@ -449,17 +459,63 @@ def get_file_meta(file_id, args=None):
     """
     if args is None:
         args = cf.config_args()
-    file_meta = {'file_id':file_id}
     db = get_database('KnowNet', args)
-    results = db.query_distinct('remote_date, remote_size, remote_version',
-                                'raw_file', 'WHERE file_id="'+file_id+'"')
-    if not results:
+    results = db.query_distinct(FILE_META_FIELDS, 'raw_file',
+                                'WHERE file_id="'+file_id+'"')
+    db.close()
+    return format_file_meta(file_id, results[0] if results else None)
+
+def get_source_file_meta(source, args=None):
+    """Returns the metadata of all files of the provided source.
+
+    This loads every raw_file row of the source from the MySQL database in a
+    single query, instead of one query and connection per alias as with
+    get_file_meta.
+
+    Args:
+        source (str): The name of the source, e.g. "dip"
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        dict: The file_meta information (see get_file_meta) of each file of
+            the source present in the database, keyed by file_id
+    """
+    if args is None:
+        args = cf.config_args()
+    db = get_database('KnowNet', args)
+    results = db.query_distinct('file_id, ' + FILE_META_FIELDS, 'raw_file',
+                                'WHERE file_id LIKE "' + source + '.%"')
+    db.close()
+    metas = dict()
+    for row in results:
+        file_id = str(row[0])
+        if file_id.split('.', 1)[0] != source:
+            continue
+        metas[file_id] = format_file_meta(file_id, row[1:])
+    return metas
+
+def format_file_meta(file_id, row):
+    """Returns the file_meta dictionary of a row of the raw_file table.
+
+    Args:
+        file_id (str): The file_id of the row in the format of "source.alias"
+        row (tuple): The FILE_META_FIELDS of the row, or None if the file_id
+            is not in the raw_file table
+
+    Returns:
+        dict: The file_meta information (see get_file_meta).
+    """
+    file_meta = {'file_id':file_id}
+    if not row:
         file_meta['file_exists'] = False
     else:
         file_meta['file_exists'] = True
-        file_meta['date'] = float(results[0][0])
-        file_meta['size'] = int(results[0][1])
-        file_meta['version'] = str(results[0][2])
+        file_meta['date'] = float(row[0])
+        file_meta['size'] = int(row[1])
+        file_meta['version'] = str(row[2])
+        checksum = row[3]
+        file_meta['checksum'] = None if checksum in (None, 'NULL') \
+                                else str(checksum)
     return file_meta
 
 class MySQL(object):
@@ -584,7 +640,8 @@ class MySQL(object):
                             tablename + ' ' + cmd + ';')
         self.conn.commit()
 
-    def load_data(self, filename, tablename, cmd='', sep='\\t', enc='"'):
+    def load_data(self, filename, tablename, cmd='', sep='\\t', enc='"',
+                  commit=True):
         """Import data into table in the MySQL database.
 
         Loads the data located on the local machine into the provided MySQL
@@ -596,13 +653,16 @@ class MySQL(object):
             sep (str): separator for fields in file
             enc (str): enclosing character for fields in file
             cmd (str): optional additional command
+            commit (bool): if False, the loaded rows are left uncommitted
+                until the next commit or rollback
         """
         self.cursor.execute("LOAD DATA LOCAL INFILE '" + filename +
                             "' INTO TABLE " + tablename +
                             " FIELDS TERMINATED BY '" + sep + "'" +
                             " OPTIONALLY ENCLOSED BY '" + enc + "' " +
                             cmd + ";")
-        self.conn.commit()
+        if commit:
+            self.conn.commit()
 
     def drop_temp_table(self, tablename):
         """Remove a temporary table from the MySQL database
@@ -835,6 +895,11 @@ class MySQL(object):
         self.cursor.execute('SET foreign_key_checks=1;')
         self.conn.commit()
 
+    def rollback(self):
+        """Discards the uncommitted changes of the connection.
+        """
+        self.conn.rollback()
+
     def close(self):
         """Close connection to the MySQL server.
 
@@ -0,0 +1,185 @@
+"""Utiliites for planning the chunks of source files for the Knowledge Network
+(KN) from the cost of previous builds.
+
+Every table and map job records the lines, bytes and rows it processed and
+the time it took in a small stats file next to its chunk. When an alias is
+fetched again, the stats of its previous build are folded into the history
+of the alias (chunk_stats.json in the alias directory), and the history is
+used to size the new chunks so that each table and map job takes about the
+target job time, no matter how many edges a line of the source fans out to.
+
+Contains module functions::
+
+    count_lines(filename)
+    write_chunk_stats(filename, stats)
+    update_stats(alias_dir, source_alias)
+    chunk_line_bytes(source_alias, file_bytes, total_lines)
+    plan_chunk_size(source_alias, stats, chunk_size, target_time,
+                    bytes_per_line=None, total_lines=None)
+    plan_num_chunks(source_alias, stats, target_time)
+
+Attributes:
+    STATS_FILE (str): name of the file in the alias directory holding the
+        history of the costs of its chunks
+    STATS_FIELDS (list): the fields summed in the history
+    DECAY (float): weight of the history relative to the latest build
+    MIN_CHUNK_SIZE (int): minimum number of lines in a planned chunk
+    MAX_CHUNKS (int): maximum number of chunks to split a file into
+    BLOCKSIZE (int): number of bytes read at a time when counting lines
+
+"""
+
+import os
+import json
+import glob
+import math
+
+STATS_FILE = 'chunk_stats.json'
+STATS_FIELDS = ['lines', 'bytes', 'table_rows', 'table_seconds', 'map_rows',
+                'map_seconds']
+DECAY = 0.5
+MIN_CHUNK_SIZE = 1000
+MAX_CHUNKS = 500
+BLOCKSIZE = 16 * 1024 * 1024
+
+def count_lines(filename):
+    """Returns the number of lines in a file, or 0 if it does not exist.
+
+    Args:
+        filename (str): the file to count the lines of
+
+    Returns:
+        int: the number of lines in filename
+    """
+    if not os.path.isfile(filename):
+        return 0
+    with open(filename, 'rb') as infile:
+        return sum(block.count(b'\n')
+                   for block in iter(lambda: infile.read(BLOCKSIZE), b''))
+
+def write_chunk_stats(filename, stats):
+    """Writes the costs measured by a table or map job to filename.
+
+    Args:
+        filename (str): the stats file of the chunk, e.g.
+            chunks/dip.PPI.table_stats.1.json
+        stats (dict): the counts and seconds measured, keyed by STATS_FIELDS
+    """
+    with open(filename, 'w') as outfile:
+        json.dump(stats, outfile, indent=4, sort_keys=True)
+
+def update_stats(alias_dir, source_alias):
+    """Folds the chunk stats of the previous build into the alias history.
+
+    This sums the stats files written by the table and map jobs of the
+    previous build (chunks/source.alias.*_stats.*.json), adds them to the
+    history in alias_dir/chunk_stats.json weighted down by DECAY, saves the
+    history and removes the chunk stats files so they are only counted once.
+
+    Args:
+        alias_dir (str): the directory of the alias
+        source_alias (str): the file_id of the alias (source.alias)
+
+    Returns:
+        dict: the history of the alias, keyed by STATS_FIELDS
+    """
+    stats_file = os.path.join(alias_dir, STATS_FILE)
+    history = dict.fromkeys(STATS_FIELDS, 0)
+    if os.path.isfile(stats_file):
+        with open(stats_file, 'r') as infile:
+            history.update(json.load(infile))
+    pattern = os.path.join(alias_dir, 'chunks', source_alias + '.*_stats.*.json')
+    chunk_files = glob.glob(pattern)
+    if not chunk_files:
+        return history
+    latest = dict.fromkeys(STATS_FIELDS, 0)
+    for chunk_file in chunk_files:
+        with open(chunk_file, 'r') as infile:
+            for key, value in json.load(infile).items():
+                if key in latest:
+                    latest[key] += value
+    for key in STATS_FIELDS:
+        history[key] = history[key] * DECAY + latest[key]
+    with open(stats_file, 'w') as outfile:
+        json.dump(history, outfile, indent=4, sort_keys=True)
+    for chunk_file in chunk_files:
+        os.remove(chunk_file)
+    return history
+
+def chunk_line_bytes(source_alias, file_bytes, total_lines):
+    """Returns the average bytes per line of a file in the raw_line format.
+
+    Each line of a chunk adds its line_hash, line_num and file_id and the
+    separators of the raw_line format to the line as read from the file (see
+    fetch_utilities.format_chunk_line).
+
+    Args:
+        source_alias (str): the file_id of the alias (source.alias)
+        file_bytes (int): the size of the file in bytes
+        total_lines (int): the number of lines in the file
+
+    Returns:
+        float: the average bytes per line of the chunks of the file
+    """
+    overhead = 32 + len(str(total_lines)) + len(source_alias) + 5
+    return file_bytes / max(total_lines, 1) + overhead
+
+def plan_chunk_size(source_alias, stats, chunk_size, target_time,
+                    bytes_per_line=None, total_lines=None):
+    """Returns the number of lines to put in each chunk of a file.
+
+    The cost of a line is estimated from the history of the alias as the
+    table seconds per byte times the bytes per line, plus the map seconds
+    per table row times the table rows each line fans out to. The chunk size
+    is the number of lines that take about target_time seconds, at least
+    MIN_CHUNK_SIZE and enough to split total_lines into at most MAX_CHUNKS
+    chunks. If target_time is 0 or there is no history, chunk_size (see
+    SrcClass.chunk_size) is returned (but see plan_num_chunks).
+
+    Args:
+        source_alias (str): the file_id of the alias (source.alias)
+        stats (dict): the history of the alias (see update_stats)
+        chunk_size (int): the fixed chunk size of the source
+        target_time (float): the target seconds for each table and map job
+        bytes_per_line (float): the average bytes per line of the chunks of
+            the new file (see chunk_line_bytes), or None to use the history
+        total_lines (int): the number of lines in the new file, or None if
+            unknown
+
+    Returns:
+        int: the number of lines in each chunk
+    """
+    if not target_time or not stats.get('lines') or not stats.get('bytes'):
+        return int(chunk_size)
+    if bytes_per_line is None:
+        bytes_per_line = stats['bytes'] / stats['lines']
+    cost = bytes_per_line * stats['table_seconds'] / stats['bytes']
+    if stats['map_rows']:
+        fanout = stats['table_rows'] / stats['lines']
+        cost += fanout * stats['map_seconds'] / stats['map_rows']
+    if cost <= 0:
+        return int(chunk_size)
+    planned = max(MIN_CHUNK_SIZE, int(target_time / cost))
+    if total_lines:
+        planned = max(planned, math.ceil(total_lines / MAX_CHUNKS))
+    return planned
+
+def plan_num_chunks(source_alias, stats, target_time):
+    """Returns the fixed number of chunks to split a file into, if any.
+
+    Without a history to plan from (see plan_chunk_size), lincs.level4 is
+    split into exactly MAX_CHUNKS chunks, as it always has been.
+
+    Args:
+        source_alias (str): the file_id of the alias (source.alias)
+        stats (dict): the history of the alias (see update_stats)
+        target_time (float): the target seconds for each table and map job
+
+    Returns:
+        int: the number of chunks, or None to split by the planned chunk size
+    """
+    if source_alias != 'lincs.level4':
+        return None
+    if not target_time or not stats.get('lines') or not stats.get('bytes'):
+        return MAX_CHUNKS
+    return None
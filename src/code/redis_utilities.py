@@ -6,8 +6,40 @@ Contains module functions::
 
     get_database(args=None)
     import_ensembl(alias, args=None)
+    load_mappings(rdb, mappings)
+    load_wikigene_aliases(rdb, wikigenes)
     conv_gene(rdb, foreign_key, hint, taxid)
-
+    conv_gene_lua(rdb, fk_array, hint, taxid)
+    get_meta(rdb, node_id, field)
+    set_meta(rdb, node_id, field, value)
+    getset_meta(rdb, node_id, field, value)
+    mget_meta(rdb, node_ids, fields)
+    migrate_node_meta(args=None)
+    move_meta_keys(rdb, keys)
+    fk_bucket(foreign_key)
+    set_fk(rdb, foreign_key, key, value)
+    getset_fk(rdb, foreign_key, key, value)
+    mget_fk(rdb, fk_array, keys)
+    memory_report(rdb)
+    bucket_fk_keys(args=None)
+    move_fk_keys(rdb, keys)
+
+Attributes:
+    MGET_CHUNK (int): number of keys looked up in each request
+    LOAD_CHUNK (int): number of keys written in each pipeline of
+        import_ensembl
+    CONV_GENE_LUA (str): Lua script resolving the mapping cascade of a batch
+        of foreign keys in Redis (see conv_gene_lua)
+    LUA_CASCADE (bool): if conv_gene resolves the cascade with CONV_GENE_LUA
+    HASH_META (bool): if node metadata is written to one hash per node
+        (stable::node_id) rather than a string key per field
+        (stable::node_id::field), and read from the hashes first
+    FK_BUCKETS (int): number of hashes (fkmap::bucket) the foreign key
+        mappings are stored in, or 0 for one string key per mapping
+    FK_PATTERNS (list): patterns of the string keys of the foreign key
+        mappings
+    BUCKET_ENTRIES (int): fields a hash can hold in the compact encoding of
+        the Redis containers deployed with buckets
 
 """
 
@@ -16,10 +48,47 @@ import os
 from argparse import ArgumentParser
 import subprocess
 import csv
+import zlib
 import redis
 import config_utilities as cf
 
 MGET_CHUNK = 5000
+LOAD_CHUNK = 10000
+CONV_GENE_LUA = """
+local taxid, hint, bucketed = ARGV[1], ARGV[2], ARGV[3] == '1'
+local function lookup(bucket, key)
+    if bucketed then
+        return redis.call('HGET', bucket, key)
+    end
+    return redis.call('GET', key)
+end
+local result = {}
+local n = 0
+for i = 4, #ARGV, 2 do
+    local fk, bucket = ARGV[i], ARGV[i + 1]
+    local val = false
+    if hint ~= '' and taxid ~= '' then
+        val = lookup(bucket, 'triplet::' .. fk .. '::' .. taxid .. '::' .. hint)
+    end
+    if not val and taxid ~= '' then
+        val = lookup(bucket, 'taxon::' .. fk .. '::' .. taxid)
+    end
+    if not val and hint ~= '' then
+        val = lookup(bucket, 'hint::' .. fk .. '::' .. hint)
+    end
+    if not val and taxid == '' then
+        val = lookup(bucket, 'unique::' .. fk)
+    end
+    n = n + 1
+    result[n] = val
+end
+return result
+"""
+LUA_CASCADE = False
+HASH_META = False
+FK_BUCKETS = 0
+FK_PATTERNS = ['unique::*', 'hint::*', 'taxon::*', 'triplet::*']
+BUCKET_ENTRIES = 512
 
 def deploy_container(args=None):
     """Deplays a container with marathon running Redis using the specified
@@ -42,6 +111,8 @@ def deploy_container(args=None):
     deploy_dict["id"] = os.path.basename(args.redis_dir)
     deploy_dict["cmd"] = "redis-server --appendonly yes --requirepass " + \
                         args.redis_pass + " --port " + args.redis_port
+    if args.redis_buckets:
+        deploy_dict["cmd"] += " --hash-max-ziplist-entries " + str(BUCKET_ENTRIES)
     deploy_dict["cpus"] = float(args.redis_cpu)
     deploy_dict["mem"] = int(args.redis_mem)
     if args.redis_host is not cf.DEFAULT_REDIS_URL:
@@ -66,15 +137,21 @@ def get_database(args=None):
     """Returns a Redis database connection.
 
     This returns a Redis database connection access to its functions if the
-    module is imported.
+    module is imported. The mapping options in args (--redis_lua,
+    --redis_hash_meta and --redis_buckets) are used by the lookups of this
+    module from then on.
 
     Args:
         args (Namespace): args as populated namespace or 'None' for defaults
     Returns:
         StrictRedis: a redis connection object
     """
+    global LUA_CASCADE, HASH_META, FK_BUCKETS
     if args is None:
         args = cf.config_args()
+    LUA_CASCADE = args.redis_lua
+    HASH_META = args.redis_hash_meta
+    FK_BUCKETS = args.redis_buckets
     return redis.StrictRedis(host=args.redis_host, port=args.redis_port,
                              password=args.redis_pass)
 
@@ -83,12 +160,16 @@ def import_ensembl(alias, args=None):
 
     This stores the foreign key to ensembl stable ids in the Redis database.
     It uses the all mappings dictionary created by mysql.query_all_mappings
-    for alias. This then iterates through each foreign_key. If the foreign_key
-    has not been seen before, it sets unique:foreign_key as the stable id. If
-    the key has been seen before and maps to a different ensembl stable id, it
-    sets the value for unique:foreign_key as unmapped:many. In each case, it
-    sets the value of taxid:hint:foreign_key as the stable_id, and appends
-    taxid:hint to the set with foreign_key as the key.
+    for alias. This then iterates through each foreign_key and sets
+    unique::foreign_key, hint::foreign_key::hint, taxon::foreign_key::taxid
+    and triplet::foreign_key::taxid::hint as the stable id. If a key maps to
+    more than one ensembl stable id, its value is unmapped-many instead.
+
+    The mappings of alias are resolved in memory first, and then merged with
+    the values already in Redis from other species in batches (see
+    load_mappings), so the import takes a few round trips per LOAD_CHUNK keys
+    rather than up to eight per mapping. The WIKIGENE foreign keys replace the
+    integer aliases of their stable ids (see load_wikigene_aliases).
 
     Args:
         alias (str): An alias defined in ensembl.aliases.
@@ -100,41 +181,96 @@ def import_ensembl(alias, args=None):
     map_dir = os.path.join(args.working_dir, args.data_path, cf.DEFAULT_MAP_PATH)
     with open(os.path.join(map_dir, alias + '_all.json')) as infile:
         map_dict = json.load(infile)
+    mappings = dict()
+    wikigenes = dict()
     for key in map_dict:
         (taxid, _, _, hint, foreign_key) = key.split('::')
         hint = hint.upper()
         ens_id = map_dict[key].upper()
         foreign_key = foreign_key.upper()
+        for keystr in ['unique::' + foreign_key,
+                       'hint::' + foreign_key + '::' + hint,
+                       'taxon::' + foreign_key + '::' + taxid,
+                       'triplet::' + foreign_key + '::' + taxid + '::' + hint]:
+            if mappings.setdefault(keystr, (foreign_key, ens_id))[1] != ens_id:
+                mappings[keystr] = (foreign_key, 'unmapped-many')
+        if hint == 'WIKIGENE': # to replace integer aliases with strings
+            wikigenes.setdefault(ens_id, []).append(foreign_key)
+    del map_dict
+    load_mappings(rdb, mappings)
+    load_wikigene_aliases(rdb, wikigenes)
 
-        keystr = 'unique::' + foreign_key
-        rkey = rdb.getset(keystr, ens_id)
-        if rkey is not None and rkey.decode() != ens_id:
-            rdb.set(keystr, 'unmapped-many')
-
-        keystr = 'hint::' + foreign_key + '::' + hint
-        rkey = rdb.getset(keystr, ens_id)
-        if rkey is not None and rkey.decode() != ens_id:
-            rdb.set(keystr, 'unmapped-many')
+def load_mappings(rdb, mappings):
+    """Merges resolved mapping keys with the values already in Redis.
 
-        keystr = 'taxon::' + foreign_key + '::' + taxid
-        rkey = rdb.getset(keystr, ens_id)
-        if rkey is not None and rkey.decode() != ens_id:
-            rdb.set(keystr, 'unmapped-many')
+    Each batch of LOAD_CHUNK keys is written with one pipeline that returns
+    the previous values, GETSET for string keys or HGET and HSET in a
+    transaction for buckets (see FK_BUCKETS), so that concurrent imports of
+    other species see each other's values. Keys whose previous value was a
+    different stable id are then set to unmapped-many with a second pipeline.
 
-        keystr = 'triplet::' + foreign_key + '::' + taxid + '::' + hint
-        rkey = rdb.getset(keystr, ens_id)
-        if rkey is not None and rkey.decode() != ens_id:
-            rdb.set(keystr, 'unmapped-many')
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        mappings (dict): the (upper case foreign key, stable id or
+            unmapped-many) of each mapping key
 
-        if hint == 'WIKIGENE': # to replace integer aliases with strings
-            try:
-                int(rdb.get('::'.join(['stable', ens_id, 'alias'])))
-            except TypeError:
-                rdb.set('::'.join(['stable', ens_id, 'alias']), foreign_key)
-            except ValueError:
-                pass
+    Returns:
+        int: the number of keys set to unmapped-many by the merge
+    """
+    conflicts = 0
+    items = list(mappings.items())
+    for start in range(0, len(items), LOAD_CHUNK):
+        batch = items[start:start + LOAD_CHUNK]
+        pipe = rdb.pipeline(transaction=bool(FK_BUCKETS))
+        for key, (foreign_key, value) in batch:
+            if FK_BUCKETS:
+                pipe.hget(fk_bucket(foreign_key), key)
+                pipe.hset(fk_bucket(foreign_key), key, value)
             else:
-                rdb.set('::'.join(['stable', ens_id, 'alias']), foreign_key)
+                pipe.getset(key, value)
+        prev_array = pipe.execute()
+        if FK_BUCKETS:
+            prev_array = prev_array[::2]
+        pipe = rdb.pipeline(transaction=False)
+        for (key, (foreign_key, value)), prev in zip(batch, prev_array):
+            if prev is None or value == 'unmapped-many' or prev.decode() == value:
+                continue
+            set_fk(pipe, foreign_key, key, 'unmapped-many')
+            conflicts += 1
+        pipe.execute()
+    return conflicts
+
+def load_wikigene_aliases(rdb, wikigenes):
+    """Replaces missing or integer aliases of stable ids with their WIKIGENE
+    foreign keys.
+
+    The current aliases are read with mget_meta and the new ones written with
+    one pipeline per LOAD_CHUNK stable ids. The foreign keys of a stable id
+    are applied in order, so the first one that is not an integer is kept.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        wikigenes (dict): the list of upper case WIKIGENE foreign keys of
+            each stable id
+    """
+    ens_ids = list(wikigenes)
+    for start in range(0, len(ens_ids), LOAD_CHUNK):
+        batch = ens_ids[start:start + LOAD_CHUNK]
+        pipe = rdb.pipeline(transaction=False)
+        for ens_id, (node_alias,) in zip(batch, mget_meta(rdb, batch, ['alias'])):
+            changed = False
+            for foreign_key in wikigenes[ens_id]:
+                try:
+                    int(node_alias)
+                except TypeError:
+                    pass
+                except ValueError:
+                    continue
+                node_alias = foreign_key
+                changed = True
+            if changed:
+                set_meta(pipe, ens_id, 'alias', node_alias)
+        pipe.execute()
 
 def import_gene_nodes(node_table, args=None):
     """Import gene node metadata into redis.
@@ -145,8 +281,8 @@ def import_gene_nodes(node_table, args=None):
     for row in node_table:
         node_id, node_desc, node_type = row
         node_id = node_id.upper()
-        rdb.set('::'.join(['stable', node_id, 'desc']), node_desc)
-        rdb.set('::'.join(['stable', node_id, 'type']), node_type)
+        set_meta(rdb, node_id, 'desc', node_desc)
+        set_meta(rdb, node_id, 'type', node_type)
 
 def import_node_meta(nmfile, args=None):
     """Import node metadata into redis.
@@ -165,26 +301,310 @@ def import_node_meta(nmfile, args=None):
             elif nm_type == 'orig_desc':
                 node_desc = nm_value
             elif nm_type == 'biotype':
-                rkey = rdb.getset('::'.join(['stable', node_id, 'biotype']), nm_value)
+                rkey = getset_meta(rdb, node_id, 'biotype', nm_value)
                 if rkey is not None and rkey.decode() != nm_value:
-                    rdb.set('::'.join(['stable', node_id, 'biotype']), rkey)
+                    set_meta(rdb, node_id, 'biotype', rkey)
             elif nm_type == 'taxid':
-                rkey = rdb.getset('::'.join(['stable', node_id, 'taxid']), nm_value)
+                rkey = getset_meta(rdb, node_id, 'taxid', nm_value)
                 if rkey is not None and rkey.decode() != nm_value:
-                    rdb.set('::'.join(['stable', node_id, 'taxid']), rkey)
+                    set_meta(rdb, node_id, 'taxid', rkey)
             else:
                 continue
 
-            rkey = rdb.getset('::'.join(['stable', node_id, 'type']), 'Property')
+            rkey = getset_meta(rdb, node_id, 'type', 'Property')
             if rkey is not None and rkey.decode() != 'Property':
-                rdb.set('::'.join(['stable', node_id, 'type']), rkey)
+                set_meta(rdb, node_id, 'type', rkey)
 
-            rkey = rdb.getset('::'.join(['stable', node_id, 'alias']), node_alias)
+            rkey = getset_meta(rdb, node_id, 'alias', node_alias)
             if rkey is not None and rkey.decode() != node_alias and rkey.decode() != node_id:
-                rdb.set('::'.join(['stable', node_id, 'alias']), rkey)
-            rkey = rdb.getset('::'.join(['stable', node_id, 'desc']), node_desc)
+                set_meta(rdb, node_id, 'alias', rkey)
+            rkey = getset_meta(rdb, node_id, 'desc', node_desc)
             if rkey is not None and rkey.decode() != node_desc and rkey.decode() != node_id:
-                rdb.set('::'.join(['stable', node_id, 'desc']), rkey)
+                set_meta(rdb, node_id, 'desc', rkey)
+def get_meta(rdb, node_id, field):
+    """Returns a metadata field of a node from its hash or its string key.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        node_id (str): the stable id of the node
+        field (str): the metadata field, e.g. alias
+
+    Returns:
+        bytes: the value of the field or None
+    """
+    if HASH_META:
+        val = rdb.hget('stable::' + node_id, field)
+        if val is not None:
+            return val
+    return rdb.get('::'.join(['stable', node_id, field]))
+
+def set_meta(rdb, node_id, field, value):
+    """Sets a metadata field of a node in the layout of HASH_META.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        node_id (str): the stable id of the node
+        field (str): the metadata field, e.g. alias
+        value (str): the value of the field
+    """
+    if HASH_META:
+        rdb.hset('stable::' + node_id, field, value)
+    else:
+        rdb.set('::'.join(['stable', node_id, field]), value)
+
+def getset_meta(rdb, node_id, field, value):
+    """Sets a metadata field of a node and returns its previous value, like
+    the Redis GETSET command.
+
+    In the hash layout, the previous value is read from the string key of
+    the field if the hash does not have it yet (see migrate_node_meta).
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        node_id (str): the stable id of the node
+        field (str): the metadata field, e.g. alias
+        value (str): the new value of the field
+
+    Returns:
+        bytes: the previous value of the field or None
+    """
+    if not HASH_META:
+        return rdb.getset('::'.join(['stable', node_id, field]), value)
+    pipe = rdb.pipeline()
+    pipe.hget('stable::' + node_id, field)
+    pipe.hset('stable::' + node_id, field, value)
+    rkey = pipe.execute()[0]
+    if rkey is None:
+        rkey = rdb.get('::'.join(['stable', node_id, field]))
+    return rkey
+
+def mget_meta(rdb, node_ids, fields):
+    """Returns metadata fields of many nodes.
+
+    If HASH_META is set, the fields of each batch of MGET_CHUNK nodes are read
+    from their hashes with pipelined HMGET in a single round trip. Each field
+    still missing after that, or every field otherwise, is read from the
+    string keys of the nodes without it with an MGET per field, so nodes
+    whose metadata is only partly migrated to hashes (see migrate_node_meta)
+    are read in full.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        node_ids (list): the stable ids of the nodes
+        fields (list): the metadata fields to read, e.g. ['type', 'alias']
+
+    Returns:
+        list: the list of values (bytes or None) of fields for each node
+    """
+    values = [[None] * len(fields) for _ in node_ids]
+    if HASH_META and hasattr(rdb, 'pipeline'):
+        for start in range(0, len(node_ids), MGET_CHUNK):
+            pipe = rdb.pipeline(transaction=False)
+            for node_id in node_ids[start:start + MGET_CHUNK]:
+                pipe.hmget('stable::' + node_id, fields)
+            for i, vals in enumerate(pipe.execute(), start):
+                values[i] = list(vals)
+    for j, field in enumerate(fields):
+        missing = [i for i, vals in enumerate(values) if vals[j] is None]
+        for start in range(0, len(missing), MGET_CHUNK):
+            idxs = missing[start:start + MGET_CHUNK]
+            vals_array = rdb.mget(['::'.join(['stable', node_ids[i], field]) for i in idxs])
+            for i, val in zip(idxs, vals_array):
+                values[i][j] = val
+    return values
+
+def migrate_node_meta(args=None):
+    """Moves the node metadata in string keys (stable::node_id::field) into
+    one hash per node (stable::node_id).
+
+    Fields already in the hash of a node are kept, and every string key that
+    was scanned is deleted, so the migration can be run again to finish an
+    interrupted one.
+
+    Args:
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        int: the number of string keys moved
+    """
+    if args is None:
+        args = cf.config_args()
+    rdb = get_database(args)
+    moved = 0
+    keys = []
+    for key in rdb.scan_iter(match='stable::*::*', count=MGET_CHUNK):
+        keys.append(key)
+        if len(keys) >= MGET_CHUNK:
+            moved += move_meta_keys(rdb, keys)
+            keys = []
+    moved += move_meta_keys(rdb, keys)
+    return moved
+
+def move_meta_keys(rdb, keys):
+    """Moves a batch of node metadata string keys into the hashes of their
+    nodes with one pipeline.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        keys (list): the scanned keys, of which those that are not strings
+            are skipped
+
+    Returns:
+        int: the number of string keys moved
+    """
+    if not keys:
+        return 0
+    moved = 0
+    pipe = rdb.pipeline()
+    for key, val in zip(keys, rdb.mget(keys)):
+        if val is None:
+            continue
+        (name, field) = key.decode().rsplit('::', 1)
+        pipe.hsetnx(name, field, val)
+        pipe.delete(key)
+        moved += 1
+    pipe.execute()
+    return moved
+
+def fk_bucket(foreign_key):
+    """Returns the hash that the mappings of a foreign key are stored in when
+    FK_BUCKETS is set.
+
+    All key forms of a foreign key (unique::, hint::, taxon:: and triplet::)
+    are fields of the same bucket, chosen by the crc32 of the foreign key so
+    that every process agrees on it.
+
+    Args:
+        foreign_key (str): the upper case foreign key
+
+    Returns:
+        str: the name of the bucket, fkmap::bucket
+    """
+    return 'fkmap::' + str(zlib.crc32(foreign_key.encode()) % FK_BUCKETS)
+
+def set_fk(rdb, foreign_key, key, value):
+    """Sets a mapping key of a foreign key in the encoding of FK_BUCKETS.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        foreign_key (str): the upper case foreign key
+        key (str): the mapping key, e.g. taxon::FK::TAXID
+        value (str): the stable id or unmapped-many
+    """
+    if FK_BUCKETS:
+        rdb.hset(fk_bucket(foreign_key), key, value)
+    else:
+        rdb.set(key, value)
+
+def getset_fk(rdb, foreign_key, key, value):
+    """Sets a mapping key of a foreign key and returns its previous value,
+    like the Redis GETSET command.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        foreign_key (str): the upper case foreign key
+        key (str): the mapping key, e.g. taxon::FK::TAXID
+        value (str): the stable id
+
+    Returns:
+        bytes: the previous value of the key or None
+    """
+    if not FK_BUCKETS:
+        return rdb.getset(key, value)
+    pipe = rdb.pipeline()
+    pipe.hget(fk_bucket(foreign_key), key)
+    pipe.hset(fk_bucket(foreign_key), key, value)
+    return pipe.execute()[0]
+
+def mget_fk(rdb, fk_array, keys):
+    """Returns the values of mapping keys in the encoding of FK_BUCKETS.
+
+    With buckets, the keys are read with pipelined HGET in one round trip.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        fk_array (list): the upper case foreign key of each key
+        keys (list): the mapping keys to read
+
+    Returns:
+        list: the value (bytes or None) of each key
+    """
+    if not FK_BUCKETS or not hasattr(rdb, 'pipeline'):
+        return rdb.mget(keys)
+    pipe = rdb.pipeline(transaction=False)
+    for foreign_key, key in zip(fk_array, keys):
+        pipe.hget(fk_bucket(foreign_key), key)
+    return pipe.execute()
+
+def memory_report(rdb):
+    """Returns the memory used by the Redis db and its number of keys.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+
+    Returns:
+        dict: used_memory (bytes) and keys of the db
+    """
+    return {'used_memory': rdb.info('memory')['used_memory'],
+            'keys': rdb.dbsize()}
+
+def bucket_fk_keys(args=None):
+    """Moves the foreign key mappings in string keys into args.redis_buckets
+    hashes and reports the memory of the Redis db before and after.
+
+    The hashes stay in the compact encoding of Redis as long as they hold no
+    more fields than hash-max-ziplist-entries, so args.redis_buckets should be
+    about the number of mapping keys divided by a few hundred. Keys already
+    in a bucket are kept, so the move can be run again to finish an
+    interrupted one.
+
+    Args:
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        dict: the memory_report before and after, and the number of keys moved
+    """
+    if args is None:
+        args = cf.config_args()
+    if not args.redis_buckets:
+        raise ValueError('ERROR: --redis_buckets must be set to bucket the mappings')
+    rdb = get_database(args)
+    report = {'before': memory_report(rdb), 'moved': 0}
+    for pattern in FK_PATTERNS:
+        keys = []
+        for key in rdb.scan_iter(match=pattern, count=MGET_CHUNK):
+            keys.append(key)
+            if len(keys) >= MGET_CHUNK:
+                report['moved'] += move_fk_keys(rdb, keys)
+                keys = []
+        report['moved'] += move_fk_keys(rdb, keys)
+    report['after'] = memory_report(rdb)
+    return report
+
+def move_fk_keys(rdb, keys):
+    """Moves a batch of mapping string keys into their buckets with one
+    pipeline.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        keys (list): the scanned mapping keys
+
+    Returns:
+        int: the number of keys moved
+    """
+    if not keys:
+        return 0
+    moved = 0
+    pipe = rdb.pipeline()
+    for key, val in zip(keys, rdb.mget(keys)):
+        if val is None:
+            continue
+        foreign_key = key.decode().split('::')[1]
+        pipe.hsetnx(fk_bucket(foreign_key), key, val)
+        pipe.delete(key)
+        moved += 1
+    pipe.execute()
+    return moved
 
 def get_node_info(rdb, fk_array, ntype, hint, taxid):
     """Uses the redis database to convert a node alias to KN internal id
@@ -208,7 +628,7 @@ def get_node_info(rdb, fk_array, ntype, hint, taxid):
         ntype = None
 
     if ntype is None:
-        res_arr = rdb.mget(['::'.join(['stable', str(fk), 'type']) for fk in fk_array])
+        res_arr = [vals[0] for vals in mget_meta(rdb, [str(fk) for fk in fk_array], ['type'])]
         fk_prop = [fk for fk, res in zip(fk_array, res_arr) if res is not None
                    and res.decode() == 'Property']
         fk_gene = [fk for fk, res in zip(fk_array, res_arr) if res is not None
@@ -232,7 +652,9 @@ def conv_gene(rdb, fk_array, hint, taxid):
 
     This checks first if there is a unique name for the provided foreign key.
     If not it uses the hint and taxid to try and filter the foreign key
-    possiblities to find a matching stable id.
+    possiblities to find a matching stable id. If LUA_CASCADE is set, the
+    lookups of each batch are resolved in Redis (see conv_gene_lua). The
+    mappings are read from the encoding of FK_BUCKETS (see mget_fk).
 
     Args:
         rdb (redis object): redis connection to the mapping db
@@ -250,6 +672,9 @@ def conv_gene(rdb, fk_array, hint, taxid):
     if hint == 'UNIPROT' or hint == 'UNIPROTKB':
         hint = 'UNIPROT_GN'
 
+    if LUA_CASCADE:
+        return conv_gene_lua(rdb, fk_array, hint, taxid)
+
     ret_stable = ['unmapped-none'] * len(fk_array)
 
     def replace_none(ret_st, pattern):
@@ -259,8 +684,9 @@ def conv_gene(rdb, fk_array, hint, taxid):
         while curr_none:
             temp_curr_none = curr_none[:MGET_CHUNK]
             curr_none = curr_none[MGET_CHUNK:]
-            vals_array = rdb.mget([pattern.format(str(fk_array[i]).upper(), taxid, hint)
-                                   for i in temp_curr_none])
+            fks = [str(fk_array[i]).upper() for i in temp_curr_none]
+            vals_array = mget_fk(rdb, fks, [pattern.format(fk, taxid, hint)
+                                            for fk in fks])
             for i, val in zip(temp_curr_none, vals_array):
                 if val is None:
                     continue
@@ -276,6 +702,36 @@ def conv_gene(rdb, fk_array, hint, taxid):
         replace_none(ret_stable, 'unique::{0}')
     return ret_stable
 
+def conv_gene_lua(rdb, fk_array, hint, taxid):
+    """Uses the redis database to convert a gene to ensembl stable id with a
+    single request per batch of foreign keys.
+
+    This sends each batch of MGET_CHUNK foreign keys to CONV_GENE_LUA, which
+    tries the triplet, taxon, hint and unique keys of each foreign key in
+    Redis in the same order as conv_gene, so that the result is the same
+    without a round trip for each key pattern. With FK_BUCKETS, the bucket
+    of each foreign key is sent with it and the keys are read from it.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        fk_array (list): the foreign gene identifers to be translated
+        hint (str): a hint for conversion, already upper case or None
+        taxid (str): the species taxid, or None if unknown
+
+    Returns:
+        list: the stable id of each foreign key or unmapped-*
+    """
+    script = rdb.register_script(CONV_GENE_LUA)
+    ret_stable = []
+    for start in range(0, len(fk_array), MGET_CHUNK):
+        batch = [taxid or '', hint or '', '1' if FK_BUCKETS else '0']
+        for fk in fk_array[start:start + MGET_CHUNK]:
+            fk = str(fk).upper()
+            batch.extend([fk, fk_bucket(fk) if FK_BUCKETS else ''])
+        vals_array = script(args=batch)
+        ret_stable.extend('unmapped-none' if val is None else val.decode()
+                          for val in vals_array)
+    return ret_stable
 
 def node_desc(rdb, stable_array):
     """Uses the redis database to find metadata about node given its stable id
@@ -295,26 +751,13 @@ def node_desc(rdb, stable_array):
     ret_biotype = ["unmapped-none"] * len(stable_array)
     st_map_idxs = [idx for idx, st in enumerate(stable_array) if not st.startswith('unmapped')]
     if st_map_idxs:
-        vals_array = rdb.mget(['::'.join(['stable', stable_array[i], 'type']) for i in st_map_idxs])
-        for i, val in zip(st_map_idxs, vals_array):
-            if val is None:
-                continue
-            ret_type[i] = val.decode()
-        vals_array = rdb.mget(['::'.join(['stable', stable_array[i], 'alias']) for i in st_map_idxs])
-        for i, val in zip(st_map_idxs, vals_array):
-            if val is None:
-                continue
-            ret_alias[i] = val.decode()
-        vals_array = rdb.mget(['::'.join(['stable', stable_array[i], 'desc']) for i in st_map_idxs])
-        for i, val in zip(st_map_idxs, vals_array):
-            if val is None:
-                continue
-            ret_desc[i] = val.decode()
-        vals_array = rdb.mget(['::'.join(['stable', stable_array[i], 'biotype']) for i in st_map_idxs])
-        for i, val in zip(st_map_idxs, vals_array):
-            if val is None:
-                continue
-            ret_biotype[i] = val.decode()
+        vals_array = mget_meta(rdb, [stable_array[i] for i in st_map_idxs],
+                               ['type', 'alias', 'desc', 'biotype'])
+        for i, vals in zip(st_map_idxs, vals_array):
+            for ret_arr, val in zip([ret_type, ret_alias, ret_desc, ret_biotype], vals):
+                if val is None:
+                    continue
+                ret_arr[i] = val.decode()
     return stable_array, ret_type, ret_alias, ret_desc, ret_biotype
 
 
@@ -323,11 +766,33 @@ def main():
     arguements.
 
     This uses the provided command line arguments and the defaults found in
-    config_utilities to launch a Redis docker container using marathon.
+    config_utilities to launch a Redis docker container using marathon. With
+    --migrate_meta, it moves the node metadata of the Redis db into hashes
+    (see migrate_node_meta), and with --bucket_keys, it moves the foreign key
+    mappings into buckets and reports the memory (see bucket_fk_keys),
+    instead.
     """
     parser = ArgumentParser()
+    parser.add_argument('-mm', '--migrate_meta', action='store_true', default=False,
+                        help='move the node metadata string keys of the running '
+                        'Redis into hashes instead of deploying a container')
+    parser.add_argument('-bk', '--bucket_keys', action='store_true', default=False,
+                        help='move the foreign key mappings of the running Redis '
+                        'into --redis_buckets hashes and report its memory, '
+                        'instead of deploying a container')
     parser = cf.add_config_args(parser)
     args = parser.parse_args()
+    if args.migrate_meta:
+        print('moved {0} node metadata keys'.format(migrate_node_meta(args)))
+        return
+    if args.bucket_keys:
+        report = bucket_fk_keys(args)
+        print('moved {0} mapping keys into {1} buckets'.format(report['moved'],
+                                                               args.redis_buckets))
+        for when in ['before', 'after']:
+            print('{0}: {1} keys, {2:.1f} MB used'.format(
+                when, report[when]['keys'], report[when]['used_memory'] / 2**20))
+        return
     deploy_container(args)
 
 if __name__ == "__main__":
@@ -0,0 +1,315 @@
+"""Utiliites for exporting the gene identifier mappings of the KnowEnG Redis
+db into a read-only snapshot that is looked up through memory maps.
+
+The snapshot is a directory of shard files. The taxon:: and triplet:: keys
+of each species are stored in the shard of its taxid, and the unique::,
+hint:: and stable:: keys in the common shard. Each shard holds its lines
+(key, value) sorted by key, followed by the offset of every line and a
+footer with the number of lines and the position of the offsets, so a key
+is found by a binary search over the page-cached file. Map jobs reading
+the same snapshot share its pages and make no network requests.
+
+Contains the class MapSnapshot which looks up keys in a snapshot with the
+mget interface of a Redis connection used by redis_utilities.
+
+Contains module functions::
+
+    get_mapper(args=None)
+    shard_name(key)
+    write_shard(sorted_file, shard_file)
+    export_snapshot(snapshot_dir, args=None)
+    write_keys(rdb, keys, build_dir, outfiles, counts)
+    main_parse_args()
+
+Attributes:
+    SNAPSHOT_PATTERNS (list): patterns of the Redis keys exported
+    COMMON_SHARD (str): name of the shard of the keys without a taxid
+    SHARD_EXT (str): extension of the shard files
+    FOOTER (struct.Struct): the footer of a shard (lines, offsets position)
+    OFFSET (struct.Struct): the offset of a line in a shard
+    SCAN_COUNT (int): number of keys requested in each scan of Redis
+
+Examples:
+    To export the mappings of Redis after the setup pipeline::
+
+        $ python3 code/snapshot_utilities.py -ms /path/to/snapshot
+
+    To map an edge file with the snapshot instead of Redis::
+
+        $ python3 code/conv_utilities.py -ms /path/to/snapshot \
+            data/dip/PPI/chunks/dip.PPI.table.1.txt
+"""
+
+import os
+import mmap
+import shutil
+import struct
+from argparse import ArgumentParser
+import config_utilities as cf
+import redis_utilities as ru
+import sort_utilities as st
+
+SNAPSHOT_PATTERNS = ['unique::*', 'hint::*', 'taxon::*', 'triplet::*',
+                     'fkmap::*', 'stable::*']
+COMMON_SHARD = 'common'
+SHARD_EXT = '.snap'
+FOOTER = struct.Struct('<QQ')
+OFFSET = struct.Struct('<Q')
+SCAN_COUNT = 10000
+
+class MapSnapshot(object):
+    """Looks up keys in a mapping snapshot.
+
+    This offers the mget method of a Redis connection, so that it can be
+    passed as rdb to redis_utilities.conv_gene and get_node_info. Shards are
+    memory mapped when they are first needed, and keys of a taxid without a
+    shard are not found.
+
+    Attributes:
+        snapshot_dir (str): the directory of the shard files
+        shards (dict): the (mmap, lines, offsets position) of each opened
+            shard, or None if the shard does not exist, keyed by shard name
+    """
+    def __init__(self, snapshot_dir):
+        """Init a MapSnapshot object for the snapshot in snapshot_dir.
+
+        Args:
+            snapshot_dir (str): the directory of the shard files
+        """
+        if not os.path.isdir(snapshot_dir):
+            raise IOError('ERROR: mapping snapshot ' + snapshot_dir + ' does not exist')
+        self.snapshot_dir = snapshot_dir
+        self.shards = dict()
+
+    def get_shard(self, name):
+        """Returns the opened shard of the given name, or None if it does not
+        exist.
+
+        Args:
+            name (str): the shard name (see shard_name)
+
+        Returns:
+            tuple: (mmap, lines, offsets position) of the shard or None
+        """
+        if name not in self.shards:
+            filename = os.path.join(self.snapshot_dir, name + SHARD_EXT)
+            if not os.path.isfile(filename) or not os.path.getsize(filename):
+                self.shards[name] = None
+            else:
+                with open(filename, 'rb') as infile:
+                    mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+                lines, offsets = FOOTER.unpack_from(mapped, len(mapped) - FOOTER.size)
+                self.shards[name] = (mapped, lines, offsets)
+        return self.shards[name]
+
+    def get(self, key):
+        """Returns the value of a key, or None if it is not in the snapshot.
+
+        Args:
+            key (str): the Redis key to look up
+
+        Returns:
+            bytes: the value of the key or None
+        """
+        shard = self.get_shard(shard_name(key))
+        if shard is None:
+            return None
+        (mapped, lines, offsets) = shard
+        target = key.encode()
+        low, high = 0, lines
+        while low < high:
+            mid = (low + high) // 2
+            start = OFFSET.unpack_from(mapped, offsets + mid * OFFSET.size)[0]
+            tab = mapped.find(b'\t', start)
+            curr = mapped[start:tab]
+            if curr < target:
+                low = mid + 1
+            elif curr > target:
+                high = mid
+            else:
+                return mapped[tab + 1:mapped.find(b'\n', tab)]
+        return None
+
+    def mget(self, keys):
+        """Returns the values of keys like the Redis MGET command.
+
+        Args:
+            keys (list): the Redis keys to look up
+
+        Returns:
+            list: the value of each key, or None if it is not in the snapshot
+        """
+        return [self.get(key) for key in keys]
+
+    def close(self):
+        """Unmaps the opened shards."""
+        for shard in self.shards.values():
+            if shard is not None:
+                shard[0].close()
+        self.shards = dict()
+
+def get_mapper(args=None):
+    """Returns the source of gene mappings for map jobs.
+
+    Args:
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        object: a MapSnapshot of args.map_snapshot if it is set, or else a
+            Redis connection (see redis_utilities.get_database)
+    """
+    if args is None:
+        args = cf.config_args()
+    if args.map_snapshot:
+        return MapSnapshot(args.map_snapshot)
+    return ru.get_database(args)
+
+def shard_name(key):
+    """Returns the name of the shard of a Redis key.
+
+    Args:
+        key (str): a mapping key, e.g. taxon::FK::TAXID or
+            triplet::FK::TAXID::HINT
+
+    Returns:
+        str: the taxid of taxon:: and triplet:: keys, or COMMON_SHARD
+    """
+    if key.startswith('taxon::'):
+        return key.rsplit('::', 1)[1]
+    if key.startswith('triplet::'):
+        return key.rsplit('::', 2)[1]
+    return COMMON_SHARD
+
+def write_shard(sorted_file, shard_file):
+    """Writes the shard file of the lines of sorted_file.
+
+    Args:
+        sorted_file (str): file of lines (key, value) sorted by key
+        shard_file (str): the shard file to write
+    """
+    offsets_file = shard_file + '.offsets'
+    lines = position = 0
+    with open(sorted_file, 'rb') as infile, open(shard_file, 'wb') as out, \
+            open(offsets_file, 'wb') as offsets:
+        for line in infile:
+            offsets.write(OFFSET.pack(position))
+            out.write(line)
+            position += len(line)
+            lines += 1
+    with open(offsets_file, 'rb') as offsets, open(shard_file, 'ab') as out:
+        shutil.copyfileobj(offsets, out)
+        out.write(FOOTER.pack(lines, position))
+    os.remove(offsets_file)
+
+def export_snapshot(snapshot_dir, args=None):
+    """Exports the gene mappings of the Redis db into a snapshot.
+
+    This scans the keys of SNAPSHOT_PATTERNS, writes them to the lines of
+    their shards (see write_keys), sorts each shard by key (see
+    sort_utilities.sort_file) and writes the shard files. Shards are built
+    beside the snapshot and replace it when all are written.
+
+    Args:
+        snapshot_dir (str): the directory of the shard files to write
+        args (Namespace): args as populated namespace or 'None' for defaults
+
+    Returns:
+        dict: the number of keys in each shard, keyed by shard name
+    """
+    if args is None:
+        args = cf.config_args()
+    rdb = ru.get_database(args)
+    st.set_sort_limits(args.sort_memory, args.num_procs, args.sort_compress,
+                       args.merge_fan_in)
+    build_dir = snapshot_dir.rstrip(os.sep) + '.build'
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+    os.makedirs(build_dir)
+    outfiles = dict()
+    counts = dict()
+    try:
+        for pattern in SNAPSHOT_PATTERNS:
+            keys = []
+            for key in rdb.scan_iter(match=pattern, count=SCAN_COUNT):
+                keys.append(key)
+                if len(keys) < ru.MGET_CHUNK:
+                    continue
+                write_keys(rdb, keys, build_dir, outfiles, counts)
+                keys = []
+            write_keys(rdb, keys, build_dir, outfiles, counts)
+    finally:
+        for outfile in outfiles.values():
+            outfile.close()
+    for name in outfiles:
+        lines_file = os.path.join(build_dir, name + '.txt')
+        sorted_file = os.path.join(build_dir, name + '.sorted.txt')
+        st.sort_file(lines_file, sorted_file, key_columns=[1])
+        os.remove(lines_file)
+        write_shard(sorted_file, os.path.join(build_dir, name + SHARD_EXT))
+        os.remove(sorted_file)
+    if os.path.isdir(snapshot_dir):
+        shutil.rmtree(snapshot_dir)
+    os.rename(build_dir, snapshot_dir)
+    return counts
+
+def write_keys(rdb, keys, build_dir, outfiles, counts):
+    """Writes the values of a batch of keys to the lines of their shards.
+
+    Node metadata stored in hashes (see redis_utilities.HASH_META) is written
+    as the string keys of its fields (stable::node_id::field), and the
+    mappings stored in buckets (see redis_utilities.FK_BUCKETS) as the keys
+    they hold, which is how the snapshot is read.
+
+    Args:
+        rdb (redis object): redis connection to the mapping db
+        keys (list): the keys to write, as returned by scan
+        build_dir (str): the directory of the shard lines
+        outfiles (dict): the open lines file of each shard, keyed by name
+        counts (dict): the number of keys written to each shard
+    """
+    if not keys:
+        return
+    items = []
+    hashes = []
+    for key, val in zip(keys, rdb.mget(keys)):
+        if val is not None:
+            items.append((key.decode(), val))
+        elif key.startswith(b'stable::') or key.startswith(b'fkmap::'):
+            hashes.append(key.decode())
+    if hashes:
+        pipe = rdb.pipeline(transaction=False)
+        for key in hashes:
+            pipe.hgetall(key)
+        for key, fields in zip(hashes, pipe.execute()):
+            prefix = key + '::' if key.startswith('stable::') else ''
+            items.extend((prefix + field.decode(), val)
+                         for field, val in fields.items())
+    for key, val in items:
+        if '\t' in key or b'\n' in val:
+            continue
+        name = shard_name(key)
+        if name not in outfiles:
+            outfiles[name] = open(os.path.join(build_dir, name + '.txt'), 'wb')
+            counts[name] = 0
+        outfiles[name].write(key.encode() + b'\t' + val + b'\n')
+        counts[name] += 1
+
+def main_parse_args():
+    """Processes command line arguments.
+
+    Returns:
+        Namespace: args as populated namespace
+    """
+    parser = ArgumentParser()
+    parser = cf.add_config_args(parser)
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+    args = main_parse_args()
+    snapshot_dir = args.map_snapshot
+    if not snapshot_dir:
+        snapshot_dir = os.path.join(args.working_dir, args.data_path,
+                                    cf.DEFAULT_MAP_PATH, 'snapshot')
+    for name, count in sorted(export_snapshot(snapshot_dir, args).items()):
+        print('{0}: {1} keys'.format(name, count))
@@ -0,0 +1,469 @@
+"""Utiliites for sorting and uniquing the tab separated files of the Knowledge
+Network (KN) within the pipeline processes.
+
+Lines are compared as bytes without their newline, which is the order of
+LC_ALL=C sort, either as whole lines or on key columns. Input larger than the
+memory budget is sorted into runs that are spilled to compressed temporary
+files and merged, and if more than one process is allowed, the runs of
+separate byte ranges of the input are sorted in parallel.
+
+Contains module functions::
+
+    set_sort_limits(memory, processes, compress, fan_in)
+    cut_line(line, columns)
+    line_key(key_columns)
+    read_lines(ranges)
+    read_run(filename)
+    write_run(lines, tmp_dir, compress)
+    unique_lines(lines, key_columns=None)
+    split_ranges(infiles, parts)
+    generate_runs(ranges, columns, key_columns, unique, memory, compress,
+                  tmp_dir, spill_last=True)
+    sort_runs(task)
+    merge_sorted(streams, key_columns=None, unique=True)
+    merge_runs(task)
+    reduce_runs(runs, key_columns=None, unique=True, tmp_dir=None, keep=())
+    write_merged(runs, out, key_columns=None, unique=True, reducer=None)
+    merge_files(infiles, outfile, key_columns=None, unique=True, tmp_dir=None,
+                reducer=None)
+    sort_file(infiles, outfile, columns=None, key_columns=None, unique=True,
+              tmp_dir=None)
+
+Attributes:
+    SORT_MEMORY (float): MB of lines held in memory by a sort
+    SORT_PROCS (int): number of processes sorting or merging runs in parallel
+    SORT_COMPRESS (int): gzip level of spilled runs, 0 for no compression
+    SORT_FAN_IN (int): maximum number of files merged at once
+    LINE_OVERHEAD (int): bytes of memory used by a line besides its length
+    BLOCKSIZE (int): number of bytes buffered for each file
+    RUN_EXT (str): extension of spilled runs
+
+"""
+
+import os
+import gzip
+import heapq
+import operator
+import tempfile
+import multiprocessing
+from multiprocessing import Pool
+import config_utilities as cf
+
+SORT_MEMORY = cf.DEFAULT_SORT_MEMORY
+SORT_PROCS = cf.DEFAULT_NUM_PROCS
+SORT_COMPRESS = cf.DEFAULT_SORT_COMPRESS
+SORT_FAN_IN = cf.DEFAULT_MERGE_FAN_IN
+LINE_OVERHEAD = 41
+BLOCKSIZE = 1024 * 1024
+RUN_EXT = '.run'
+
+def set_sort_limits(memory, processes, compress, fan_in):
+    """Sets the limits of the sorts and merges run from now on.
+
+    Args:
+        memory (float): MB of lines held in memory by a sort
+        processes (int): number of processes sorting or merging runs in
+            parallel
+        compress (int): gzip level of spilled runs, 0 for no compression
+        fan_in (int): maximum number of files merged at once, at least 2
+    """
+    global SORT_MEMORY, SORT_PROCS, SORT_COMPRESS, SORT_FAN_IN
+    SORT_MEMORY = memory
+    SORT_PROCS = max(1, processes)
+    SORT_COMPRESS = compress
+    SORT_FAN_IN = max(2, fan_in)
+
+def cut_line(line, columns):
+    """Returns the columns of a line like cut -f.
+
+    The columns are returned in the order of the line, and a line without
+    tabs is returned whole.
+
+    Args:
+        line (bytes): a newline terminated line
+        columns (list): sorted 1-based numbers of the columns to keep
+
+    Returns:
+        bytes: the newline terminated columns of the line
+    """
+    fields = line[:-1].split(b'\t')
+    if len(fields) == 1:
+        return line
+    return b'\t'.join(fields[col - 1] for col in columns
+                      if col <= len(fields)) + b'\n'
+
+def line_key(key_columns):
+    """Returns the sort key function for the key columns, or for whole lines.
+
+    Lines are compared without their newline, as LC_ALL=C sort does, so that
+    a line sorts before the longer lines it is a prefix of (b'a' before
+    b'a\tb'). The key of a line is the list of its key columns followed by
+    the whole line, so that lines with equal keys are still in a fixed order.
+
+    Args:
+        key_columns (list): 1-based numbers of the columns to sort on, in
+            order of priority, or None
+
+    Returns:
+        function: the key function of a line
+    """
+    if not key_columns:
+        return operator.itemgetter(slice(None, -1))
+    indexes = [col - 1 for col in key_columns]
+    def key(line):
+        text = line[:-1]
+        fields = text.split(b'\t')
+        return [fields[i] if i < len(fields) else b'' for i in indexes] + [text]
+    return key
+
+def read_lines(ranges):
+    """Yields the newline terminated lines of byte ranges of files.
+
+    Args:
+        ranges (list): (filename, start, end) of each range, where end is the
+            offset after the last line or None for the end of the file
+
+    Yields:
+        bytes: the next line
+    """
+    for (filename, start, end) in ranges:
+        with open(filename, 'rb', BLOCKSIZE) as infile:
+            infile.seek(start)
+            for line in infile:
+                if end is not None:
+                    if start >= end:
+                        break
+                    start += len(line)
+                if line[-1:] != b'\n':
+                    line += b'\n'
+                yield line
+
+def read_run(filename):
+    """Yields the lines of a sorted file, which is read as gzip if its name
+    ends in .gz.
+
+    Args:
+        filename (str): the sorted file or spilled run
+
+    Yields:
+        bytes: the next line
+    """
+    if filename.endswith('.gz'):
+        infile = gzip.open(filename, 'rb')
+    else:
+        infile = open(filename, 'rb', BLOCKSIZE)
+    with infile:
+        for line in infile:
+            if line[-1:] != b'\n':
+                line += b'\n'
+            yield line
+
+def write_run(lines, tmp_dir, compress):
+    """Spills sorted lines to a temporary file in tmp_dir.
+
+    Args:
+        lines (iterable): the sorted lines
+        tmp_dir (str): the directory to write the run in
+        compress (int): gzip level of the run, 0 for no compression
+
+    Returns:
+        str: the path to the run
+    """
+    suffix = RUN_EXT + '.gz' if compress else RUN_EXT
+    fd, filename = tempfile.mkstemp(suffix=suffix, dir=tmp_dir)
+    os.close(fd)
+    if compress:
+        out = gzip.open(filename, 'wb', compresslevel=compress)
+    else:
+        out = open(filename, 'wb', BLOCKSIZE)
+    with out:
+        out.writelines(lines)
+    return filename
+
+def unique_lines(lines, key_columns=None):
+    """Yields the sorted lines without repeats, like uniq.
+
+    Args:
+        lines (iterable): the sorted lines
+        key_columns (list): 1-based numbers of the columns compared, or None
+            to compare whole lines
+
+    Yields:
+        bytes: the first line of each run of equal lines
+    """
+    key = line_key(key_columns)
+    prev = None
+    for line in lines:
+        curr = key(line) if not key_columns else key(line)[:-1]
+        if curr != prev:
+            yield line
+            prev = curr
+
+def split_ranges(infiles, parts):
+    """Splits files into at most parts lists of byte ranges of about equal
+    size that start and end at line boundaries.
+
+    Args:
+        infiles (list): the files to split
+        parts (int): the number of lists to split the files into
+
+    Returns:
+        list: lists of (filename, start, end) ranges (see read_lines)
+    """
+    sizes = [os.path.getsize(filename) for filename in infiles]
+    step = max(1, sum(sizes) // parts)
+    tasks = [[]]
+    filled = 0
+    for filename, size in zip(infiles, sizes):
+        start = 0
+        with open(filename, 'rb') as infile:
+            while start < size:
+                end = size
+                if len(tasks) < parts and start + step - filled < size:
+                    infile.seek(max(start, start + step - filled - 1))
+                    infile.readline()
+                    end = infile.tell()
+                tasks[-1].append((filename, start, end))
+                filled += end - start
+                start = end
+                if filled >= step and len(tasks) < parts:
+                    tasks.append([])
+                    filled = 0
+    return [task for task in tasks if task]
+
+def generate_runs(ranges, columns, key_columns, unique, memory, compress,
+                  tmp_dir, spill_last=True):
+    """Sorts the lines of byte ranges of files into runs that fit in memory.
+
+    Lines are read (and cut to columns) until they fill the memory budget,
+    then sorted, uniqued if requested and spilled to a run in tmp_dir.
+
+    Args:
+        ranges (list): (filename, start, end) ranges to sort (see read_lines)
+        columns (list): sorted 1-based numbers of the columns to keep, or
+            None for whole lines
+        key_columns (list): 1-based numbers of the columns to sort on, or None
+        unique (bool): if repeated lines (or keys) are removed
+        memory (int): bytes of lines held in memory
+        compress (int): gzip level of the runs, 0 for no compression
+        tmp_dir (str): the directory to write the runs in
+        spill_last (bool): if the last run is spilled even if it is the only
+            one, rather than returned in memory
+
+    Returns:
+        tuple: (list of run files, list of sorted lines of the last run)
+    """
+    key = line_key(key_columns)
+    runs = []
+    lines = []
+    used = 0
+    for line in read_lines(ranges):
+        if columns:
+            line = cut_line(line, columns)
+        lines.append(line)
+        used += len(line) + LINE_OVERHEAD
+        if used >= memory:
+            lines.sort(key=key)
+            runs.append(write_run(unique_lines(lines, key_columns) if unique
+                                  else lines, tmp_dir, compress))
+            lines = []
+            used = 0
+    lines.sort(key=key)
+    if unique:
+        lines = list(unique_lines(lines, key_columns))
+    if lines and (spill_last or runs):
+        runs.append(write_run(lines, tmp_dir, compress))
+        lines = []
+    return runs, lines
+
+def sort_runs(task):
+    """Sorts a share of the input into spilled runs.
+
+    This is the unit of work for a parallel sort (see sort_file).
+
+    Args:
+        task (tuple): (ranges, columns, key_columns, unique, memory,
+            compress, tmp_dir) arguments of generate_runs
+
+    Returns:
+        list: the run files written
+    """
+    return generate_runs(*task)[0]
+
+def merge_sorted(streams, key_columns=None, unique=True):
+    """Merges sorted streams of lines like sort -m.
+
+    Args:
+        streams (list): iterables of sorted lines
+        key_columns (list): 1-based numbers of the columns the streams are
+            sorted on, or None for whole lines
+        unique (bool): if repeated lines (or keys) are removed
+
+    Returns:
+        iterable: the merged lines
+    """
+    merged = heapq.merge(*streams, key=line_key(key_columns))
+    if unique:
+        return unique_lines(merged, key_columns)
+    return merged
+
+def merge_runs(task):
+    """Merges a group of sorted files into a spilled run.
+
+    This is the unit of work for a level of the merge tree (see
+    reduce_runs).
+
+    Args:
+        task (tuple): (group, key_columns, unique, tmp_dir, compress, keep)
+            where group is the list of sorted files and keep the set of
+            files not to remove once merged
+
+    Returns:
+        str: the path to the merged run
+    """
+    (group, key_columns, unique, tmp_dir, compress, keep) = task
+    run = write_run(merge_sorted([read_run(filename) for filename in group],
+                                 key_columns, unique), tmp_dir, compress)
+    for filename in group:
+        if filename not in keep:
+            os.remove(filename)
+    return run
+
+def reduce_runs(runs, key_columns=None, unique=True, tmp_dir=None, keep=()):
+    """Merges sorted files in a tree until no more than SORT_FAN_IN are left.
+
+    Each level of the tree splits the files into groups of at most
+    SORT_FAN_IN files of about equal number, and merges the groups into
+    runs in parallel over SORT_PROCS processes. As every run is sorted and
+    uniqued, so is the final merge of the runs that are left.
+
+    Args:
+        runs (list): the sorted files
+        key_columns (list): 1-based numbers of the columns the files are
+            sorted on, or None for whole lines
+        unique (bool): if repeated lines (or keys) are removed
+        tmp_dir (str): the directory to write the merged runs in
+        keep (set): the files of runs not to remove once merged
+
+    Returns:
+        list: the sorted files left to merge
+    """
+    processes = SORT_PROCS
+    if multiprocessing.current_process().daemon:
+        processes = 1
+    while len(runs) > SORT_FAN_IN:
+        num_groups = -(-len(runs) // SORT_FAN_IN)
+        tasks = [(runs[i::num_groups], key_columns, unique, tmp_dir,
+                  SORT_COMPRESS, keep) for i in range(num_groups)]
+        if processes > 1:
+            with Pool(min(processes, num_groups)) as pool:
+                runs = pool.map(merge_runs, tasks)
+        else:
+            runs = [merge_runs(task) for task in tasks]
+    return runs
+
+def write_merged(runs, out, key_columns=None, unique=True, reducer=None):
+    """Writes the merge of sorted files to an open file, such as a pipe.
+
+    Args:
+        runs (list): the sorted files, no more than SORT_FAN_IN (see
+            reduce_runs)
+        out (file): the binary file to write the merged lines to
+        key_columns (list): 1-based numbers of the columns the files are
+            sorted on, or None for whole lines
+        unique (bool): if repeated lines (or keys) are removed
+        reducer (function): takes the iterable of merged lines and returns
+            the iterable of lines to write, or None to write them as merged
+    """
+    merged = merge_sorted([read_run(run) for run in runs], key_columns, unique)
+    out.writelines(merged if reducer is None else reducer(merged))
+
+def merge_files(infiles, outfile, key_columns=None, unique=True, tmp_dir=None,
+                reducer=None):
+    """Merges already sorted files into outfile like sort -m.
+
+    Any number of files can be merged, through a merge tree of at most
+    SORT_FAN_IN files per merge (see reduce_runs). The lines of the final
+    merge can be reduced on the fly, e.g. to one line per key, as they are
+    written.
+
+    Args:
+        infiles (list): the sorted files
+        outfile (str): the file to save the result into
+        key_columns (list): 1-based numbers of the columns the files are
+            sorted on, or None for whole lines
+        unique (bool): if repeated lines (or keys) are removed
+        tmp_dir (str): the directory for intermediate runs, or None for the
+            directory of outfile
+        reducer (function): takes the iterable of merged lines and returns
+            the iterable of lines to write, or None to write them as merged
+    """
+    if tmp_dir is None:
+        tmp_dir = os.path.dirname(os.path.abspath(outfile))
+    infiles = list(infiles)
+    runs = reduce_runs(infiles, key_columns, unique, tmp_dir, set(infiles))
+    try:
+        with open(outfile, 'wb', BLOCKSIZE) as out:
+            write_merged(runs, out, key_columns, unique, reducer)
+    finally:
+        for run in runs:
+            if run not in infiles:
+                os.remove(run)
+
+def sort_file(infiles, outfile, columns=None, key_columns=None, unique=True,
+              tmp_dir=None):
+    """Sorts files into outfile like LC_ALL=C cut -f columns | sort -u.
+
+    Input that fits in SORT_MEMORY is sorted in memory. Otherwise it is
+    sorted into runs spilled to tmp_dir (compressed at SORT_COMPRESS), by
+    SORT_PROCS processes over separate byte ranges of the input, and the
+    runs are merged (see reduce_runs). Sorts started from a worker process
+    run in that process.
+
+    Args:
+        infiles (str or list): the file or files to sort
+        outfile (str): the file to save the result into
+        columns (list): 1-based numbers of the columns to keep like cut -f,
+            or None for whole lines
+        key_columns (list): 1-based numbers of the columns (after the cut) to
+            sort on in order of priority, or None for whole lines. If unique,
+            only the first line of each key is kept.
+        unique (bool): if repeated lines (or keys) are removed
+        tmp_dir (str): the directory for spilled runs, or None for the
+            directory of outfile
+    """
+    if isinstance(infiles, str):
+        infiles = [infiles]
+    if columns:
+        columns = sorted(set(columns))
+    if tmp_dir is None:
+        tmp_dir = os.path.dirname(os.path.abspath(outfile))
+    memory = int(SORT_MEMORY * 1024 * 1024)
+    processes = SORT_PROCS
+    if multiprocessing.current_process().daemon:
+        processes = 1
+    total = sum(os.path.getsize(filename) for filename in infiles)
+    runs = []
+    try:
+        if processes > 1 and total > memory:
+            tasks = [(ranges, columns, key_columns, unique, memory // processes,
+                      SORT_COMPRESS, tmp_dir)
+                     for ranges in split_ranges(infiles, processes)]
+            with Pool(len(tasks)) as pool:
+                for task_runs in pool.imap_unordered(sort_runs, tasks):
+                    runs.extend(task_runs)
+            lines = []
+        else:
+            ranges = [(filename, 0, None) for filename in infiles]
+            runs, lines = generate_runs(ranges, columns, key_columns, unique,
+                                        memory, SORT_COMPRESS, tmp_dir, False)
+        runs = reduce_runs(runs, key_columns, unique, tmp_dir)
+        streams = [read_run(run) for run in runs]
+        if lines:
+            streams.append(lines)
+        with open(outfile, 'wb', BLOCKSIZE) as out:
+            out.writelines(merge_sorted(streams, key_columns, unique))
+    finally:
+        for run in runs:
+            if os.path.exists(run):
+                os.remove(run)
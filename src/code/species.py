@@ -9,8 +9,6 @@ Functions:
     get_SrcClass: returns an Species object
     main: runs compare_versions (see utilities.py) on a Species object
 """
-import time
-import ftplib
 import csv
 import json
 import config_utilities as cf
@@ -50,48 +48,6 @@ class Species(SrcClass):
         super(Species, self).__init__(name, url_base, aliases, args)
         self.remote_file = 'names.dmp'
 
-    def get_remote_file_size(self, alias):
-        """Return the remote file size.
-
-        This builds a url for the given alias (see get_remote_url) and then
-        calls the SrcClass function (see utilities.get_remote_file_size).
-
-        Args:
-            alias (str): An alias defined in self.aliases.
-
-        Returns:
-            int: The remote file size in bytes.
-        """
-        ftp = ftplib.FTP(self.url_base)
-        ftp.login()
-        ftp.cwd('/pub/taxonomy/')
-        ftp.voidcmd('TYPE I')
-        file_size = ftp.size('taxdmp.zip')
-        ftp.quit()
-        return file_size
-
-    def get_remote_file_modified(self, alias):
-        """Return the remote file date modified.
-
-        This builds a url for the given alias (see get_remote_url) and then
-        calls the SrcClass function (see utilities.get_remote_file_modified).
-
-        Args:
-            alias (str): An alias defined in self.aliases.
-
-        Returns:
-            float: time of last modification time of remote file in seconds
-                since the epoch
-        """
-        ftp = ftplib.FTP(self.url_base)
-        ftp.login()
-        ftp.cwd('/pub/taxonomy/')
-        time_str = ftp.sendcmd('MDTM taxdmp.zip')
-        time_str = time_str[4:]
-        ftp.quit()
-        time_format = "%Y%m%d%H%M%S"
-        return time.mktime(time.strptime(time_str, time_format))
-
     def get_remote_url(self, alias):
         """Return the remote url needed to fetch the file corresponding to the
         alias.
@@ -9,7 +9,6 @@ Functions:
     get_SrcClass: returns a Biogrid object
     main: runs compare_versions (see utilities.py) on a Biogrid object
 """
-import urllib.request
 import os
 import json
 from check_utilities import SrcClass, compare_versions
@@ -81,9 +80,7 @@ class Biogrid(SrcClass):
         version = super(Biogrid, self).get_source_version(alias)
         if version == 'unknown':
             url = 'http://webservice.thebiogrid.org/version?accesskey='
-            response = urllib.request.urlopen(url + self.access_key)
-            self.version[alias] = response.read().decode()
-            response.close()
+            self.version[alias] = self.get_page(url + self.access_key).decode()
             for alias_name in self.aliases:
                 self.version[alias_name] = self.version[alias]
             return self.version[alias]
@@ -8,7 +8,6 @@ Classes:
 Functions:
     main: runs compare_versions (see utilities.py) on a Dip object
 """
-import urllib.request
 import re
 import os
 import json
@@ -82,25 +81,21 @@ class Dip(SrcClass):
         if version == 'unknown':
             #get the year to provide a more accurate base_url
             if self.year == '':
-                response = urllib.request.urlopen(self.url_base)
-                for line in response:
+                for line in self.get_page(self.url_base).splitlines(True):
                     d_line = line.decode()
                     year_match = re.search(r'href="(\d{4}/)"', d_line)
                     if year_match is not None:
                         if year_match.group(1) > self.year:
                             self.year = year_match.group(1)
-                response.close()
             url = self.url_base + self.year + 'tab25/'
-            response = urllib.request.urlopen(url)
             self.version[alias] = ''
-            the_page = response.readlines()
+            the_page = self.get_page(url).splitlines(True)
             for line in the_page:
                 d_line = line.decode()
                 match = re.search(r'href="(dip\d{8}).txt"', d_line)
                 if match is not None:
                     if match.group(1) > self.version[alias]:
                         self.version[alias] = match.group(1)
-            response.close()
             for alias_name in self.aliases:
                 self.version[alias_name] = self.version[alias]
             return self.version[alias]
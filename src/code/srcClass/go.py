@@ -9,7 +9,6 @@ Functions:
     get_SrcClass: returns a Go object
     main: runs compare_versions (see utilities.py) on a Go object
 """
-import urllib.request
 import re
 import time
 import os
@@ -83,7 +82,7 @@ class Go(SrcClass):
         sp_dict = json.load(open(sp_dir))
         alias_dict = {"obo_map": "ontology"}
         go_url = self.url_base + 'go_annotation_metadata.all.json'
-        go_resp = urllib.request.urlopen(go_url).read().decode()
+        go_resp = self.get_page(go_url).decode()
         go_resources = json.loads(go_resp)
         go_dict = dict()
         for resource in go_resources['resources']:
@@ -115,11 +114,11 @@ class Go(SrcClass):
             return float(0)
         url_download_page = ('http://geneontology.org/gene-associations/'
                              'go_annotation_metadata.all.js')
-        response = urllib.request.urlopen(url_download_page)
+        the_page = self.get_page(url_download_page)
         cur_id = ''
         ret_str = float(0)
         t_format = "%m/%d/%Y"
-        for line in response:
+        for line in the_page.splitlines(True):
             d_line = line.decode()
             alias_match = re.search(r'"id": "(\S+)",', d_line)
             if alias_match is not None:
@@ -132,7 +131,6 @@ class Go(SrcClass):
                 t_str = date_match.group(1)
                 ret_str = time.mktime(time.strptime(t_str, t_format))
                 break
-        response.close()
         return ret_str
 
     def get_remote_url(self, alias):
@@ -151,7 +149,7 @@ class Go(SrcClass):
         if alias == 'obo_map':
             return 'http://purl.obolibrary.org/obo/go.obo'
         go_url = self.url_base + 'go_annotation_metadata.all.json'
-        go_resp = urllib.request.urlopen(go_url).read().decode()
+        go_resp = self.get_page(go_url).decode()
         go_resources = json.loads(go_resp)
         for resource in go_resources['resources']:
             if resource['id'] == alias:
@@ -9,8 +9,6 @@ Functions:
     get_SrcClass: returns an Intact object
     main: runs compare_versions (see utilities.py) on a Intact object
 """
-import time
-import ftplib
 import os
 import json
 import config_utilities as cf
@@ -66,47 +64,6 @@ class Intact(SrcClass):
                         'available to all users, academic or commercial, under the terms of the '
                         'Apache License, Version 2.0.')
 
-    def get_remote_file_size(self, alias):
-        """Return the remote file size.
-
-        This builds a url for the given alias (see get_remote_url) and then
-        calls the SrcClass function (see utilities.get_remote_file_size).
-
-        Args:
-            alias (str): An alias defined in self.aliases.
-
-        Returns:
-            int: The remote file size in bytes.
-        """
-        ftp = ftplib.FTP(self.url_base)
-        ftp.login()
-        ftp.cwd('/pub/databases/intact/current/psimitab/')
-        file_size = ftp.size('intact.zip')
-        ftp.quit()
-        return file_size
-
-    def get_remote_file_modified(self, alias):
-        """Return the remote file date modified.
-
-        This builds a url for the given alias (see get_remote_url) and then
-        calls the SrcClass function (see utilities.get_remote_file_modified).
-
-        Args:
-            alias (str): An alias defined in self.aliases.
-
-        Returns:
-            float: time of last modification time of remote file in seconds
-                since the epoch
-        """
-        ftp = ftplib.FTP(self.url_base)
-        ftp.login()
-        ftp.cwd('/pub/databases/intact/current/psimitab/')
-        time_str = ftp.sendcmd('MDTM intact.zip')
-        time_str = time_str[4:]
-        ftp.quit()
-        time_format = "%Y%m%d%H%M%S"
-        return time.mktime(time.strptime(time_str, time_format))
-
     def get_remote_url(self, alias):
         """Return the remote url needed to fetch the file corresponding to the
         alias.
@@ -9,7 +9,6 @@ Functions:
     get_SrcClass: returns a Kegg object
     main: runs compare_versions (see utilities.py) on a Kegg object
 """
-import urllib.request
 import re
 import time
 import os
@@ -85,9 +84,9 @@ class Kegg(SrcClass):
         sp_dict = json.load(open(sp_dir))
         alias_dict = {"pathway": "pathways"}
         kegg_url = self.url_base + 'list/organism'
-        kegg_resp = urllib.request.urlopen(kegg_url)
+        kegg_resp = self.get_page(kegg_url)
         kegg_dict = dict()
-        for line in kegg_resp:
+        for line in kegg_resp.splitlines():
             (_, org, species, _) = line.decode().split('\t')
             species = ' '.join(species.split(' ')[:2])
             kegg_dict[species] = org
@@ -115,14 +114,12 @@ class Kegg(SrcClass):
         version = super(Kegg, self).get_source_version(alias)
         if version == 'unknown':
             url = self.url_base + 'info/pathway'
-            response = urllib.request.urlopen(url)
-            the_page = response.readlines()
+            the_page = self.get_page(url).splitlines(True)
             for line in the_page:
                 d_line = line.decode()
                 match = re.search(r'Release (\S+)/', d_line)
                 if match is not None:
                     self.version[alias] = match.group(1)
-                    response.close()
                     break
             for alias_name in self.aliases:
                 self.version[alias_name] = self.version[alias]
@@ -158,14 +155,12 @@ class Kegg(SrcClass):
         """
         if self.date_modified == 'unknown':
             url = self.url_base + 'info/pathway'
-            response = urllib.request.urlopen(url)
-            the_page = response.readlines()
+            the_page = self.get_page(url).splitlines(True)
             for line in the_page:
                 d_line = line.decode()
                 match = re.search(r'Release (\S+), ([^<\n]*)', d_line)
                 if match is not None:
                     time_str = match.group(2)
-                    response.close()
                     break
             time_format = "%b %y"
             date_modified = time.mktime(time.strptime(time_str, time_format))
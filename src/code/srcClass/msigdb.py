@@ -9,7 +9,6 @@ Functions:
     get_SrcClass: returns a Msigdb object
     main: runs compare_versions (see utilities.py) on a Msigdb object
 """
-import urllib.request
 import re
 import time
 import csv
@@ -84,8 +83,7 @@ class Msigdb(SrcClass):
         version = super(Msigdb, self).get_source_version(alias)
         if version == 'unknown':
             url = self.url_base + 'msigdb/help.jsp'
-            response = urllib.request.urlopen(url)
-            the_page = response.readlines()
+            the_page = self.get_page(url).splitlines(True)
             for line in the_page:
                 try:
                     d_line = line.decode()
@@ -93,7 +91,6 @@ class Msigdb(SrcClass):
                     continue
                 match = re.search('MSigDB database v([^ ]*)', d_line)
                 if match is not None:
-                    response.close()
                     self.version[alias] = match.group(1)
                     break
             for alias_name in self.aliases:
@@ -116,14 +113,12 @@ class Msigdb(SrcClass):
         """
         if self.date_modified == 'unknown':
             url = self.url_base + 'msigdb/help.jsp'
-            response = urllib.request.urlopen(url)
-            the_page = response.readlines()
+            the_page = self.get_page(url).splitlines(True)
             for line in the_page:
                 d_line = line.decode('ascii', errors='ignore')
                 match = re.search('updated ([^<]*)', d_line)
                 if match is not None:
                     time_str = match.group(1)
-                    response.close()
                     break
             time_format = "%B %Y"
             date_modified = time.mktime(time.strptime(time_str, time_format))
@@ -9,7 +9,6 @@ Functions:
     get_SrcClass: returns a Pathcom object
     main: runs compare_versions (see utilities.py) on a Pathcom object
 """
-import urllib.request
 import re
 import hashlib
 import csv
@@ -74,13 +73,11 @@ class Pathcom(SrcClass):
         """
         version = super(Pathcom, self).get_source_version(alias)
         if version == 'unknown':
-            response = urllib.request.urlopen('http://www.pathwaycommons.org/pc2/downloads')
-            the_page = response.readlines()
-            for line in the_page:
+            the_page = self.get_page('http://www.pathwaycommons.org/pc2/downloads')
+            for line in the_page.splitlines(True):
                 d_line = line.decode()
                 match = re.search('Pathway Commons .* version ([^ ,]*)', d_line)
                 if match is not None:
-                    response.close()
                     self.version[alias] = match.group(1)
                     break
             for alias_name in self.aliases:
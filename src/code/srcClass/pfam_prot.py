@@ -116,13 +116,11 @@ class PfamProt(SrcClass):
         """
         if alias not in self.version:
             release_note_url = self.url_base + 'current_release/relnotes.txt'
-            response = urllib.request.urlopen(release_note_url)
-            the_page = response.readlines()
+            the_page = self.get_page(release_note_url).splitlines(True)
             for line in the_page:
                 d_line = line.decode()
                 match = re.search(r"RELEASE (\d+\.?\d*)", d_line)
                 if match is not None:
-                    response.close()
                     vers = match.group(1)
                     self.version[alias] = vers
                     return self.version[alias]
@@ -9,7 +9,6 @@ Functions:
     get_SrcClass: returns a Reactome object
     main: runs compare_versions (see utilities.py) on a Reactome object
 """
-import urllib.request
 import re
 import os
 import json
@@ -79,13 +78,11 @@ class Reactome(SrcClass):
         version = super(Reactome, self).get_source_version(alias)
         if version == 'unknown':
             url = self.url_base + 'about/news/'
-            response = urllib.request.urlopen(url)
-            the_page = response.readlines()
+            the_page = self.get_page(url).splitlines(True)
             for line in the_page:
                 d_line = line.decode()
                 match = re.search(r'Version (\d+)', d_line)
                 if match is not None:
-                    response.close()
                     self.version[alias] = match.group(1)
                     break
             for alias_name in self.aliases:
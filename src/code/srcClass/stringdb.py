@@ -9,7 +9,6 @@ Functions:
     get_SrcClass: returns a Stringdb object
     main: runs compare_versions (see utilities.py) on a Stringdb object
 """
-import urllib.request
 import re
 import os
 import hashlib
@@ -17,7 +16,6 @@ import csv
 import json
 import requests
 import config_utilities as cf
-import fetch_utilities as fu
 import table_utilities as tu
 from check_utilities import SrcClass, compare_versions
 
@@ -110,13 +108,11 @@ class Stringdb(SrcClass):
             str: The remote version of the source.
         """
         if alias not in self.version:
-            response = fu.opener.open(self.url_base)
-            the_page = response.readlines()
+            the_page = self.get_page(self.url_base).splitlines(True)
             for line in the_page:
                 d_line = line.decode()
                 match = re.search("string_database_version_dotted: '(\d+\.?\d*)'", d_line)
                 if match is not None:
-                    response.close()
                     vers = match.group(1)
                     if '.' in vers:
                         vers = vers.rstrip('0')
@@ -3,7 +3,7 @@ that has been updated.
 
 Contains module functions::
 
-    csu(infile, outfile, columns=list())
+    csu(infile, outfile, columns=None)
     main_parse_args()
     main(chunkfile, version_json, args=None)
 
@@ -20,18 +20,21 @@ Examples:
 """
 
 import json
-import sys
-import subprocess
 import os
+import time
 from argparse import ArgumentParser
 import config_utilities as cf
+import plan_utilities as pu
+import check_utilities as ch
+import sort_utilities as st
 
 def csu(infile, outfile, columns=None):
     """Performs a cut | sort | uniq on infile using the provided columns and
     stores it into outfile.
 
-    Takes a file in tsv format and sorts by the provided columns using the
-    unix sort command and then removes duplicate elements.
+    Takes a file in tsv format, keeps the provided columns and sorts the
+    lines in byte order while removing duplicate elements (see
+    sort_utilities.sort_file).
 
     Args:
         infile (str): the file to sort
@@ -39,16 +42,7 @@ def csu(infile, outfile, columns=None):
         columns (list): the columns to use in cut or an empty list if all
                         columns should be used
     """
-    if columns is None:
-        columns = []
-    with open(outfile, 'w') as out:
-        cmd2 = ['sort', '-u']
-        if columns:
-            cmd1 = ['cut', '-f', ','.join(map(str, columns)), infile]
-        else:
-            cmd1 = ['cat', infile]
-        p1 = subprocess.Popen(cmd1, stdout=subprocess.PIPE)
-        subprocess.Popen(cmd2, stdin=p1.stdout, stdout=out).communicate()
+    st.sort_file(infile, outfile, columns)
 
 def main(chunkfile, version_json, args=None):
     """Tables the source:alias described by version_json.
@@ -56,7 +50,11 @@ def main(chunkfile, version_json, args=None):
     This takes the path to a chunked (see fetch_utilities.chunk)  raw_line file
     and it's correpsonding version_json (source.alias.json) and runs the
     source specific table command (see SrcClass.table) if the alias is a data
-    file. If it is a mapping file, it does nothing:
+    file, with the source class rebuilt offline from the metadata written by
+    check (see check_utilities.get_offline_SrcClass). It records the cost of
+    the chunk for planning the chunks of the next build (see
+    plan_utilities.write_chunk_stats). If it is a mapping file, it does
+    nothing:
 
         raw_line (line_hash, line_num, file_id, raw_line)
         table_file (line_hash, n1name, n1hint, n1type, n1spec,\
@@ -75,15 +73,21 @@ def main(chunkfile, version_json, args=None):
     """
     if args is None:
         args = cf.config_args()
+    st.set_sort_limits(args.sort_memory, args.num_procs, args.sort_compress,
+                       args.merge_fan_in)
     with open(version_json, 'r') as infile:
         version_dict = json.load(infile)
-    src_code_dir = os.path.join(args.code_path, args.src_path)
-    sys.path.append(src_code_dir)
-    src_module = __import__(version_dict['source'])
-    SrcClass = src_module.get_SrcClass(args)
     if not version_dict['is_map']:
+        SrcClass = ch.get_offline_SrcClass(version_json, args)
+        start = time.time()
         SrcClass.table(chunkfile, version_dict)
         #csu(chunkfile.replace('raw_line', 'edge'))
+        stats_file = chunkfile.replace('.raw_line.', '.table_stats.')
+        pu.write_chunk_stats(os.path.splitext(stats_file)[0] + '.json', {
+            'lines': pu.count_lines(chunkfile),
+            'bytes': os.path.getsize(chunkfile),
+            'table_rows': pu.count_lines(chunkfile.replace('.raw_line.', '.table.')),
+            'table_seconds': time.time() - start})
 
 def main_parse_args():
     """Processes command line arguments.
@@ -7,6 +7,7 @@ Contains module functions::
     list_sources(args)
     generic_dict(args, ns_parent=None)
     run_check(args)
+    batch_aliases(version_dicts, batch_size)
     run_fetch(args)
     run_table(args)
     run_map(args)
@@ -46,6 +47,8 @@ from argparse import ArgumentParser
 import config_utilities as cf
 import mysql_utilities as db
 import job_utilities as ju
+import import_utilities as iu
+import check_utilities as ch
 
 DEFAULT_START_STEP = 'CHECK'
 POSSIBLE_STEPS = ['CHECK', 'FETCH', 'TABLE', 'MAP', 'IMPORT', 'EXPORT']
@@ -184,7 +187,9 @@ def run_check(args):
 
     This loops through args.parameters sources, creates a job for each that calls
     check_utilities clean() (and if not args.one_step, calls workflow_utilities
-    FETCH), and runs job in args.chronos location.
+    FETCH), and runs job in args.chronos location. Outside of setup, all the
+    sources are checked in a single job instead (see check_utilities
+    check_all).
 
     Args:
         args (Namespace): args as populated namespace from parse_args
@@ -193,6 +198,16 @@ def run_check(args):
     src_list = list_sources(args)
     ns_parameters = []
     step_job = ju.Job("checker", args)
+    check_all = not args.setup and len(src_list) > 1
+
+    if check_all:
+        jobdict = generic_dict(args, None)
+        jobdict.update({'TMPJOB': "check-all",
+                        'TMPCHECKSRCS': ",,".join(src_list),
+                        'TMPCHECKPATHS': " ".join(os.path.join(args.data_path, module, '')
+                                                  for module in src_list)
+                       })
+        step_job = ju.run_job_step(args, "all_checker", jobdict)
 
     for module in src_list:
 
@@ -201,11 +216,12 @@ def run_check(args):
 
         jobname = "-".join(["check", module])
         jobname = jobname.replace(".", "-")
-        jobdict = generic_dict(args, None)
-        jobdict.update({'TMPJOB': jobname,
-                        'TMPSRC': module
-                       })
-        step_job = ju.run_job_step(args, "checker", jobdict)
+        if not check_all:
+            jobdict = generic_dict(args, None)
+            jobdict.update({'TMPJOB': jobname,
+                            'TMPSRC': module
+                           })
+            step_job = ju.run_job_step(args, "checker", jobdict)
 
         ns_parameters.extend([module])
 
@@ -235,12 +251,61 @@ def run_check(args):
     return 0
 
 
+def batch_aliases(version_dicts, batch_size):
+    """Groups the aliases of a source into the fetch jobs that fetch them.
+
+    Aliases whose remote_size is below batch_size megabytes, or that do not
+    need a fetch, are packed in order into batches of at most batch_size
+    megabytes. Aliases that are larger, of unknown size, or that other
+    aliases depend on keep a job of their own, so that the dependencies
+    between fetch jobs are unchanged. The batches come after the jobs of
+    their own.
+
+    Args:
+        version_dicts (dict): the file_metadata.json of each alias
+        batch_size (float): megabytes of aliases packed into one job, or 0
+            to give every alias its own job
+
+    Returns:
+        list: the sorted aliases fetched by each job
+    """
+    limit = batch_size * 1024 ** 2
+    depended = set()
+    for version_dict in version_dicts.values():
+        depended.update(version_dict["dependencies"])
+    jobs = []
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for alias in sorted(version_dicts):
+        version_dict = version_dicts[alias]
+        size = int(version_dict["remote_size"])
+        if not version_dict["fetch_needed"]:
+            size = 0
+        if limit <= 0 or alias in depended or size < 0 or size >= limit:
+            jobs.append([alias])
+            continue
+        if batch and batch_bytes + size > limit:
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(alias)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return jobs + batches
+
 def run_fetch(args):
     """Runs fetches for all aliases of a single source.
 
     This loops through aliases of args.parameters sources, creates a job for
     each that calls fetch_utilities main() (and if not args.one_step, calls
-    workflow_utilities TABLE), and runs job in args.chronos location.
+    workflow_utilities TABLE), and runs job in args.chronos location. If
+    args.fetch_batch_size is set, small aliases of a source are fetched
+    together by a single job (see batch_aliases and fetch_utilities
+    main_batch), each still with its own next step. Sources whose check
+    failed in a shared check job (see check_utilities.check_all) are not
+    fetched, and an error is raised once the other sources are scheduled.
 
     Args:
         args (Namespace): args as populated namespace from parse_args, must
@@ -249,77 +314,103 @@ def run_fetch(args):
     src_list = list_sources(args)
     ns_parameters = []
     step_job = ju.Job("fetcher", args)
+    failed = []
 
     for src in src_list:
         local_src_dir = os.path.join(args.working_dir, args.data_path, src)
         if not os.path.exists(local_src_dir):
             raise IOError("ERROR: source specified with --step_parameters (-p) option, \
                 {0}, does not have data directory: {1}".format(src, local_src_dir))
+        failed_file = os.path.join(local_src_dir, ch.CHECK_FAILED)
+        if os.path.isfile(failed_file):
+            with open(failed_file, 'r') as infile:
+                print("Check failed for {0}, not fetching: {1}".format(
+                    src, infile.read().strip()))
+            failed.append(src)
+            continue
+
+        version_dicts = {}
+        for alias in sorted(os.listdir(local_src_dir)):
+            if not os.path.isdir(os.path.join(local_src_dir, alias)):
+                continue
+            metadata_file = os.path.join(local_src_dir, alias, "file_metadata.json")
+            if not os.path.isfile(metadata_file):
+                raise IOError("ERROR: Missing {0}".format(metadata_file))
+            with open(metadata_file, 'r') as infile:
+                version_dicts[alias] = json.load(infile)
+        jobs = batch_aliases(version_dicts, args.fetch_batch_size)
+
+        batch_ctr = 0
+        jobnames = []
+        for aliases in jobs:
+            if len(aliases) == 1:
+                jobname = "-".join(["fetch", src, aliases[0]])
+            else:
+                batch_ctr += 1
+                jobname = "-".join(["fetch", src, "batch", str(batch_ctr)])
+            jobnames.append(jobname.replace(".", "-"))
 
-        alias_ctr = 0
         if args.chronos not in SPECIAL_MODES:
-            for alias in sorted(os.listdir(local_src_dir)):
-                jobname = "-".join(["fetch", src, alias])
-                jobname = jobname.replace(".", "-")
+            for jobname in jobnames:
                 jobdict = generic_dict(args, None)
                 jobdict.update({'TMPJOB': jobname,
                                 'TMPLAUNCH': r'"schedule": "R1\/2200-01-01T06:00:00Z\/P3M"'
                                })
                 ju.run_job_step(args, "placeholder", jobdict)
 
-        for alias in sorted(os.listdir(local_src_dir)):
-            alias_path = os.path.join(src, alias)
-            local_alias_dir = os.path.join(local_src_dir, alias)
-            alias_ctr += 1
-            print("\t".join([src, str(alias_ctr), alias]))
+        alias_ctr = 0
+        for aliases, jobname in zip(jobs, jobnames):
 
             ## check for dependencies
             parents = []
             if args.dependencies != "":
                 parents = args.dependencies.split(",,")
 
-            metadata_file = os.path.join(local_alias_dir, "file_metadata.json")
-            if not os.path.isfile(metadata_file):
-                raise IOError("ERROR: Missing {0}".format(metadata_file))
-
-            version_dict = {}
-            with open(metadata_file, 'r') as infile:
-                version_dict = json.load(infile)
-            dependencies = version_dict["dependencies"]
-            ismap = version_dict["is_map"]
-            fetch_needed = version_dict["fetch_needed"] or args.force_fetch
-            if dependencies:
-                for dep in dependencies:
+            for alias in aliases:
+                for dep in version_dicts[alias]["dependencies"]:
                     parent_string = "-".join(["fetch", src, dep])
-                    parents.extend([parent_string])
+                    if parent_string not in parents:
+                        parents.extend([parent_string])
 
             launchstr = r'"schedule": "R1\/\/P3M"'
             if parents:
                 launchstr = ju.chronos_parent_str(parents)
 
-            jobname = "-".join(["fetch", src, alias])
-            jobname = jobname.replace(".", "-")
             jobdict = generic_dict(args, None)
             jobdict.update({'TMPJOB': jobname,
-                            'TMPLAUNCH': launchstr,
-                            'TMPALIASPATH': alias_path
+                            'TMPLAUNCH': launchstr
                            })
-            step_job = ju.run_job_step(args, "fetcher", jobdict)
-
-            if not ismap and fetch_needed:
-                ns_parameters.extend([",".join([src, alias])])
-            if not args.setup and not args.one_step and not ismap and \
-                args.chronos not in SPECIAL_MODES and fetch_needed:
-
-                ns_jobname = "-".join([jobname, "next_step"])
-                ns_dict = generic_dict(args, step_job.jobname)
-                ns_dict.update({'TMPJOB': ns_jobname,
-                                'TMPNEXTSTEP': "TABLE",
-                                'TMPSTART': ",".join([src, alias]),
-                                'TMPOPTS': " ".join([args.config_opts, args.workflow_opts,
-                                                     '-d', ns_jobname])
-                               })
-                ju.run_job_step(args, "next_step_caller", ns_dict)
+            if len(aliases) == 1:
+                jobdict['TMPALIASPATH'] = os.path.join(src, aliases[0])
+                step_job = ju.run_job_step(args, "fetcher", jobdict)
+            else:
+                jobdict['TMPBATCHPATHS'] = " ".join(os.path.join(src, alias)
+                                                    for alias in aliases)
+                jobdict['TMPBATCHJSONS'] = ",,".join(
+                    os.path.join(src, alias, "file_metadata.json") for alias in aliases)
+                step_job = ju.run_job_step(args, "batch_fetcher", jobdict)
+
+            for alias in aliases:
+                alias_ctr += 1
+                print("\t".join([src, str(alias_ctr), alias, jobname]))
+                ismap = version_dicts[alias]["is_map"]
+                fetch_needed = version_dicts[alias]["fetch_needed"] or args.force_fetch
+
+                if not ismap and fetch_needed:
+                    ns_parameters.extend([",".join([src, alias])])
+                if not args.setup and not args.one_step and not ismap and \
+                    args.chronos not in SPECIAL_MODES and fetch_needed:
+
+                    ns_jobname = "-".join(["fetch", src, alias, "next_step"])
+                    ns_jobname = ns_jobname.replace(".", "-")
+                    ns_dict = generic_dict(args, step_job.jobname)
+                    ns_dict.update({'TMPJOB': ns_jobname,
+                                    'TMPNEXTSTEP': "TABLE",
+                                    'TMPSTART': ",".join([src, alias]),
+                                    'TMPOPTS': " ".join([args.config_opts, args.workflow_opts,
+                                                         '-d', ns_jobname])
+                                   })
+                    ju.run_job_step(args, "next_step_caller", ns_dict)
 
     if not args.setup and not args.one_step and args.chronos in SPECIAL_MODES \
         and ns_parameters:
@@ -334,6 +425,8 @@ def run_fetch(args):
         tmpargs.chronos = "LOCAL"
         ju.run_job_step(tmpargs, "next_step_caller", ns_dict)
 
+    if failed:
+        raise IOError("ERROR: check failed for " + ", ".join(failed))
     return 0
 
 
@@ -342,7 +435,12 @@ def run_table(args):
 
     This loops through chunks of args.parameters aliases, creates a job for
     each that calls table_utilities main() (and if not args.one_step, calls
-    workflow_utilities MAP), and runs job in args.chronos location.
+    workflow_utilities MAP), and runs job in args.chronos location. Aliases
+    whose fetch found the same content as the previous fetch (marked
+    content_unchanged in file_metadata.json) are skipped. Aliases whose
+    fetch failed in a batch job (marked fetch_failed, see fetch_utilities
+    main_batch) are not tabled, and an error is raised once the other
+    aliases are scheduled.
 
     Args:
         args (Namespace): args as populated namespace from parse_args, must
@@ -355,11 +453,25 @@ def run_table(args):
 
     ns_parameters = []
     step_job = ju.Job("tabler", args)
+    failed = []
 
     for pair in alias_list:
         src, alias = pair.split(",")
 
         alias_path = os.path.join(src, alias)
+        metadata_file = os.path.join(args.working_dir, args.data_path, alias_path,
+                                     "file_metadata.json")
+        if os.path.isfile(metadata_file):
+            with open(metadata_file, 'r') as infile:
+                version_dict = json.load(infile)
+            if version_dict.get("fetch_failed"):
+                print("\t".join([pair, "fetch failed, skipping",
+                                 version_dict["fetch_failed"]]))
+                failed.append(pair)
+                continue
+            if version_dict.get("content_unchanged", False):
+                print("\t".join([pair, "content unchanged, skipping"]))
+                continue
         local_chunk_dir = os.path.join(args.working_dir, args.data_path, alias_path, "chunks")
         if not os.path.exists(local_chunk_dir):
             raise IOError('ERROR: "source,alias" specified with --step_parameters '
@@ -411,6 +523,8 @@ def run_table(args):
         tmpargs.chronos = "LOCAL"
         ju.run_job_step(tmpargs, "next_step_caller", ns_dict)
 
+    if failed:
+        raise IOError("ERROR: fetch failed for " + ", ".join(failed))
     return 0
 
 
@@ -472,14 +586,29 @@ def run_import(args):
         args (Namespace): args as populated namespace from parse_args,
             specify --step_parameters(-p) as ',,' separated list of files to
             import or the allowed possible SQL table names: node, node_meta,
-            edge2line, status, or edge_meta. If not specified, by default it
-            will try to import all tables.
+            edge2line, status, or edge_meta, or line_delete to delete the
+            lines removed from sources fetched with --incremental_build. If
+            not specified, by default it will try to import all tables.
+            With --stream_import, the merged tables are imported through
+            named pipes and no merged file is stored or shared. line_delete
+            is skipped if no source has lines to delete, and otherwise runs
+            first, with all other imports depending on it.
     """
     importfile_list = args.step_parameters.split(",,")
-    tables = ['node', 'node_meta', 'edge2line', 'status', 'edge_meta', 'edge', 'raw_line']
+    tables = ['node', 'node_meta', 'edge2line', 'status', 'edge_meta', 'edge', 'raw_line',
+              'line_delete']
     if args.step_parameters == "":
-        importfile_list = tables
+        importfile_list = list(tables)
     ju.Job("importer", args)
+    parents = args.dependencies.split(",,") if args.dependencies != "" else []
+    if 'line_delete' in importfile_list:
+        importfile_list.remove('line_delete')
+        searchpath = os.path.join(args.storage_dir or args.working_dir,
+                                  args.data_path)
+        if iu.find_merge_files(searchpath, 'line_delete'):
+            importfile_list.insert(0, 'line_delete')
+        else:
+            print('No lines to delete, skipping line_delete')
 
     ctr = 0
     for importfile in importfile_list:
@@ -506,7 +635,15 @@ def run_import(args):
                         'TMPIMPORTPATH': importfile,
                         'TMPFILES': output_files
                        })
-        ju.run_job_step(args, "importer", jobdict)
+        if importfile == 'line_delete':
+            # the deletes must not race with the rows being imported
+            parents.append(jobname)
+        elif 'line_delete' in importfile_list:
+            jobdict['TMPLAUNCH'] = ju.chronos_parent_str(parents)
+        if args.stream_import and importfile in tables and importfile != 'line_delete':
+            ju.run_job_step(args, "stream_importer", jobdict)
+        else:
+            ju.run_job_step(args, "importer", jobdict)
 
     return 0
 
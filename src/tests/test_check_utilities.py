@@ -0,0 +1,290 @@
+"""Tests for the remote metadata cache and the probes of check_utilities
+against a local http server."""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from argparse import Namespace
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import pytest
+
+pytest.importorskip('mysql.connector')
+pytest.importorskip('redis')
+
+import config_utilities as cf
+import check_utilities as ch
+
+BODY = b'0123456789' * 10
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 02 Jan 2017 03:04:05 GMT'
+
+OFFLINE_SRC = '''
+import check_utilities as ch
+
+class OfflineSrc(ch.SrcClass):
+    def __init__(self, args=None):
+        aliases = {'file': 'the file', 'moved': 'the moved file'}
+        super(OfflineSrc, self).__init__('offlinesrc', URL_BASE, aliases, args)
+        self.release = self.get_page(self.url_base + '/page').decode()
+        self.taxid_list = {'human': '9606'}.values()
+        self.source_url = self.image = self.reference = self.license = ''
+        self.pmid = 0
+
+    def get_remote_url(self, alias):
+        return self.url_base + '/' + alias
+'''
+
+class FakeFTP(object):
+    """Ftp session listing a directory of two files with MLSD, slowly, and
+    counting the listings."""
+    listings = 0
+
+    def mlsd(self, path, facts):
+        FakeFTP.listings += 1
+        time.sleep(0.1)
+        return [('.', {'type': 'cdir'}),
+                ('a.txt', {'type': 'file', 'size': '10',
+                           'modify': '20170102030405'}),
+                ('b.txt', {'type': 'file', 'size': '20',
+                           'modify': '20170102030405.123'})]
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    """Serves the pooled probe connections and the page requests at once."""
+    daemon_threads = True
+
+class SourceHandler(BaseHTTPRequestHandler):
+    """Serves BODY at /file and /page, revalidated with ETAG and
+    LAST_MODIFIED, and a redirect to /file at /moved. HEAD is refused if
+    head is False, and every reply waits delay seconds. Records the
+    (method, path, headers) of every request and the peak number of requests
+    served at once."""
+    protocol_version = 'HTTP/1.1'
+    head = True
+    etag = ETAG
+    delay = 0
+    requests = []
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, headers=(), body=b''):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        with SourceHandler.lock:
+            SourceHandler.requests.append((self.command, self.path,
+                                           dict(self.headers.items())))
+            SourceHandler.active += 1
+            SourceHandler.peak = max(SourceHandler.peak, SourceHandler.active)
+        try:
+            time.sleep(self.delay)
+            self.respond()
+        finally:
+            with SourceHandler.lock:
+                SourceHandler.active -= 1
+
+    def respond(self):
+        if self.path == '/moved':
+            return self.reply(301, [('Location', '/file')])
+        if self.command == 'HEAD' and not self.head:
+            return self.reply(405)
+        headers = [('ETag', self.etag), ('Last-Modified', LAST_MODIFIED)]
+        if self.headers.get('If-None-Match') == self.etag:
+            return self.reply(304, headers)
+        if self.headers.get('Range') == 'bytes=0-0':
+            headers.append(('Content-Range', 'bytes 0-0/' + str(len(BODY))))
+            return self.reply(206, headers, BODY[:1])
+        return self.reply(200, headers, BODY)
+
+def start_server():
+    """Returns a local http server running SourceHandler and its base url."""
+    server = ThreadingServer(('127.0.0.1', 0), SourceHandler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    return server, 'http://127.0.0.1:{0}'.format(server.server_port)
+
+def stop_server(server):
+    """Stops a server started by start_server and closes the connections
+    kept open to it."""
+    server.shutdown()
+    server.server_close()
+    for conn in getattr(ch.CONNECTIONS, 'pool', dict()).values():
+        conn.close()
+
+@pytest.fixture
+def url():
+    """Base url of a local http server."""
+    SourceHandler.head = True
+    SourceHandler.etag = ETAG
+    SourceHandler.delay = 0
+    SourceHandler.requests = []
+    SourceHandler.peak = 0
+    server, base_url = start_server()
+    yield base_url
+    stop_server(server)
+
+def test_probe_url(url):
+    headers = ch.probe_url(url + '/file')
+    assert headers['content-length'] == str(len(BODY))
+    assert headers['last-modified'] == LAST_MODIFIED
+    assert [req[0] for req in SourceHandler.requests] == ['HEAD']
+
+def test_probe_url_redirect(url):
+    headers = ch.probe_url(url + '/moved')
+    assert headers['content-length'] == str(len(BODY))
+    assert [req[1] for req in SourceHandler.requests] == ['/moved', '/file']
+
+def test_probe_url_range_fallback(url):
+    SourceHandler.head = False
+    headers = ch.probe_url(url + '/file')
+    assert headers['content-length'] == str(len(BODY))
+    assert headers['last-modified'] == LAST_MODIFIED
+    (head, get) = SourceHandler.requests
+    assert head[0] == 'HEAD'
+    assert get[0] == 'GET' and get[2]['Range'] == 'bytes=0-0'
+
+class PathSource(ch.SrcClass):
+    """A source whose aliases are fetched from the url path of the same
+    name below the base url."""
+    def get_remote_url(self, alias):
+        return self.url_base + '/' + alias.split('.')[0]
+
+def test_probe_remote(url):
+    SourceHandler.delay = 0.2
+    aliases = {'file': '', 'file.copy': '', 'page': '', 'other': '',
+               'moved': ''}
+    src = PathSource('test', url, aliases,
+                     Namespace(meta_cache_dir='', meta_cache_ttl=0))
+    src.probe_remote()
+    paths = sorted(req[1] for req in SourceHandler.requests)
+    assert paths == ['/file', '/file', '/moved', '/other', '/page']
+    assert SourceHandler.peak > 1
+    assert src.get_remote_file_size('file.copy') == len(BODY)
+    assert src.get_remote_file_size('moved') == len(BODY)
+    assert len(SourceHandler.requests) == 5
+
+def test_cached_probe(url, tmp_path):
+    cache_dir = str(tmp_path)
+    headers = ch.cached_probe(url + '/file', cache_dir, ttl=3600)
+    assert ch.cached_probe(url + '/file', cache_dir, ttl=3600) == headers
+    assert len(SourceHandler.requests) == 1
+    ch.cached_probe(url + '/file', cache_dir, ttl=0)
+    assert len(SourceHandler.requests) == 2
+
+def test_cached_probe_offline(tmp_path):
+    cache_dir = str(tmp_path)
+    server, base_url = start_server()
+    headers = ch.cached_probe(base_url + '/file', cache_dir, ttl=0)
+    stop_server(server)
+    assert ch.cached_probe(base_url + '/file', cache_dir, ttl=0) == headers
+    assert ch.cached_probe(base_url + '/other', cache_dir, ttl=0) == {}
+
+def test_get_page_revalidation(url, tmp_path):
+    cache_dir = str(tmp_path)
+    assert ch.get_page(url + '/page', cache_dir, ttl=3600) == BODY
+    assert ch.get_page(url + '/page', cache_dir, ttl=3600) == BODY
+    assert len(SourceHandler.requests) == 1
+    assert ch.get_page(url + '/page', cache_dir, ttl=0) == BODY
+    revalidate = SourceHandler.requests[-1][2]
+    assert revalidate['If-None-Match'] == ETAG
+    assert revalidate['If-Modified-Since'] == LAST_MODIFIED
+    SourceHandler.etag = '"v2"'
+    assert ch.get_page(url + '/page', cache_dir, ttl=0) == BODY
+    meta = ch.read_meta_cache(cache_dir, ch.hashlib.sha1(
+        (url + '/page').encode()).hexdigest())[0]
+    assert meta['etag'] == '"v2"'
+
+def test_get_page_offline(tmp_path):
+    cache_dir = str(tmp_path)
+    server, base_url = start_server()
+    assert ch.get_page(base_url + '/page', cache_dir) == BODY
+    stop_server(server)
+    assert ch.get_page(base_url + '/page', cache_dir, ttl=0) == BODY
+    with pytest.raises(OSError):
+        ch.get_page(base_url + '/other', cache_dir)
+
+def test_get_offline_SrcClass(url, tmp_path, monkeypatch):
+    (tmp_path / 'src').mkdir()
+    src_file = tmp_path / 'src' / 'offlinesrc.py'
+    src_file.write_text(OFFLINE_SRC.replace('URL_BASE', repr(url)))
+    monkeypatch.setattr(sys, 'path', [str(tmp_path / 'src')] + sys.path)
+    monkeypatch.delitem(sys.modules, 'offlinesrc', raising=False)
+    monkeypatch.setattr(ch.mu, 'get_source_file_meta', lambda name, args: {})
+    args = cf.config_args()
+    args.working_dir = str(tmp_path)
+    args.data_path = 'data'
+    args.code_path = str(tmp_path)
+    args.src_path = 'src'
+    args.meta_cache_dir = ''
+    src = __import__('offlinesrc').OfflineSrc(args)
+    ch.compare_versions(src, args)
+    num_requests = len(SourceHandler.requests)
+    version_json = tmp_path / 'data' / 'offlinesrc' / 'moved' / 'file_metadata.json'
+    offline = ch.get_offline_SrcClass(str(version_json), args)
+    assert len(SourceHandler.requests) == num_requests
+    assert type(offline) is type(src)
+    assert offline.release == BODY.decode()
+    assert offline.taxid_list == ['9606']
+    assert offline.aliases == src.aliases
+    assert offline.get_remote_url('moved') == url + '/moved'
+    assert offline.get_remote_file_size('moved') == len(BODY)
+    assert offline.args is args
+
+@pytest.fixture
+def ftp(monkeypatch):
+    """Replaces the ftp sessions of check_utilities with a FakeFTP."""
+    FakeFTP.listings = 0
+    monkeypatch.setattr(ch, 'get_ftp', lambda netloc: FakeFTP())
+    ch.clear_ftp_listings()
+    yield 'ftp://127.0.0.1/pub/'
+    ch.clear_ftp_listings()
+
+@pytest.fixture
+def local_tz():
+    """Runs a test in a local time zone other than UTC, with daylight
+    saving time."""
+    old_tz = os.environ.get('TZ')
+    os.environ['TZ'] = 'America/Chicago'
+    time.tzset()
+    yield
+    if old_tz is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = old_tz
+    time.tzset()
+
+def test_probe_ftp(ftp, local_tz):
+    urls = [ftp + name for name in ('a.txt', 'b.txt', 'a.txt', 'b.txt')]
+    with ThreadPoolExecutor(4) as pool:
+        headers = list(pool.map(ch.probe_ftp, urls))
+    assert FakeFTP.listings == 1
+    assert [h['content-length'] for h in headers] == ['10', '20', '10', '20']
+    assert {h['modified'] for h in headers} == {1483326245.0}
+    src = ch.SrcClass('test', ftp, {'a': ''},
+                      Namespace(meta_cache_dir='', meta_cache_ttl=0))
+    src.get_remote_url = lambda alias: ftp + 'a.txt'
+    assert src.get_remote_file_modified('a') == 1483326245.0
+
+def test_clear_ftp_listings(ftp):
+    ch.probe_ftp(ftp + 'a.txt')
+    ch.probe_ftp(ftp + 'b.txt')
+    assert FakeFTP.listings == 1
+    ch.clear_ftp_listings()
+    ch.probe_ftp(ftp + 'a.txt')
+    assert FakeFTP.listings == 2
@@ -0,0 +1,260 @@
+"""Tests for the resumable and segmented downloads of download_utilities and
+the limits of their hosts against a local http server."""
+
+import os
+import re
+import threading
+from time import sleep, monotonic
+from socketserver import ThreadingMixIn
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import pytest
+
+import download_utilities as du
+
+DATA = bytes(range(256)) * 40
+
+ETAG = '"v1"'
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves DATA with ETAG, honouring single byte ranges unless ranges is
+    False or an If-Range header does not match ETAG, and records the Range
+    and If-Range headers of every GET."""
+    ranges = True
+    length = None
+    requests = []
+    if_ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def send_data(self, body=True):
+        start, end = 0, len(DATA) - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if body:
+            RangeHandler.requests.append(self.headers.get('Range'))
+            RangeHandler.if_ranges.append(if_range)
+        if match and self.ranges and if_range in (None, ETAG):
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), end)
+            if start > end:
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, end, len(DATA)))
+        else:
+            self.send_response(200)
+        if self.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', ETAG)
+        length = self.length if self.length is not None else end - start + 1
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        if body:
+            self.wfile.write(DATA[start:end + 1])
+
+    def do_HEAD(self):
+        self.send_data(body=False)
+
+    def do_GET(self):
+        self.send_data()
+
+@pytest.fixture
+def url():
+    """Url of DATA on a local http server."""
+    RangeHandler.ranges = True
+    RangeHandler.length = None
+    RangeHandler.requests = []
+    RangeHandler.if_ranges = []
+    du.set_host_limits(1000, 8)
+    du.LIMITERS.clear()
+    server = HTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0}/file.gz'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+def test_download(url, tmp_path):
+    filename = str(tmp_path / 'file.gz')
+    du.download_url(url, filename, expected_size=len(DATA), sleeptime=0)
+    with open(filename, 'rb') as infile:
+        assert infile.read() == DATA
+    assert not os.path.exists(filename + du.PART_EXT)
+
+def write_part(partfile, data, validator=ETAG):
+    """Writes a part file left by an interrupted download and its validator."""
+    with open(partfile, 'wb') as outfile:
+        outfile.write(data)
+    if validator is not None:
+        du.write_validator(partfile, validator)
+
+def test_resume(url, tmp_path):
+    filename = str(tmp_path / 'file.gz')
+    write_part(filename + du.PART_EXT, DATA[:1000])
+    du.download_url(url, filename, sleeptime=0)
+    with open(filename, 'rb') as infile:
+        assert infile.read() == DATA
+    assert RangeHandler.requests == ['bytes=1000-']
+    assert RangeHandler.if_ranges == [ETAG]
+    assert os.listdir(str(tmp_path)) == ['file.gz']
+
+def test_resume_changed_file(url, tmp_path):
+    filename = str(tmp_path / 'file.gz')
+    write_part(filename + du.PART_EXT, b'old' * 100, '"v0"')
+    du.download_url(url, filename, sleeptime=0)
+    with open(filename, 'rb') as infile:
+        assert infile.read() == DATA
+    assert RangeHandler.requests == ['bytes=300-']
+    assert RangeHandler.if_ranges == ['"v0"']
+
+def test_resume_without_validator(url, tmp_path):
+    filename = str(tmp_path / 'file.gz')
+    write_part(filename + du.PART_EXT, b'old' * 100, None)
+    du.download_url(url, filename, sleeptime=0)
+    with open(filename, 'rb') as infile:
+        assert infile.read() == DATA
+    assert RangeHandler.requests == [None]
+
+def test_resume_without_ranges(url, tmp_path):
+    RangeHandler.ranges = False
+    filename = str(tmp_path / 'file.gz')
+    with open(filename + du.PART_EXT, 'wb') as outfile:
+        outfile.write(b'stale')
+    du.download_url(url, filename, sleeptime=0)
+    with open(filename, 'rb') as infile:
+        assert infile.read() == DATA
+    assert RangeHandler.requests == [None]
+
+def test_segmented(url, tmp_path, monkeypatch):
+    monkeypatch.setattr(du, 'BLOCKSIZE', 1024)
+    filename = str(tmp_path / 'file.gz')
+    du.download_url(url, filename, segments=4, sleeptime=0)
+    with open(filename, 'rb') as infile:
+        assert infile.read() == DATA
+    assert sorted(RangeHandler.requests) == ['bytes=0-2559', 'bytes=2560-5119',
+                                             'bytes=5120-7679', 'bytes=7680-10239']
+    assert os.listdir(str(tmp_path)) == ['file.gz']
+
+def test_segment_resume(url, tmp_path, monkeypatch):
+    monkeypatch.setattr(du, 'BLOCKSIZE', 1024)
+    filename = str(tmp_path / 'file.gz')
+    write_part(filename + du.PART_EXT + '.2560-5119', DATA[2560:3000])
+    du.download_url(url, filename, segments=4, sleeptime=0)
+    with open(filename, 'rb') as infile:
+        assert infile.read() == DATA
+    assert 'bytes=3000-5119' in RangeHandler.requests
+
+def test_segment_resume_changed_file(url, tmp_path, monkeypatch):
+    monkeypatch.setattr(du, 'BLOCKSIZE', 1024)
+    filename = str(tmp_path / 'file.gz')
+    write_part(filename + du.PART_EXT + '.2560-5119', b'old' * 100, '"v0"')
+    du.download_url(url, filename, segments=4, sleeptime=0)
+    with open(filename, 'rb') as infile:
+        assert infile.read() == DATA
+    assert RangeHandler.requests.count('bytes=2560-5119') == 1
+    assert os.listdir(str(tmp_path)) == ['file.gz']
+
+def test_size_mismatch(url, tmp_path):
+    filename = str(tmp_path / 'file.gz')
+    with pytest.raises(IOError):
+        du.download_url(url, filename, expected_size=len(DATA) + 1, sleeptime=0)
+    assert not os.path.exists(filename)
+
+class LimitedHandler(BaseHTTPRequestHandler):
+    """Answers HEAD requests after delay seconds, the first throttled of them
+    with 429 and Retry-After, and records the time of every request and the
+    most requests served at once."""
+    delay = 0
+    throttled = 0
+    times = []
+    active = 0
+    most_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        cls = LimitedHandler
+        with cls.lock:
+            cls.times.append(monotonic())
+            cls.active += 1
+            cls.most_active = max(cls.most_active, cls.active)
+            throttle = cls.throttled > 0
+            cls.throttled -= 1
+        sleep(cls.delay)
+        if throttle:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+        else:
+            self.send_response(200)
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(DATA)))
+        self.end_headers()
+        with cls.lock:
+            cls.active -= 1
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    """Serves the requests of concurrent downloads at once."""
+    daemon_threads = True
+
+@pytest.fixture
+def limited_url():
+    """Url on a local http server running LimitedHandler."""
+    LimitedHandler.delay = 0
+    LimitedHandler.throttled = 0
+    LimitedHandler.times = []
+    LimitedHandler.active = 0
+    LimitedHandler.most_active = 0
+    du.LIMITERS.clear()
+    server = ThreadingServer(('127.0.0.1', 0), LimitedHandler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0}/file.gz'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+def test_host_rate(limited_url):
+    du.set_host_limits(10, 8)
+    for _ in range(6):
+        assert du.get_remote_info(limited_url) == (len(DATA), True)
+    gaps = [b - a for a, b in zip(LimitedHandler.times, LimitedHandler.times[1:])]
+    assert min(gaps) > 0.08
+    assert LimitedHandler.times[-1] - LimitedHandler.times[0] > 0.45
+
+def test_host_connections(limited_url):
+    du.set_host_limits(1000, 2)
+    LimitedHandler.delay = 0.1
+    with ThreadPoolExecutor(6) as pool:
+        sizes = list(pool.map(du.get_remote_info, [limited_url] * 6))
+    assert sizes == [(len(DATA), True)] * 6
+    assert LimitedHandler.most_active == 2
+
+def test_host_backoff(limited_url):
+    du.set_host_limits(10, 8)
+    LimitedHandler.throttled = 1
+    limiter = du.get_limiter(limited_url)
+    assert du.get_remote_info(limited_url) == (-1, False)
+    assert limiter.rate == 5
+    assert du.get_remote_info(limited_url) == (len(DATA), True)
+    assert LimitedHandler.times[1] - LimitedHandler.times[0] > 0.95
+    assert limiter.rate == 6
+    for _ in range(4):
+        du.get_remote_info(limited_url)
+    assert limiter.rate == 10
+
+def test_no_backoff_on_local_errors(url, tmp_path):
+    RangeHandler.ranges = False
+    du.set_host_limits(10, 8)
+    limiter = du.get_limiter(url)
+    with pytest.raises(IOError):
+        du.download_range(url, str(tmp_path / 'part'), 100, 199, tries=1)
+    assert limiter.rate == 10
+    assert limiter.paused_until == 0
@@ -0,0 +1,128 @@
+"""Tests for extracting archive members from streams and for the chunks left
+by fetch_utilities.main for the import step."""
+
+import io
+import os
+import sys
+import json
+import tarfile
+from argparse import Namespace
+import pytest
+
+pytest.importorskip('mysql.connector')
+pytest.importorskip('redis')
+
+import config_utilities as cf
+import fetch_utilities as fu
+import import_utilities as iu
+
+RELEASE = [b'a\t1\n', b'b\t2\n', b'c\t3\n']
+
+class Unseekable(io.RawIOBase):
+    """Raw stream over bytes that cannot seek, like a download."""
+    def __init__(self, data):
+        super(Unseekable, self).__init__()
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        data = self.data.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+def make_tar(members):
+    """Returns the bytes of a tar archive of the (name, data) members."""
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode='w') as tar:
+        for (name, data) in members:
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = len(data)
+            tar.addfile(tarinfo, io.BytesIO(data))
+    return out.getvalue()
+
+def read_member(members, remote_file, tmp_path, monkeypatch):
+    """Returns the data of the member open_member extracts from a tar
+    archive of members read from a stream that cannot seek."""
+    monkeypatch.setattr(fu, 'DIR', str(tmp_path))
+    stream = Unseekable(make_tar(members))
+    with fu.ExitStack() as stack:
+        return fu.open_member(stream, 'file.tar', remote_file, stack).read()
+
+def test_stream_tar_member(tmp_path, monkeypatch):
+    members = [('a.txt', b'a\n'), ('b.txt', b'b\n')]
+    assert read_member(members, 'b.txt', tmp_path, monkeypatch) == b'b\n'
+    assert read_member(members, 'a.txt', tmp_path, monkeypatch) == b'a\n'
+
+def test_stream_tar_single_member(tmp_path, monkeypatch):
+    members = [('dir/other.txt', b'a\n' * 1000)]
+    assert read_member(members, 'file.txt', tmp_path, monkeypatch) == b'a\n' * 1000
+    assert read_member(members, '', tmp_path, monkeypatch) == b'a\n' * 1000
+    assert os.listdir(str(tmp_path)) == []
+
+def test_stream_tar_ambiguous_member(tmp_path, monkeypatch):
+    members = [('a.txt', b'a\n'), ('b.txt', b'b\n')]
+    with pytest.raises(SystemExit):
+        read_member(members, '', tmp_path, monkeypatch)
+    with pytest.raises(SystemExit):
+        read_member(members, 'c.txt', tmp_path, monkeypatch)
+
+@pytest.fixture
+def fetch(tmp_path, monkeypatch):
+    """Returns a function fetching a release of the testsrc.data alias in
+    tmp_path/data/testsrc/data, as a full or incremental build, without any
+    network or database access."""
+    src_dir = tmp_path / 'src'
+    src_dir.mkdir()
+    (src_dir / 'testsrc.py').write_text('')
+    alias_dir = tmp_path / 'data' / 'testsrc' / 'data'
+    alias_dir.mkdir(parents=True)
+    monkeypatch.chdir(str(alias_dir))
+    monkeypatch.setattr(sys, 'path', list(sys.path))
+    monkeypatch.setattr(fu.ch, 'get_offline_SrcClass',
+                        lambda version_json, args: Namespace(chunk_size=2))
+    monkeypatch.setattr(fu.iu, 'update_filemeta', lambda version_dict, args: None)
+    monkeypatch.setattr(fu, 'download', lambda version_dict, args: 'testsrc.data.txt')
+    args = cf.config_args()
+    args.code_path = str(tmp_path)
+    args.src_path = 'src'
+    args.num_procs = 1
+
+    def fetch_release(lines, incremental, checksum=None):
+        with open('testsrc.data.txt', 'wb') as outfile:
+            outfile.writelines(lines)
+        version_dict = {'source': 'testsrc', 'alias': 'data', 'is_map': False,
+                        'fetch_needed': True, 'local_checksum': checksum}
+        with open('file_metadata.json', 'w') as outfile:
+            json.dump(version_dict, outfile)
+        args.incremental_build = incremental
+        fu.main('file_metadata.json', args)
+        with open('file_metadata.json', 'r') as infile:
+            return json.load(infile)
+    return fetch_release
+
+def delete_sets():
+    """Returns the delete sets the import step would find."""
+    return iu.find_merge_files(os.path.join('..', '..'), 'line_delete')
+
+def test_incremental_build_deletes_removed_lines(fetch):
+    fetch(RELEASE, True)
+    fetch(RELEASE[1:], True)
+    (delete_file,) = delete_sets()
+    with open(delete_file, 'r') as infile:
+        assert len(infile.readlines()) == 1
+
+def test_full_build_after_incremental(fetch):
+    fetch(RELEASE, True)
+    fetch(RELEASE[1:], True)
+    fetch(RELEASE[:2], False)
+    assert delete_sets() == []
+    assert not os.path.isfile('testsrc.data' + fu.INDEX_EXT)
+
+def test_unchanged_incremental_fetch(fetch):
+    fetch(RELEASE, True)
+    version_dict = fetch(RELEASE[1:], True)
+    version_dict = fetch(RELEASE[1:], True, version_dict['checksum'])
+    assert version_dict['content_unchanged']
+    assert delete_sets() == []
@@ -0,0 +1,69 @@
+"""Tests for streaming merged tables into MySQL (import_utilities.stream_import)."""
+
+import os
+import pytest
+
+pytest.importorskip('mysql.connector')
+pytest.importorskip('redis')
+
+import config_utilities as cf
+import import_utilities as iu
+import sort_utilities as st
+
+ROWS = [b'a\t1\n', b'b\t2\n', b'c\t3\n', b'd\t4\n']
+
+class FakeDB(object):
+    """Reads the loaded file like LOAD DATA and keeps the rows of a table
+    until they are committed or rolled back."""
+    tables = dict()
+
+    def __init__(self):
+        self.pending = dict()
+
+    def load_data(self, filename, tablename, cmd='', sep='\\t', enc='"',
+                  commit=True):
+        with open(filename, 'rb') as infile:
+            self.pending.setdefault(tablename, []).extend(infile.readlines())
+        if commit:
+            self.commit()
+
+    def commit(self):
+        for table, rows in self.pending.items():
+            self.tables.setdefault(table, []).extend(rows)
+        self.pending = dict()
+
+    def rollback(self):
+        self.pending = dict()
+
+    def close(self):
+        self.commit()
+
+@pytest.fixture
+def args(tmp_path, monkeypatch):
+    """Args of a working directory with two sorted status chunks."""
+    chunk_dir = tmp_path / 'data' / 'src' / 'alias' / 'chunks'
+    chunk_dir.mkdir(parents=True)
+    (chunk_dir / 'src.alias.unique.status.1.txt').write_bytes(b''.join(ROWS[::2]))
+    (chunk_dir / 'src.alias.unique.status.2.txt').write_bytes(b''.join(ROWS[1::2]))
+    FakeDB.tables = {'status': [b'old\t0\n']}
+    monkeypatch.setattr(iu.mu, 'get_database', lambda db, args: FakeDB())
+    args = cf.config_args()
+    args.working_dir = str(tmp_path)
+    args.storage_dir = ''
+    args.data_path = 'data'
+    return args
+
+def test_stream_import(args):
+    outfile = iu.stream_import('status', args)
+    assert FakeDB.tables['status'] == [b'old\t0\n'] + ROWS
+    assert not os.path.exists(outfile)
+    assert not os.path.exists(outfile.replace('.txt', '.fifo'))
+
+def test_failed_merge_leaves_table_unchanged(args, monkeypatch):
+    def write_merged(runs, out, key_columns=None, unique=True, reducer=None):
+        out.write(ROWS[0])
+        raise ValueError('bad run')
+    monkeypatch.setattr(st, 'write_merged', write_merged)
+    with pytest.raises(IOError):
+        iu.stream_import('status', args)
+    assert FakeDB.tables['status'] == [b'old\t0\n']
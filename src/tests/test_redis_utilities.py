@@ -0,0 +1,57 @@
+"""Tests for reading node metadata from redis_utilities in both layouts."""
+
+import pytest
+
+pytest.importorskip('redis')
+
+import redis_utilities as ru
+
+class FakeRedis(object):
+    """Keeps strings and hashes in a dict and counts the MGET of each key."""
+    def __init__(self, data):
+        self.data = data
+        self.mgets = []
+
+    def mget(self, keys):
+        self.mgets.extend(keys)
+        return [self.data.get(key) for key in keys]
+
+    def hmget(self, name, fields):
+        fhash = self.data.get(name, dict())
+        return [fhash.get(field) for field in fields]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline(object):
+    """Runs the queued HMGET of a FakeRedis on execute."""
+    def __init__(self, rdb):
+        self.rdb = rdb
+        self.queued = []
+
+    def hmget(self, name, fields):
+        self.queued.append((name, fields))
+
+    def execute(self):
+        return [self.rdb.hmget(name, fields) for name, fields in self.queued]
+
+DATA = {'stable::hashed': {'type': b'gene', 'alias': b'A1'},
+        'stable::partial': {'type': b'gene'},
+        'stable::partial::alias': b'P1',
+        'stable::strings::type': b'protein',
+        'stable::strings::alias': b'S1'}
+NODES = ['hashed', 'partial', 'strings', 'absent']
+
+def test_mget_meta_mixed_layouts(monkeypatch):
+    monkeypatch.setattr(ru, 'HASH_META', True)
+    rdb = FakeRedis(DATA)
+    assert ru.mget_meta(rdb, NODES, ['type', 'alias']) == \
+        [[b'gene', b'A1'], [b'gene', b'P1'], [b'protein', b'S1'], [None, None]]
+    assert 'stable::hashed::type' not in rdb.mgets
+    assert 'stable::partial::type' not in rdb.mgets
+
+def test_mget_meta_strings(monkeypatch):
+    monkeypatch.setattr(ru, 'HASH_META', False)
+    rdb = FakeRedis(DATA)
+    assert ru.mget_meta(rdb, NODES, ['alias']) == \
+        [[None], [b'P1'], [b'S1'], [None]]
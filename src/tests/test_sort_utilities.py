@@ -0,0 +1,28 @@
+"""Tests for the order of sort_utilities, which must match LC_ALL=C sort."""
+
+import sort_utilities as st
+
+LINES = [b'a\tb\n', b'a\n', b'a b\n', b'b\ta\n', b'a\tb\n', b'\n', b'a\ta\n']
+
+def sort_lines(tmp_path, lines, **kwargs):
+    """Sorts lines with sort_file and returns the sorted lines."""
+    infile = str(tmp_path / 'in.txt')
+    outfile = str(tmp_path / 'out.txt')
+    with open(infile, 'wb') as out:
+        out.writelines(lines)
+    st.sort_file(infile, outfile, **kwargs)
+    with open(outfile, 'rb') as sorted_file:
+        return sorted_file.readlines()
+
+def test_prefix_sorts_first(tmp_path):
+    assert sort_lines(tmp_path, LINES) == \
+        [b'\n', b'a\n', b'a\ta\n', b'a\tb\n', b'a b\n', b'b\ta\n']
+
+def test_key_ties_sort_on_line(tmp_path):
+    assert sort_lines(tmp_path, LINES, key_columns=[2], unique=False) == \
+        [b'\n', b'a\n', b'a b\n', b'a\ta\n', b'b\ta\n', b'a\tb\n', b'a\tb\n']
+
+def test_merge_sorted():
+    streams = [[b'a\n', b'a\tb\n'], [b'a\ta\n', b'b\n']]
+    assert list(st.merge_sorted(streams)) == \
+        [b'a\n', b'a\ta\n', b'a\tb\n', b'b\n']